@@ -1,17 +1,66 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
 
 import pandas as pd
+import hashlib
 import io
 import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-def get_llm(api_key: str):
-    """Retorna uma instância do LLM Gemini Flash com timeout."""
+from utils.column_catalog import get_column_catalog, select_columns
+from utils.fingerprint import get_dataset_fingerprint
+from utils.llm_cache import DEFAULT_TTL_S, get_cached_response, store_cached_response
+from utils.rate_limiter import call_with_rate_limit, coalesce
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+DEFAULT_TEMPERATURE = 0.0
+DEFAULT_TIMEOUT_S = 30
+PREVIEW_BUDGET_TOKENS = 600  # orçamento das linhas de colunas no preview do dataset
+OVERVIEW_BUDGET_TOKENS = 400  # orçamento da visão geral do dataset no prefixo estável
+MAX_CACHED_PROMPT_PARTS = 128
+
+# Registro do processo: clientes e chains são criados uma vez e reaproveitados entre turnos,
+# sessões e threads, mantendo o pool de conexões HTTP do cliente do Gemini aquecido.
+_registry_lock = threading.RLock()
+_llms = {}    # (api_key, model, temperature) -> ChatGoogleGenerativeAI
+_chains = {}  # (agent_name, api_key, model, temperature) -> prompt | llm | parser
+
+# Perfil de modelo por agente (modelo, tokens de saída, timeout, modelo de fallback), definido
+# por `configure_agent_profiles` a partir de `get_config()["agent_profiles"]`
+DEFAULT_PROFILE = {"model": DEFAULT_MODEL, "max_output_tokens": None, "timeout_s": DEFAULT_TIMEOUT_S, "fallback_model": None}
+_agent_profiles = {}
+_latency = {}  # (agent_name, model) -> contadores de latência
+_latency_lock = threading.Lock()
+
+# Previews e prefixos de prompt memoizados por fingerprint do dataset
+_prompt_parts = OrderedDict()
+_prompt_parts_lock = threading.Lock()
+
+# Validade das respostas em cache por agente (as demais usam DEFAULT_TTL_S)
+AGENT_CACHE_TTL_S = {
+    "CoordinatorAgent": 7 * 24 * 60 * 60,
+    "SuggestionGenerator": 6 * 60 * 60,
+}
+
+
+def _create_llm(api_key: str, model: str, temperature: float,
+                max_output_tokens: int | None = None, timeout_s: float = DEFAULT_TIMEOUT_S):
+    """Retorna uma instância do LLM Gemini com timeout e limite de tokens de saída."""
     try:
+        options = {}
+        if max_output_tokens:
+            options["max_output_tokens"] = max_output_tokens
         return ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
+            model=model,
             google_api_key=api_key,
-            temperature=0.0,
-            request_timeout=30  # Timeout de 30 segundos
+            temperature=temperature,
+            request_timeout=timeout_s,
+            **options
         )
     except Exception as e:
         error_msg = str(e)
@@ -33,18 +82,330 @@ def get_llm(api_key: str):
         print(f"Erro ao criar LLM: {error_msg}")
         raise e
 
-def get_dataset_preview(df: pd.DataFrame) -> str:
-    """Preview compacto para reduzir tokens."""
-    MAX_COLS = 30
+
+def get_llm(api_key: str, model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE,
+            max_output_tokens: int | None = None, timeout_s: float = DEFAULT_TIMEOUT_S):
+    """Retorna o cliente do Gemini compartilhado para (api_key, modelo, temperatura, limites)."""
+    key = (api_key, model, temperature, max_output_tokens, timeout_s)
+    llm = _llms.get(key)
+    if llm is None:
+        with _registry_lock:
+            llm = _llms.get(key)
+            if llm is None:
+                llm = _create_llm(api_key, model, temperature, max_output_tokens=max_output_tokens, timeout_s=timeout_s)
+                _llms[key] = llm
+    return llm
+
+
+def get_agent_chain(agent_name: str, prompt_template: str, api_key: str,
+                    model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE):
+    """Retorna a chain `prompt | llm | StrOutputParser` do agente, construída uma única vez."""
+    key = (agent_name, api_key, model, temperature)
+    chain = _chains.get(key)
+    if chain is None:
+        with _registry_lock:
+            chain = _chains.get(key)
+            if chain is None:
+                prompt = ChatPromptTemplate.from_template(prompt_template)
+                chain = prompt | get_llm(api_key, model, temperature) | StrOutputParser()
+                _chains[key] = chain
+    return chain
+
+
+def split_prompt_template(prompt_template: str) -> tuple[str, str]:
+    """Divide o template em (cabeçalho, corpo).
+
+    O cabeçalho é o texto estático antes do parágrafo do primeiro placeholder (com as chaves
+    escapadas já resolvidas). O corpo segue como template até o fim, mantendo as instruções
+    finais (formato da resposta) depois dos dados e da pergunta.
+    """
+    placeholder = re.search(r"(?<!\{)\{(?!\{)\w+\}", prompt_template)
+    if placeholder is None:
+        return prompt_template.replace("{{", "{").replace("}}", "}").strip(), ""
+    start = prompt_template.rfind("\n\n", 0, placeholder.start())
+    start = 0 if start == -1 else start + 2
+    head = prompt_template[:start].replace("{{", "{").replace("}}", "}").strip()
+    return head, prompt_template[start:].strip()
+
+
+def get_prefixed_chain(agent_name: str, prompt_template: str, api_key: str, model: str = DEFAULT_MODEL,
+                       temperature: float = DEFAULT_TEMPERATURE, max_output_tokens: int | None = None,
+                       timeout_s: float = DEFAULT_TIMEOUT_S):
+    """Chain com o prefixo estável em uma mensagem de sistema (`prompt_prefix`) e o corpo variável depois."""
+    key = ("prefixed", agent_name, api_key, model, temperature, max_output_tokens, timeout_s)
+    chain = _chains.get(key)
+    if chain is None:
+        with _registry_lock:
+            chain = _chains.get(key)
+            if chain is None:
+                _, body = split_prompt_template(prompt_template)
+                prompt = ChatPromptTemplate.from_messages([("system", "{prompt_prefix}"), ("human", body)])
+                llm = get_llm(api_key, model, temperature, max_output_tokens, timeout_s)
+                chain = prompt | llm | StrOutputParser()
+                _chains[key] = chain
+    return chain
+
+
+def invalidate_llm_registry(api_key: str | None = None):
+    """Descarta clientes e chains (de uma chave de API ou todos) para forçar a recriação."""
+    with _registry_lock:
+        for registry in (_llms, _chains):
+            for key in list(registry):
+                # A chave de API é o 1º elemento em _llms, o 2º em _chains e o 3º nas chains com prefixo
+                registry_api_key = key[0] if registry is _llms else key[2] if key[0] == "prefixed" else key[1]
+                if api_key is None or registry_api_key == api_key:
+                    del registry[key]
+
+
+def configure_agent_profiles(profiles: dict):
+    """Define os perfis de modelo por agente (`get_config()["agent_profiles"]`)."""
+    _agent_profiles.clear()
+    _agent_profiles.update({agent: dict(profile) for agent, profile in (profiles or {}).items()})
+
+
+def get_agent_profile(agent_name: str) -> dict:
+    """Perfil de modelo do agente; agentes sem perfil usam o modelo padrão."""
+    return {**DEFAULT_PROFILE, **_agent_profiles.get(agent_name, {})}
+
+
+# Erros que indicam cliente ou credencial com problema (e não falha do código ou da resposta)
+CONNECTION_ERROR_MARKERS = (
+    "connection", "connect", "network", "unavailable", "503", "ssl", "dns", "reset by peer",
+    "401", "403", "unauthenticated", "permission_denied", "permission denied", "api key", "api_key",
+)
+
+_health_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-health")
+_health_checks = set()  # chaves com verificação em andamento
+_health_lock = threading.Lock()
+
+
+def _is_timeout_error(error: Exception) -> bool:
+    text = f"{type(error).__name__} {error}".lower()
+    return isinstance(error, TimeoutError) or any(marker in text for marker in ("timeout", "timed out", "deadline"))
+
+
+def _record_latency(agent_name: str, model: str, elapsed_s: float, timed_out: bool = False, fallback: bool = False):
+    with _latency_lock:
+        entry = _latency.setdefault((agent_name, model), {
+            "calls": 0, "total_s": 0.0, "max_s": 0.0, "timeouts": 0, "fallbacks": 0,
+        })
+        entry["calls"] += 1
+        entry["total_s"] += elapsed_s
+        entry["max_s"] = max(entry["max_s"], elapsed_s)
+        entry["timeouts"] += int(timed_out)
+        entry["fallbacks"] += int(fallback)
+
+
+def get_profile_latency_stats() -> dict:
+    """Latência observada por agente e modelo: chamadas, média, máxima, timeouts e fallbacks."""
+    with _latency_lock:
+        stats = {f"{agent}/{model}": dict(entry) for (agent, model), entry in _latency.items()}
+    for entry in stats.values():
+        entry["avg_s"] = entry["total_s"] / entry["calls"] if entry["calls"] else 0.0
+    return stats
+
+
+def check_llm_health(api_key: str, model: str = DEFAULT_MODEL) -> dict:
+    """Faz uma chamada mínima ao modelo; em caso de falha, invalida os clientes da chave."""
+    start = time.perf_counter()
+    try:
+        call_with_rate_limit(api_key, model, lambda: get_llm(api_key, model).invoke("ping"), retry=lambda: False)
+        return {"ok": True, "model": model, "latency_s": time.perf_counter() - start, "error": None}
+    except Exception as e:
+        invalidate_llm_registry(api_key)
+        return {"ok": False, "model": model, "latency_s": time.perf_counter() - start, "error": str(e)}
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Se o erro é de conexão ou de autenticação com o provedor do LLM."""
+    text = f"{type(error).__name__} {error}".lower()
+    return isinstance(error, ConnectionError) or any(marker in text for marker in CONNECTION_ERROR_MARKERS)
+
+
+def _run_health_check(api_key: str):
+    try:
+        health = check_llm_health(api_key)
+        if not health["ok"]:
+            print(f"Cliente do LLM recriado após falha: {health['error']}")
+    finally:
+        with _health_lock:
+            _health_checks.discard(api_key)
+
+
+def schedule_llm_health_check(api_key: str, error: Exception) -> bool:
+    """Agenda `check_llm_health` em segundo plano, só para erros de conexão ou autenticação.
+
+    Os demais erros não gastam uma requisição extra; a verificação também não atrasa a exibição
+    do erro, e há no máximo uma em andamento por chave.
+    """
+    if not is_connection_error(error):
+        return False
+    with _health_lock:
+        if api_key in _health_checks:
+            return True
+        _health_checks.add(api_key)
+    _health_executor.submit(_run_health_check, api_key)
+    return True
+
+
+def response_cache_key(agent_name: str, prompt_template: str, fingerprint: str, inputs: dict,
+                       model: str = DEFAULT_MODEL) -> str:
+    """Chave do cache: agente, modelo, versão do prompt (hash do template), dataset e entradas."""
+    payload = json.dumps({
+        "agent": agent_name,
+        "model": model,
+        "prompt": hashlib.sha256(prompt_template.encode()).hexdigest(),
+        "dataset": fingerprint,
+        "inputs": inputs,
+    }, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def invoke_agent(agent_name: str, prompt_template: str, api_key: str, inputs: dict,
+                 df: pd.DataFrame | None = None, ttl_s: float | None = None, validate=None,
+                 on_token=None) -> str:
+    """Invoca a chain do agente passando pelo cache de respostas.
+
+    Com `on_token`, a resposta é transmitida via `chain.stream` e cada trecho é repassado ao
+    callback assim que chega (uma resposta em cache é repassada de uma vez). O retorno é sempre
+    o texto completo. Respostas vazias, ou rejeitadas por `validate(resposta)`, não são gravadas
+    no cache. O modelo, o limite de tokens de saída e o timeout vêm do perfil do agente; em
+    timeout, a chamada é repetida no modelo de fallback do perfil. A chamada passa pelo
+    limitador de requisições (`utils/rate_limiter.py`), e chamadas idênticas simultâneas são
+    coalescidas em uma só.
+    """
+    profile = get_agent_profile(agent_name)
+    fingerprint = get_dataset_fingerprint(df) if df is not None else ""
+    key = response_cache_key(agent_name, prompt_template, fingerprint, inputs, profile["model"])
+    cached = get_cached_response(key)
+    if cached is not None:
+        print(f"{agent_name}: resposta reaproveitada do cache")
+        if on_token is not None:
+            on_token(cached)
+        return cached
+
+    chunks = []
+
+    def call_model(model: str, fallback: bool = False) -> str:
+        # Prefixo estável (instruções + visão geral do dataset) primeiro, para o cache implícito do provedor
+        prefix = get_prompt_prefix(agent_name, prompt_template, df)
+        chain = get_prefixed_chain(agent_name, prompt_template, api_key, model,
+                                   max_output_tokens=profile["max_output_tokens"], timeout_s=profile["timeout_s"])
+        chain_inputs = {**inputs, "prompt_prefix": prefix}
+
+        def stream():
+            for chunk in chain.stream(chain_inputs):
+                chunks.append(chunk)
+                on_token(chunk)
+            return "".join(chunks)
+
+        start = time.perf_counter()
+        try:
+            if on_token is None:
+                response = call_with_rate_limit(api_key, model, lambda: chain.invoke(chain_inputs))
+            else:
+                # Só repete após erro de cota se nada tiver sido transmitido ainda
+                response = call_with_rate_limit(api_key, model, stream, retry=lambda: not chunks)
+        except Exception as e:
+            _record_latency(agent_name, model, time.perf_counter() - start, timed_out=_is_timeout_error(e), fallback=fallback)
+            raise
+        _record_latency(agent_name, model, time.perf_counter() - start, fallback=fallback)
+        return response
+
+    def call():
+        try:
+            response = call_model(profile["model"])
+        except Exception as e:
+            fallback_model = profile["fallback_model"]
+            if not fallback_model or fallback_model == profile["model"] or chunks or not _is_timeout_error(e):
+                raise
+            print(f"{agent_name}: timeout de {profile['timeout_s']}s em {profile['model']}; tentando {fallback_model}")
+            response = call_model(fallback_model, fallback=True)
+        # Grava antes de encerrar a chamada coalescida, para que pedidos seguintes já achem no cache
+        if response and response.strip() and (validate is None or validate(response)):
+            store_cached_response(key, agent_name, response, ttl_s or AGENT_CACHE_TTL_S.get(agent_name, DEFAULT_TTL_S))
+        return response
+
+    # Pedidos idênticos simultâneos (outras sessões com o mesmo dataset e pergunta) compartilham a chamada
+    response, shared = coalesce(key, call)
+    if shared:
+        print(f"{agent_name}: resposta compartilhada com uma chamada idêntica em andamento")
+        if on_token is not None:
+            on_token(response)
+    return response
+
+
+def _memoized_prompt_part(key: tuple, build):
+    with _prompt_parts_lock:
+        if key in _prompt_parts:
+            _prompt_parts.move_to_end(key)
+            return _prompt_parts[key]
+    value = build()
+    with _prompt_parts_lock:
+        _prompt_parts[key] = value
+        if len(_prompt_parts) > MAX_CACHED_PROMPT_PARTS:
+            _prompt_parts.popitem(last=False)
+    return value
+
+
+def get_dataset_overview(df: pd.DataFrame, budget_tokens: int = OVERVIEW_BUDGET_TOKENS) -> str:
+    """Visão geral estável do dataset (shape, nomes e tipos das colunas), memoizada por fingerprint."""
+    def build():
+        names, used = [], 0
+        entries = get_column_catalog(df)["entries"]
+        for entry in entries:
+            name = f"{entry['name']} ({entry['dtype']})"
+            used += len(name) // 4 + 1
+            if used > budget_tokens:
+                break
+            names.append(name)
+        more = f" ... (+{len(entries) - len(names)} colunas)" if len(names) < len(entries) else ""
+        return f"Shape: {df.shape}\nColunas e tipos: {', '.join(names)}{more}"
+    return _memoized_prompt_part(("overview", get_dataset_fingerprint(df), budget_tokens), build)
+
+
+def get_prompt_prefix(agent_name: str, prompt_template: str, df: pd.DataFrame | None = None) -> str:
+    """Parte estável do prompt do agente: instruções iniciais do template e visão geral do dataset.
+
+    É idêntica entre chamadas para o mesmo agente e dataset, o que permite ao provedor
+    reaproveitar o processamento desses tokens (cache implícito de prefixo).
+    """
+    def build():
+        head, _ = split_prompt_template(prompt_template)
+        parts = [head]
+        if df is not None:
+            parts.append(f"**Visão Geral do Dataset:**\n{get_dataset_overview(df)}")
+        return "\n\n".join(part for part in parts if part)
+    template_hash = hashlib.sha256(prompt_template.encode()).hexdigest()
+    fingerprint = get_dataset_fingerprint(df) if df is not None else ""
+    return _memoized_prompt_part(("prefix", agent_name, template_hash, fingerprint), build)
+
+
+def get_dataset_preview(df: pd.DataFrame, question: str = "", budget_tokens: int = PREVIEW_BUDGET_TOKENS) -> str:
+    """Preview compacto para reduzir tokens.
+
+    As colunas vêm do catálogo memoizado por fingerprint: as citadas na pergunta primeiro,
+    depois as demais em ordem, até o orçamento de tokens. Só as colunas escolhidas são lidas,
+    e o preview de cada (dataset, pergunta) é memoizado.
+    """
+    return _memoized_prompt_part(
+        ("preview", get_dataset_fingerprint(df), question, budget_tokens),
+        lambda: _build_dataset_preview(df, question, budget_tokens)
+    )
+
+
+def _build_dataset_preview(df: pd.DataFrame, question: str, budget_tokens: int) -> str:
     MAX_ROWS_SAMPLE = 3  # Número de linhas para amostra
-    cols = df.columns.tolist()[:MAX_COLS]
-    dtypes = {c: str(df.dtypes[c]) for c in cols}
-    sample = df[cols].head(MAX_ROWS_SAMPLE).to_dict(orient="records")
+    MAX_SAMPLE_COLS = 12  # A amostra de linhas mostra só as colunas mais relevantes
+    catalog = get_column_catalog(df)
+    selected = select_columns(catalog, question, budget_tokens)
+    cols = [entry["name"] for entry in selected]
+    sample = df[cols[:MAX_SAMPLE_COLS]].head(MAX_ROWS_SAMPLE).to_dict(orient="records")
 
     preview = (
         f"Shape: {df.shape}\n"
-        f"Columns (limited to {MAX_COLS}): {cols}\n"
-        f"Dtypes: {dtypes}\n"
-        f"Sample first {MAX_ROWS_SAMPLE} rows (dict): {sample}\n"
+        f"Columns ({len(cols)} of {df.shape[1]} shown, most relevant to the question first):\n"
+        + "\n".join(entry["line"] for entry in selected) + "\n"
+        f"Sample first {MAX_ROWS_SAMPLE} rows (dict, first {MAX_SAMPLE_COLS} columns above): {sample}\n"
     )
-    return preview
\ No newline at end of file
+    return preview
@@ -1,8 +1,6 @@
 # Arquivo: agents/code_generator.py
 
-from agents.agent_setup import get_llm, get_dataset_preview
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from agents.agent_setup import get_agent_chain, get_dataset_preview, invoke_agent
 
 PROMPT_TEMPLATE = """
 Você é o "CodeGeneratorAgent", um especialista em gerar código Python limpo e reproduzível para análise de dados.
@@ -101,17 +99,16 @@ Gere agora o código para a análise fornecida.
 """
 
 def get_code_generator_agent(api_key: str):
-    llm = get_llm(api_key)
-    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    chain = prompt | llm | StrOutputParser()
-    return chain
-
-def run_code_generator(api_key: str, dataset_info: str, analysis_to_convert: str):
-    agent = get_code_generator_agent(api_key)
-    raw_code = agent.invoke({
+    return get_agent_chain("CodeGeneratorAgent", PROMPT_TEMPLATE, api_key)
+
+def run_code_generator(api_key: str, dataset_info: str, analysis_to_convert: str, on_token=None):
+    # dataset_info já descreve o dataset, então ele mesmo entra na chave do cache
+    raw_code = invoke_agent("CodeGeneratorAgent", PROMPT_TEMPLATE, api_key, {
     "dataset_info": dataset_info,
     "analysis_to_convert": analysis_to_convert
-    })
+    }, on_token=on_token)
+
+    # A extração abaixo roda sobre a resposta completa, também no modo streaming
 
     # Melhorar a extração do código para evitar duplicatas
     if "```python" in raw_code:
@@ -1,7 +1,5 @@
 import pandas as pd
-from agents.agent_setup import get_llm, get_dataset_preview
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from agents.agent_setup import get_agent_chain, get_dataset_preview, invoke_agent
 
 PROMPT_TEMPLATE = """
 Você é o "ConsultantAgent", um consultor de dados sênior com 15 anos de experiência. Sua função é traduzir análises estatísticas em insights de negócio acionáveis.
@@ -45,17 +43,13 @@ Mantenha um tom profissional, confiante e focado em gerar valor de negócio. Use
 """
 
 def get_consultant_agent(api_key: str):
-    llm = get_llm(api_key)
-    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    chain = prompt | llm | StrOutputParser()
-    return chain
-
-def run_consultant(api_key: str, df: pd.DataFrame, all_analyses: str, user_question: str):
-    agent = get_consultant_agent(api_key)
-    dataset_preview = get_dataset_preview(df)
-    response = agent.invoke({
+    return get_agent_chain("ConsultantAgent", PROMPT_TEMPLATE, api_key)
+
+def run_consultant(api_key: str, df: pd.DataFrame, all_analyses: str, user_question: str, on_token=None):
+    dataset_preview = get_dataset_preview(df, user_question)
+    response = invoke_agent("ConsultantAgent", PROMPT_TEMPLATE, api_key, {
         "dataset_preview": dataset_preview,
         "all_analyses": all_analyses,
         "user_question": user_question
-    })
+    }, df=df, on_token=on_token)
     return response
\ No newline at end of file
@@ -1,8 +1,7 @@
 # Arquivo: agents/coordinator.py
 
-from agents.agent_setup import get_llm, get_dataset_preview
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from agents.agent_setup import get_agent_chain, get_dataset_preview, invoke_agent
+from agents.router import is_follow_up, route_question, record_router_decision
 import json
 import pandas as pd
 
@@ -63,26 +62,45 @@ def _clean_json_output(raw_output: str) -> str:
     return raw_output.strip()
 
 
+def _is_valid_json(raw_output: str) -> bool:
+    try:
+        json.loads(_clean_json_output(raw_output))
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
 def get_coordinator_agent(api_key: str):
-    llm = get_llm(api_key)
-    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    # Alteração: Agora usamos StrOutputParser para obter a string bruta do LLM
-    chain = prompt | llm | StrOutputParser()
-    return chain
+    return get_agent_chain("CoordinatorAgent", PROMPT_TEMPLATE, api_key)
 
-def run_coordinator(api_key: str, df: pd.DataFrame, conversation_history: str, user_question: str) -> dict:
+def run_coordinator(api_key: str, df: pd.DataFrame, conversation_history: str, user_question: str,
+                    use_router: bool = True) -> dict:
     """
     Executa o agente coordenador e garante que a saída seja um JSON válido.
+
+    Com `use_router`, perguntas inequívocas são roteadas localmente (`agents/router.py`)
+    sem chamar o LLM; as demais seguem para o coordenador. Perguntas que se referem ao
+    histórico sempre passam pelo coordenador, que as reformula com o contexto.
     """
-    agent = get_coordinator_agent(api_key)
-    dataset_preview = get_dataset_preview(df)
+    local_decision = route_question(user_question) if use_router else None
+    follow_up = bool(conversation_history and conversation_history.strip()) and is_follow_up(user_question)
+    if local_decision is not None and local_decision["confident"] and not follow_up:
+        record_router_decision(user_question, local_decision)
+        return {
+            "agent_to_call": local_decision["agent_to_call"],
+            "question_for_agent": user_question,
+            "rationale": f"Roteamento local ({local_decision['source']}, confiança {local_decision['confidence']:.0%}).",
+            "routed_locally": True,
+        }
+
+    dataset_preview = get_dataset_preview(df, user_question)
     
-    # 1. Invoca o agente para obter a resposta como string
-    raw_response = agent.invoke({
+    # 1. Invoca o agente (ou reaproveita a resposta do cache) para obter a resposta como string
+    raw_response = invoke_agent("CoordinatorAgent", PROMPT_TEMPLATE, api_key, {
         "dataset_preview": dataset_preview,
         "conversation_history": conversation_history,
         "user_question": user_question
-    })
+    }, df=df, validate=_is_valid_json)
     
     # 2. Limpa a string de resposta para remover o markdown
     cleaned_response = _clean_json_output(raw_response)
@@ -90,6 +108,8 @@ def run_coordinator(api_key: str, df: pd.DataFrame, conversation_history: str, u
     # 3. Tenta carregar a string limpa como um objeto JSON
     try:
         json_response = json.loads(cleaned_response)
+        if local_decision is not None:
+            record_router_decision(user_question, local_decision, llm_agent=json_response.get("agent_to_call"))
         return json_response
     except json.JSONDecodeError as e:
         # Se falhar, isso indica um problema mais sério com a saída do LLM
@@ -1,7 +1,6 @@
 import pandas as pd
-from agents.agent_setup import get_llm, get_dataset_preview
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from agents.agent_setup import get_agent_chain, get_dataset_preview, invoke_agent
+from utils.stats_tools import compute_analyst_stats
 
 PROMPT_TEMPLATE = """
 Você é o "DataAnalystAgent", um especialista em análise de dados com PhD em Estatística. Sua tarefa é analisar o dataset fornecido e responder à pergunta do usuário de forma precisa e técnica.
@@ -12,12 +11,15 @@ Você é o "DataAnalystAgent", um especialista em análise de dados com PhD em E
 **Histórico da Conversa e Análises Anteriores:**
 {analysis_context}
 
+**Resultados Calculados Localmente (a primeira linha indica se sobre o dataset completo ou uma amostra):**
+{local_stats}
+
 **Pergunta Específica para Você:**
 "{specific_question}"
 
 **Sua Resposta Deve Conter:**
 1.  **Análise Direta**: Responda à pergunta com análises estatísticas detalhadas.
-2.  **Métricas Relevantes**: Forneça números específicos (médias, medianas, desvios padrão, correlações, p-values, etc.).
+2.  **Métricas Relevantes**: Use os números dos Resultados Calculados Localmente (médias, medianas, desvios padrão, correlações, p-values, etc.). Não estime nem invente valores que não estejam lá; interprete-os.
 3.  **Observações Técnicas**: Aponte padrões estatisticamente significativos, outliers (usando IQR ou Z-score), ou qualquer outra descoberta relevante.
 4.  **Concisão**: Seja objetivo e foque nos dados. Não forneça conclusões de negócio, apenas os fatos analíticos.
 
@@ -25,12 +27,11 @@ Formate sua resposta usando Markdown para clareza.
 """
 
 def get_data_analyst_agent(api_key: str):
-    llm = get_llm(api_key)
-    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    chain = prompt | llm | StrOutputParser()
-    return chain
+    return get_agent_chain("DataAnalystAgent", PROMPT_TEMPLATE, api_key)
 
-def run_data_analyst(api_key: str, df: pd.DataFrame, analysis_context: str, specific_question: str):
+def run_data_analyst(api_key: str, df: pd.DataFrame, analysis_context: str, specific_question: str, on_token=None,
+                     total_rows: int | None = None):
+    """`total_rows` é o número real de linhas quando `df` é uma amostra (upload em blocos)."""
     try:
         # Verifica se o DataFrame está vazio
         if df.empty:
@@ -40,26 +41,33 @@ def run_data_analyst(api_key: str, df: pd.DataFrame, analysis_context: str, spec
         if not specific_question or not specific_question.strip():
             return "Erro: Nenhuma pergunta específica foi fornecida para análise."
             
-        # Obtém o agente e os dados
-        agent = get_data_analyst_agent(api_key)
-        dataset_preview = get_dataset_preview(df)
+        # Obtém os dados
+        dataset_preview = get_dataset_preview(df, specific_question)
         
         # Verifica se o preview do dataset foi gerado corretamente
         if not dataset_preview:
             return "Erro: Não foi possível gerar o preview do dataset."
             
-        # Executa a análise
-        response = agent.invoke({
+        # Calcula localmente as estatísticas da pergunta; o agente só interpreta os números
+        try:
+            local_stats = compute_analyst_stats(df, specific_question, total_rows=total_rows)
+        except Exception as e:
+            print(f"Erro ao calcular estatísticas locais: {str(e)}")
+            local_stats = "Não disponível."
+
+        # Executa a análise (ou reaproveita a resposta do cache)
+        response = invoke_agent("DataAnalystAgent", PROMPT_TEMPLATE, api_key, {
             "dataset_preview": dataset_preview,
             "analysis_context": analysis_context or "Nenhum contexto de análise anterior fornecido.",
+            "local_stats": local_stats,
             "specific_question": specific_question
-        })
+        }, df=df, validate=lambda r: r.strip() != "undefined", on_token=on_token)
         
         # Verifica se a resposta é válida
         if not response or response.strip() == "undefined":
             return "Desculpe, não foi possível gerar uma análise para esta pergunta. Por favor, tente reformular sua pergunta."
         
-        # Remove any trailing 'undefined' and clean up the response
+        # Remove any trailing 'undefined' and clean up the response (sobre o texto completo, mesmo em streaming)
         cleaned_response = response.strip()
         if cleaned_response.endswith('undefined'):
             cleaned_response = cleaned_response[:-9].strip()
@@ -0,0 +1,229 @@
+# Arquivo: agents/router.py
+
+"""
+Roteador local, usado antes do CoordinatorAgent.
+
+Perguntas inequívocas ("mostre um histograma", "gere o código", "qual a média") são
+classificadas em microssegundos por regras de palavras-chave e por um Naive Bayes pequeno,
+treinado com os exemplos do prompt do coordenador. Só quando a confiança é baixa a pergunta
+segue para o LLM. Cada decisão é registrada em `.cache/router_log.jsonl` (com rotação por
+tamanho e só o hash da pergunta) e nos contadores de `get_router_stats`, para medir a
+concordância com o coordenador.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+AGENTS = ("DataAnalystAgent", "VisualizationAgent", "ConsultantAgent", "CodeGeneratorAgent")
+MIN_CONFIDENCE = 0.85  # probabilidade mínima para dispensar o LLM
+# Peso de uma regra de palavras-chave como evidência (razão de verossimilhança) sobre a
+# probabilidade do Naive Bayes: uma palavra solta ("total", "plot") não basta quando o modelo
+# discorda; é preciso P(agente) >= ~0.49 para a regra atingir `MIN_CONFIDENCE`
+RULE_LIKELIHOOD_RATIO = 6.0
+ROUTER_LOG = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.cache', 'router_log.jsonl')
+ROUTER_LOG_MAX_BYTES = 1024 * 1024  # ao passar do limite, o log vira `router_log.jsonl.1` (substituindo o anterior)
+
+# Regras aplicadas ao texto sem acentos e em minúsculas. Pedidos de código têm prioridade,
+# pois "me dê o código para esse gráfico" também menciona um gráfico.
+CODE_RULES = re.compile(
+    r"\b(codigo|script|notebook|jupyter|python|knn|kernel density)\b"
+)
+RULES = {
+    "VisualizationAgent": re.compile(
+        r"\b(grafico|graficos|histograma|scatter|heatmap|mapa de calor|boxplot|box plot|plot|plote|"
+        r"visualiza\w*|dispersao|pizza|barras|linha do tempo|desenhe)\b"
+    ),
+    "ConsultantAgent": re.compile(
+        r"\b(insights?|recomenda\w*|negocio|conclus\w*|por que|porque|significa\w*|estrategi\w*|"
+        r"interpret\w*|decis\w*|sugere|implica\w*)\b"
+    ),
+    "DataAnalystAgent": re.compile(
+        r"\b(media|mediana|moda|correlacao|correlacoes|quantos|quantas|desvio|variancia|outliers?|"
+        r"estatisticas?|nulos|faltantes|duplicad\w*|percentis?|quartis?|minimo|maximo|tipos de dados|"
+        r"contagem|soma|total)\b"
+    ),
+}
+
+# Exemplos do prompt do coordenador, acrescidos de variações comuns, para treinar o Naive Bayes
+TRAINING_EXAMPLES = [
+    ("Qual a correlação entre as colunas X e Y?", "DataAnalystAgent"),
+    ("Faça uma análise completa", "DataAnalystAgent"),
+    ("Quais são os tipos de dados e estatísticas básicas deste dataset?", "DataAnalystAgent"),
+    ("Quantos valores nulos existem em cada coluna?", "DataAnalystAgent"),
+    ("Qual a média e o desvio padrão das variáveis numéricas?", "DataAnalystAgent"),
+    ("Existem outliers nos dados?", "DataAnalystAgent"),
+    ("Quantas linhas duplicadas o dataset possui?", "DataAnalystAgent"),
+    ("Quais padrões existem nos dados?", "DataAnalystAgent"),
+    ("Mostre a distribuição da idade", "VisualizationAgent"),
+    ("Mostre um histograma das variáveis numéricas", "VisualizationAgent"),
+    ("Crie um scatter plot entre X e Y", "VisualizationAgent"),
+    ("Gere um heatmap de correlação", "VisualizationAgent"),
+    ("Faça um gráfico de barras por categoria", "VisualizationAgent"),
+    ("Plote a evolução ao longo do tempo", "VisualizationAgent"),
+    ("Visualize os outliers com um boxplot", "VisualizationAgent"),
+    ("O que esses dados significam para o meu negócio?", "ConsultantAgent"),
+    ("Quais insights podemos tirar desta análise?", "ConsultantAgent"),
+    ("Quais são suas recomendações?", "ConsultantAgent"),
+    ("Quais conclusões podemos tirar?", "ConsultantAgent"),
+    ("Por que as vendas caíram?", "ConsultantAgent"),
+    ("Que decisões devo tomar com base nesses resultados?", "ConsultantAgent"),
+    ("Me dê o código para gerar esse gráfico de barras", "CodeGeneratorAgent"),
+    ("Gere um gráfico KNN gaussiano", "CodeGeneratorAgent"),
+    ("Gere o código para esta análise", "CodeGeneratorAgent"),
+    ("Crie um notebook Jupyter", "CodeGeneratorAgent"),
+    ("Escreva um script Python", "CodeGeneratorAgent"),
+    ("Como faço isso em Python?", "CodeGeneratorAgent"),
+]
+
+_lock = threading.Lock()
+_stats = {"local": 0, "llm": 0, "compared": 0, "agreed": 0, "by_source": Counter()}
+
+
+# Referências a turnos anteriores ("e para a coluna X?", "faça o mesmo", "esse gráfico"): a pergunta
+# sozinha não basta ao especialista, que precisa da reformulação do coordenador com o histórico
+FOLLOW_UP_RULES = re.compile(
+    r"^(e|e quanto|e se|agora|entao)\b|"
+    r"\b(ess[ea]s?|isso|est[ea]s?|isto|aquel[ea]s?|aquilo|dess[ea]s?|disso|dest[ea]s?|disto|ness[ea]s?|nisso|"
+    r"nest[ea]s?|del[ea]s?|o mesmo|a mesma|os mesmos|as mesmas|anterior|anteriores|acima|ultim[oa]|"
+    r"tambem|de novo|novamente|outra vez|mesmo grafico|mesma analise)\b"
+)
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _tokenize(text: str) -> list:
+    return re.findall(r"[a-z0-9]+", _normalize(text))
+
+
+def _train(examples: list) -> dict:
+    """Naive Bayes multinomial com suavização de Laplace."""
+    word_counts = {agent: Counter() for agent in AGENTS}
+    doc_counts = Counter()
+    for text, agent in examples:
+        word_counts[agent].update(_tokenize(text))
+        doc_counts[agent] += 1
+    vocabulary = set().union(*word_counts.values())
+    return {
+        "log_prior": {a: math.log(doc_counts[a] / len(examples)) for a in AGENTS},
+        "log_likelihood": {
+            a: {w: math.log((word_counts[a][w] + 1) / (sum(word_counts[a].values()) + len(vocabulary)))
+                for w in vocabulary}
+            for a in AGENTS
+        },
+        "vocabulary": vocabulary,
+    }
+
+
+_model = _train(TRAINING_EXAMPLES)
+
+
+def _predict_proba(question: str) -> dict:
+    tokens = [t for t in _tokenize(question) if t in _model["vocabulary"]]
+    scores = {
+        a: _model["log_prior"][a] + sum(_model["log_likelihood"][a][t] for t in tokens)
+        for a in AGENTS
+    }
+    top = max(scores.values())
+    exp_scores = {a: math.exp(s - top) for a, s in scores.items()}
+    total = sum(exp_scores.values())
+    return {a: v / total for a, v in exp_scores.items()}
+
+
+def _with_rule_evidence(probability: float) -> float:
+    """Probabilidade do agente depois de considerar a regra que o apontou."""
+    odds = RULE_LIKELIHOOD_RATIO * probability
+    return odds / (odds + 1 - probability)
+
+
+def is_follow_up(question: str) -> bool:
+    """Se a pergunta se refere a turnos anteriores da conversa (e depende do histórico)."""
+    return bool(FOLLOW_UP_RULES.search(_normalize(question)))
+
+
+def route_question(question: str) -> dict:
+    """Classifica a pergunta localmente.
+
+    Retorna o agente previsto, a confiança, a origem (`rules` ou `model`) e se a decisão é
+    confiável o bastante (`confident`) para dispensar o coordenador. Uma regra escolhe o agente,
+    mas a confiança continua vindo do Naive Bayes, reforçada por `RULE_LIKELIHOOD_RATIO`.
+    """
+    start = time.perf_counter()
+    text = _normalize(question)
+    proba = _predict_proba(question)
+    if CODE_RULES.search(text):
+        agent, confidence, source = "CodeGeneratorAgent", _with_rule_evidence(proba["CodeGeneratorAgent"]), "rules"
+    else:
+        matched = [agent for agent, pattern in RULES.items() if pattern.search(text)]
+        if "VisualizationAgent" in matched and "ConsultantAgent" not in matched:
+            # "gráfico da média por categoria" é um pedido de gráfico, não de estatística
+            matched = ["VisualizationAgent"]
+        if len(matched) == 1:
+            agent, confidence, source = matched[0], _with_rule_evidence(proba[matched[0]]), "rules"
+        else:
+            # Nenhuma regra ou regras conflitantes: decide o modelo, restrito aos agentes citados
+            candidates = matched or AGENTS
+            agent = max(candidates, key=proba.get)
+            confidence, source = proba[agent], "model"
+    return {
+        "agent_to_call": agent,
+        "confidence": confidence,
+        "source": source,
+        "confident": confidence >= MIN_CONFIDENCE,
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+    }
+
+
+def _log_decision(entry: dict):
+    try:
+        os.makedirs(os.path.dirname(ROUTER_LOG), exist_ok=True)
+        with _lock:
+            if os.path.exists(ROUTER_LOG) and os.path.getsize(ROUTER_LOG) > ROUTER_LOG_MAX_BYTES:
+                os.replace(ROUTER_LOG, ROUTER_LOG + ".1")
+            with open(ROUTER_LOG, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"Não foi possível registrar a decisão do roteador: {e}")
+
+
+def record_router_decision(question: str, decision: dict, llm_agent: str | None = None):
+    """Registra a decisão local e, quando o coordenador também foi chamado, se os dois concordaram."""
+    with _lock:
+        if llm_agent is None:
+            _stats["local"] += 1
+            _stats["by_source"][decision["source"]] += 1
+        else:
+            _stats["llm"] += 1
+            _stats["compared"] += 1
+            _stats["agreed"] += int(llm_agent == decision["agent_to_call"])
+    agreement = "" if llm_agent is None else f", coordenador: {llm_agent}"
+    print(f"Roteador local: {decision['agent_to_call']} ({decision['source']}, "
+          f"confiança {decision['confidence']:.0%}{agreement})")
+    _log_decision({
+        "ts": time.time(),
+        # Hash em vez do texto: permite agrupar perguntas repetidas sem gravar o que o usuário escreveu
+        "question_hash": hashlib.blake2b(_normalize(question).strip().encode("utf-8"), digest_size=8).hexdigest(),
+        "local_agent": decision["agent_to_call"],
+        "confidence": round(decision["confidence"], 4),
+        "source": decision["source"],
+        "used_local": llm_agent is None,
+        "llm_agent": llm_agent,
+    })
+
+
+def get_router_stats() -> dict:
+    """Contadores desde o início do processo: decisões locais, chamadas ao LLM e concordância."""
+    with _lock:
+        stats = {**_stats, "by_source": dict(_stats["by_source"])}
+    total = stats["local"] + stats["llm"]
+    stats["local_rate"] = stats["local"] / total if total else 0.0
+    stats["agreement_rate"] = stats["agreed"] / stats["compared"] if stats["compared"] else None
+    return stats
@@ -0,0 +1,107 @@
+# Arquivo: agents/speculation.py
+
+"""
+Execução especulativa do agente especialista, em paralelo com o CoordinatorAgent.
+
+Quando o roteador local não tem confiança suficiente para dispensar o coordenador, o agente
+que ele considera mais provável é iniciado em segundo plano com a pergunta original, ao mesmo
+tempo que o coordenador. Se o coordenador escolher o mesmo agente, o resultado especulativo é
+usado e a segunda ida ao LLM deixa de existir; caso contrário, ele é cancelado (se ainda não
+começou) ou descartado. Como o pool inicia a chamada na hora, quase todo erro já gastou uma
+requisição: acertos, erros, requisições desperdiçadas e o tempo economizado ficam em
+`get_speculation_stats`, e a especulação é suspensa quando a cota diária está perto do fim.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.router import is_follow_up, route_question
+from utils.rate_limiter import get_rate_limit_stats
+
+MIN_DAILY_QUOTA_FRACTION = 0.25  # abaixo desta fração da cota diária, a cota fica para as chamadas necessárias
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculation")
+_lock = threading.Lock()
+_stats = {"started": 0, "hits": 0, "misses": 0, "cancelled": 0, "wasted_requests": 0, "skipped_low_quota": 0,
+          "saved_s": 0.0}
+
+
+def _daily_quota_low() -> bool:
+    rate_stats = get_rate_limit_stats()
+    min_remaining = rate_stats["limits"]["rpd"] * MIN_DAILY_QUOTA_FRACTION
+    return any(quota["remaining_day"] < min_remaining for quota in rate_stats["quota"].values())
+
+
+class Speculation:
+    """Execução em andamento do agente previsto para uma pergunta."""
+
+    def __init__(self, agent_name: str, question: str, call):
+        self.agent_name = agent_name
+        self.question = question
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        self.future = _executor.submit(self._run, call)
+
+    def _run(self, call):
+        try:
+            return call()
+        finally:
+            self.finished_at = time.perf_counter()
+
+
+def start_speculation(question: str, build_call) -> Speculation | None:
+    """Inicia o agente previsto para `question`, ou retorna None se não houver o que especular.
+
+    `build_call(agent_name)` retorna a função que executa o agente (sem tocar na interface),
+    ou None se o agente não puder ser executado especulativamente.
+    """
+    if is_follow_up(question):
+        return None  # o especialista precisa da pergunta reformulada pelo coordenador com o histórico
+    prediction = route_question(question)
+    if prediction["confident"]:
+        return None  # o coordenador vai rotear localmente, sem ida ao LLM para sobrepor
+    if _daily_quota_low():
+        with _lock:
+            _stats["skipped_low_quota"] += 1
+        return None
+    call = build_call(prediction["agent_to_call"])
+    if call is None:
+        return None
+    with _lock:
+        _stats["started"] += 1
+    return Speculation(prediction["agent_to_call"], question, call)
+
+
+def resolve_speculation(speculation: Speculation | None, agent_to_call: str):
+    """Resultado especulativo se o coordenador escolheu o mesmo agente; senão descarta e retorna None."""
+    if speculation is None:
+        return None
+    resolved_at = time.perf_counter()
+    if speculation.agent_name != agent_to_call:
+        cancelled = speculation.future.cancel()
+        with _lock:
+            _stats["misses"] += 1
+            _stats["cancelled"] += int(cancelled)
+            _stats["wasted_requests"] += int(not cancelled)  # a chamada já tinha começado
+        print(f"Especulação descartada: previsto {speculation.agent_name}, coordenador escolheu {agent_to_call}")
+        return None
+
+    result = speculation.future.result()
+    # Economia: trabalho do especialista que já estava feito (ou em andamento) quando o coordenador terminou
+    finished_at = speculation.finished_at or resolved_at
+    saved_s = max(0.0, min(finished_at, resolved_at) - speculation.started_at)
+    with _lock:
+        _stats["hits"] += 1
+        _stats["saved_s"] += saved_s
+    print(f"Especulação confirmada para {agent_to_call}: {saved_s:.2f}s economizados")
+    return result
+
+
+def get_speculation_stats() -> dict:
+    """Contadores da execução especulativa: taxa de acerto, requisições desperdiçadas e tempo economizado."""
+    with _lock:
+        stats = dict(_stats)
+    resolved = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / resolved if resolved else 0.0
+    stats["avg_saved_s"] = stats["saved_s"] / stats["hits"] if stats["hits"] else 0.0
+    return stats
@@ -1,9 +1,7 @@
 # Arquivo: agents/visualization.py
 
 import pandas as pd
-from agents.agent_setup import get_llm, get_dataset_preview
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from agents.agent_setup import get_agent_chain, get_dataset_preview, invoke_agent
 
 PROMPT_TEMPLATE = """
 Você é o "VisualizationAgent", um especialista em visualização de dados. Sua tarefa é gerar o código Python para criar um gráfico interativo usando a biblioteca Plotly.
@@ -43,19 +41,15 @@ fig.update_layout(bargap=0.1)
 """
 
 def get_visualization_agent(api_key: str):
-    llm = get_llm(api_key)
-    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    chain = prompt | llm | StrOutputParser()
-    return chain
+    return get_agent_chain("VisualizationAgent", PROMPT_TEMPLATE, api_key)
 
 def run_visualization(api_key: str, df: pd.DataFrame, analysis_results: str, user_request: str):
-    agent = get_visualization_agent(api_key)
-    dataset_preview = get_dataset_preview(df)
-    raw_code = agent.invoke({
+    dataset_preview = get_dataset_preview(df, user_request)
+    raw_code = invoke_agent("VisualizationAgent", PROMPT_TEMPLATE, api_key, {
         "dataset_preview": dataset_preview,
         "analysis_results": analysis_results,
         "user_request": user_request
-    })
+    }, df=df)
 
     if "```python" in raw_code:
         clean_code = raw_code.split("```python")[1].split("```")[0].strip()
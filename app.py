@@ -1,9 +1,5 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-import matplotlib.pyplot as plt
-import numpy as np
 from uuid import uuid4
 import time
 import os
@@ -12,13 +8,19 @@ from pathlib import Path
 # Importações dos módulos do projeto
 from utils.config import get_config
 from utils.memory import SupabaseMemory
-from utils.data_loader import load_csv, get_dataset_info
-from utils.chart_cache import exec_with_cache
+from utils.data_loader import load_csv, get_dataset_info, get_basic_dataset_info
+from utils.dataset_store import load_csv_chunked
+from utils.dataset_profile import start_profile_job
+from utils.chart_cache import configure_chart_cache, exec_with_cache, get_chart_cache_stats
+from utils.code_sandbox import configure_sandbox, get_sandbox_stats, run_in_sandbox, warm_up_sandbox
+from utils.llm_cache import get_llm_cache_stats
+from utils.conversation_context import ConversationContext
+from utils.rate_limiter import QuotaExceededError, configure_rate_limits, get_rate_limit_stats
 
 # Importação dos componentes de UI
-from components.ui_components import build_sidebar, display_chat_message, display_code_with_streamlit_suggestion
+from components.ui_components import build_sidebar, display_chat_message, display_code_with_streamlit_suggestion, display_reduction_notice, stream_chat_message
 from components.notebook_generator import create_jupyter_notebook
-from components.suggestion_generator import generate_dynamic_suggestions, get_fallback_suggestions, extract_conversation_context
+from components.suggestion_generator import get_fallback_suggestions, request_suggestions
 
 # Importação dos agentes
 from agents.coordinator import run_coordinator
@@ -26,13 +28,16 @@ from agents.data_analyst import run_data_analyst
 from agents.visualization import run_visualization
 from agents.consultant import run_consultant
 from agents.code_generator import run_code_generator
-from agents.agent_setup import get_dataset_preview
+from agents.speculation import get_speculation_stats, resolve_speculation, start_speculation
+from agents.agent_setup import configure_agent_profiles, get_profile_latency_stats, schedule_llm_health_check
 
 # Configuração do tema
 from config.theme import init_ui
 
 # --- Configurações do Sistema ---
 DEBUG_MODE = False  # Modo de depuração (True para ver mensagens detalhadas de erro)
+IN_MEMORY_MAX_MB = 200  # Acima deste tamanho o CSV é lido em blocos e gravado em disco (Parquet)
+PENDING_METRIC = "⏳"  # Exibido nos cards enquanto a métrica é calculada em segundo plano
 
 # --- Inicialização da Interface ---
 init_ui()
@@ -46,15 +51,24 @@ if 'df' not in st.session_state:
     st.session_state.df = None
 if 'df_info' not in st.session_state:
     st.session_state.df_info = None
+if 'dataset_store' not in st.session_state:
+    st.session_state.dataset_store = None
+if 'profile_job' not in st.session_state:
+    st.session_state.profile_job = None
 if 'messages' not in st.session_state:
     st.session_state.messages = []
-if 'conversation_history' not in st.session_state:
-    st.session_state.conversation_history = ""
-if 'all_analyses_history' not in st.session_state:
-    st.session_state.all_analyses_history = ""
+if 'context' not in st.session_state:
+    st.session_state.context = ConversationContext()  # histórico da conversa e das análises
+if 'suggestions' not in st.session_state:
+    st.session_state.suggestions = []
 
 # --- Carregamento de Configurações e Serviços ---
 config = get_config()
+configure_rate_limits(config["gemini_rpm"], config["gemini_rpd"])
+configure_agent_profiles(config["agent_profiles"])
+configure_chart_cache(config["chart_cache_max_mb"] * 1024 * 1024, config["chart_disk_cache_max_mb"] * 1024 * 1024)
+configure_sandbox(config["sandbox_workers"], config["sandbox_timeout_s"], config["sandbox_max_memory_mb"])
+warm_up_sandbox()  # processos de execução de código já aquecidos antes do primeiro gráfico
 
 # Verificar se a chave da API está configurada
 if not config["google_api_key"]:
@@ -91,14 +105,42 @@ with st.sidebar:
         - "Gere um gráfico de X por Y"
         """)
 
+
+def restore_messages(session_history):
+    """Mensagens do chat a partir do histórico salvo, com os gráficos reconstruídos."""
+    messages = []
+    for conversation in session_history.get("conversations", []):
+        if conversation.get("question"):
+            messages.append({"role": "user", "content": conversation["question"]})
+        if conversation.get("answer"):
+            try:
+                chart_fig = memory.load_figure(conversation.get("chart_json"))
+            except Exception as e:
+                print(f"Não foi possível restaurar o gráfico da conversa {conversation.get('id')}: {e}")
+                chart_fig = None
+            messages.append({"role": "assistant", "content": conversation["answer"], "chart_fig": chart_fig})
+    return messages
+
+
 # --- Lógica Principal de Processamento do CSV ---
 if uploaded_file is not None:
     st.sidebar.success("Arquivo CSV carregado com sucesso!")
     if st.session_state.df is None:
             try:
-                df, file_hash = load_csv(uploaded_file)
-                st.session_state.df = df
-                st.session_state.df_info = get_dataset_info(df, uploaded_file.name)
+                if uploaded_file.size > IN_MEMORY_MAX_MB * 1024 * 1024:
+                    # Arquivo grande: leitura em blocos para disco; agentes e gráficos usam uma amostra
+                    store, df, file_hash, df_info = load_csv_chunked(uploaded_file, uploaded_file.name, compact=True)
+                    st.session_state.dataset_store = store
+                    st.session_state.df = df
+                    st.session_state.df_info = df_info
+                else:
+                    df, file_hash, load_report = load_csv(uploaded_file, max_size_mb=IN_MEMORY_MAX_MB, compact=True)
+                    st.session_state.dataset_store = None
+                    st.session_state.df = df
+                    # Estatísticas completas são calculadas em segundo plano (ver profile_job)
+                    st.session_state.df_info = get_basic_dataset_info(df, uploaded_file.name, load_report=load_report)
+
+                st.session_state.profile_job = start_profile_job(df, approx_min_rows=config["approx_profile_min_rows"])
 
                 # Cria uma nova sessão no Supabase
                 session_id = memory.create_session(
@@ -114,31 +156,29 @@ if uploaded_file is not None:
                 try:
                     session_history = memory.get_session_history(session_id)
                     
-                    # Restaura o histórico de conversas
-                    if session_history["conversations"]:
-                        st.session_state.conversation_history = "\n".join(
-                            f"{'Usuário' if i % 2 == 0 else 'Assistente'}: {msg['question'] if i % 2 == 0 else msg['answer']}"
-                            for i, msg in enumerate(session_history["conversations"])
-                        )
-                    
-                    # Restaura as análises
-                    if session_history["analyses"]:
-                        st.session_state.all_analyses_history = "\n".join(
-                            f"Análise: {analysis['results'].get('analysis', '')}"
-                            for analysis in session_history["analyses"]
-                        )
+                    # Restaura o histórico de conversas e as análises como turnos estruturados
+                    st.session_state.context = ConversationContext.from_session_history(
+                        session_history, columns=st.session_state.df_info["columns"]
+                    )
+                    st.session_state.messages = restore_messages(session_history)
                         
                 except Exception as e:
                     st.error(f"Erro ao carregar histórico da sessão: {e}")
-                    st.session_state.conversation_history = ""
-                    st.session_state.all_analyses_history = f"Análise iniciada para o dataset: {uploaded_file.name}\n"
+                    st.session_state.context = ConversationContext(columns=st.session_state.df_info["columns"])
                 st.rerun()  # Força recarregamento para mostrar o dataset
             except ValueError as e:
                 st.error(f"Erro ao carregar o arquivo: {e}")
                 st.session_state.df = None
     else:
-        # Dataset já carregado, não mostrar mensagem de debug
-        pass
+        # Exibe o dialeto detectado e o tempo de carregamento do arquivo
+        load_report = (st.session_state.df_info or {}).get("load_report")
+        if load_report:
+            separator_label = {'\t': 'TAB'}.get(load_report['separator'], load_report['separator'])
+            st.sidebar.caption(
+                f"Encoding: {load_report['encoding']} · Separador: {separator_label} · "
+                f"Engine: {load_report['engine']} · {load_report['total_s']:.2f}s"
+                f"{' (cache)' if load_report.get('cache_hit') else ''}"
+            )
 
 # Verificação: se não há arquivo carregado mas há dados no estado, limpar automaticamente
 if uploaded_file is None and st.session_state.get('df') is not None:
@@ -146,10 +186,270 @@ if uploaded_file is None and st.session_state.get('df') is not None:
     # Limpar dados automaticamente
     st.session_state.df = None
     st.session_state.df_info = None
+    st.session_state.dataset_store = None
+    st.session_state.profile_job = None
     st.session_state.session_id = None
     st.session_state.messages = []
-    st.session_state.conversation_history = ""
-    st.session_state.all_analyses_history = ""
+    st.session_state.context = ConversationContext()
+
+def build_speculative_call(agent_name, question):
+    """Chamada do agente especialista que pode rodar em segundo plano (sem streaming nem interface)."""
+    api_key, df, context = config["google_api_key"], st.session_state.df, st.session_state.context
+    if agent_name == "DataAnalystAgent":
+        analysis_context = context.relevant_analyses(agent_name, question)
+        total_rows = (st.session_state.df_info or {}).get("shape", df.shape)[0]
+        return lambda: run_data_analyst(api_key=api_key, df=df, analysis_context=analysis_context, specific_question=question,
+                                        total_rows=total_rows)
+    if agent_name == "VisualizationAgent":
+        analysis_results = context.relevant_analyses(agent_name, question)
+        return lambda: run_visualization(api_key=api_key, df=df, analysis_results=analysis_results, user_request=question)
+    if agent_name == "ConsultantAgent":
+        all_analyses = context.relevant_analyses(agent_name, question)
+        return lambda: run_consultant(api_key=api_key, df=df, all_analyses=all_analyses, user_question=question)
+    if agent_name == "CodeGeneratorAgent":
+        analysis_context = f"Pergunta do usuário: {question}\n\nContexto da conversa:\n{context.relevant_analyses(agent_name, question)}"
+        dataset_info = str(st.session_state.df_info)
+        return lambda: run_code_generator(api_key=api_key, dataset_info=dataset_info, analysis_to_convert=analysis_context)
+    return None
+
+
+def render_suggestions(polling):
+    """Exibe as sugestões de perguntas; enquanto novas estão sendo geradas, mostra as anteriores."""
+    if polling and not st.session_state.context.is_empty:
+        new_suggestions, pending = request_suggestions(
+            api_key=config["google_api_key"],
+            df=st.session_state.df,
+            conversation_history=st.session_state.context.history("SuggestionGenerator")
+        )
+        if not pending:
+            st.session_state.suggestions = new_suggestions
+            st.rerun()
+
+    st.subheader("Sugestões de Perguntas:")
+    suggestions = st.session_state.suggestions or get_fallback_suggestions()
+    if polling:
+        st.caption("🔄 Atualizando sugestões com o novo contexto...")
+
+    cols = st.columns(3)
+    for i, suggestion in enumerate(suggestions[:3]):
+        if cols[i].button(suggestion, use_container_width=True, key=f"suggestion_{i}"):
+            st.session_state.last_question = suggestion
+            # O clique roda só o fragmento; a pergunta é processada no rerun completo
+            st.rerun()
+
+
+def render_statistics_tab(job, polling):
+    """Renderiza a aba de estatísticas a partir do progresso do perfil em segundo plano."""
+    # Perfil calculado em segundo plano: as métricas aparecem conforme ficam prontas
+    if polling and job.done:
+        st.rerun()
+
+    st.subheader("📈 Estatísticas Descritivas")
+    if job.error:
+        st.error(f"Erro ao calcular as estatísticas: {job.error}")
+    elif not job.done:
+        st.caption(f"⏳ Calculando estatísticas em segundo plano... ({time.perf_counter() - job.started_at:.0f}s)")
+
+    profile = job.progress
+    if profile.get("approximate"):
+        bounds = profile["error_bounds"]
+        quantile_text = (
+            f" e quartis (25%/50%/75%) com erro de posto de até ±{bounds['quantile_rank']:.2%} (95% de confiança)"
+            if "quantile_rank" in bounds else ""
+        )
+        st.info(
+            f"⚡ Modo aproximado ({profile['n_rows']:,} linhas): contagens de valores distintos com erro "
+            f"padrão de ±{bounds['nunique_relative']:.1%}{quantile_text}. Média, desvio, mínimo e máximo são exatos."
+        )
+        
+    # Adicionando estilos CSS personalizados
+    st.markdown("""
+    <style>
+        .stats-card {
+            background-color: var(--background-color, #0e1117);
+            border: 1px solid #2d3748;
+            border-radius: 0.5rem;
+            padding: 1rem;
+            margin-bottom: 1rem;
+            box-shadow: 0 1px 3px rgba(0,0,0,0.1);
+            transition: all 0.2s;
+        }
+        .stats-card:hover {
+            transform: translateY(-2px);
+            box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06);
+        }
+        .stats-card h4 {
+            color: #9ca3af;
+            margin: 0 0 0.5rem 0;
+            font-size: 0.875rem;
+            font-weight: 500;
+        }
+        .stats-card p {
+            color: #e5e7eb;
+            margin: 0;
+            font-size: 1.25rem;
+            font-weight: 600;
+        }
+    </style>
+    """, unsafe_allow_html=True)
+        
+    # Estatísticas em cards com melhor espaçamento
+    st.markdown(
+        """
+        <div style='margin-bottom: 1.5rem;'>
+            <h4 style='margin-bottom: 0.75rem; color: #9ca3af;'>Visão Geral do Dataset</h4>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+        
+    # Primeira linha de cards
+    col1, col2, col3, col4 = st.columns(4)
+        
+    with col1:
+        st.markdown(f"""
+        <div class="stats-card">
+            <h4>Total de Registros</h4>
+            <p>{st.session_state.df_info['shape'][0]:,}</p>
+        </div>
+        """, unsafe_allow_html=True)
+            
+    with col2:
+        st.markdown(f"""
+        <div class="stats-card">
+            <h4>Colunas Numéricas</h4>
+            <p>{len(profile['numeric_columns']) if 'numeric_columns' in profile else PENDING_METRIC}</p>
+        </div>
+        """, unsafe_allow_html=True)
+            
+    with col3:
+        st.markdown(f"""
+        <div class="stats-card">
+            <h4>Colunas Categóricas</h4>
+            <p>{len(profile['categorical_columns']) if 'categorical_columns' in profile else PENDING_METRIC}</p>
+        </div>
+        """, unsafe_allow_html=True)
+            
+    with col4:
+        if 'missing_values' in st.session_state.df_info:
+            missing_total = sum(st.session_state.df_info['missing_values'].values())
+        else:
+            missing_total = profile.get('missing_total', PENDING_METRIC)
+        st.markdown(f"""
+        <div class="stats-card">
+            <h4>Valores Faltantes</h4>
+            <p>{missing_total}</p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+    # Estatísticas descritivas detalhadas
+    st.markdown(
+        """
+        <div style='margin: 1.5rem 0 0.75rem 0;'>
+            <h4 style='margin-bottom: 0.75rem; color: #9ca3af;'>Resumo Estatístico</h4>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+        
+    # Estatísticas descritivas com rolagem horizontal
+    st.markdown("""
+    <style>
+        .dataframe-container {
+            overflow-x: auto;
+            margin-bottom: 1.5rem;
+            border-radius: 0.5rem;
+            box-shadow: 0 1px 3px rgba(0,0,0,0.1);
+        }
+        .dataframe {
+            width: 100% !important;
+            min-width: 100%;
+        }
+    </style>
+    <div class='dataframe-container'>
+    """, unsafe_allow_html=True)
+        
+    # Exibindo o resumo estatístico com formatação melhorada
+    if "describe" in profile:
+        st.dataframe(
+            profile["describe"].round(2),
+            width='stretch'
+        )
+    else:
+        st.info(f"{PENDING_METRIC} Calculando resumo estatístico...")
+        
+    st.markdown("</div>", unsafe_allow_html=True)
+        
+    # Informações adicionais sobre o dataset
+    st.markdown(
+        """
+        <div style='margin-top: 2rem;'>
+            <h4 style='margin-bottom: 0.75rem; color: #9ca3af;'>Informações Adicionais</h4>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+        
+    # Colunas para informações adicionais
+    col_info1, col_info2 = st.columns(2)
+        
+    with col_info1:
+        st.markdown("""
+        <div class="stats-card">
+            <h4>Colunas com Valores Únicos{}</h4>
+            <p>{}</p>
+        </div>
+        """.format(
+            " (≈)" if profile.get("approximate") else "",
+            (", ".join(map(str, profile["unique_columns"])) or "Nenhuma") if "unique_columns" in profile else PENDING_METRIC
+        ),
+        unsafe_allow_html=True)
+            
+    with col_info2:
+        memory_report = st.session_state.df_info.get("load_report", {}).get("memory")
+        if memory_report:
+            memory_text = (
+                f"{memory_report['after_bytes'] / (1024 * 1024):.2f} MB "
+                f"(antes: {memory_report['before_bytes'] / (1024 * 1024):.2f} MB, "
+                f"-{memory_report['saved_pct']}%)"
+            )
+        elif "memory_bytes" in profile:
+            memory_text = f"{profile['memory_bytes'] / (1024 * 1024):.2f} MB"
+        else:
+            memory_text = PENDING_METRIC
+        st.markdown(f"""
+        <div class="stats-card">
+            <h4>Uso de Memória</h4>
+            <p>{memory_text}</p>
+        </div>
+        """, unsafe_allow_html=True)
+        if memory_report and memory_report["conversions"]:
+            with st.expander("Tipos compactados no carregamento"):
+                st.json(memory_report["conversions"])
+
+
+# Quando o perfil em segundo plano termina, completa o df_info com as estatísticas
+if st.session_state.df is not None:
+    if st.session_state.profile_job is None:
+        st.session_state.profile_job = start_profile_job(
+            st.session_state.df, approx_min_rows=config["approx_profile_min_rows"]
+        )
+    profile_pending = 'missing_values' not in st.session_state.df_info and 'profile_error' not in st.session_state.df_info
+    if st.session_state.profile_job.done and profile_pending:
+        # Uma falha do perfil é exibida uma única vez; não é recalculado a cada rerun
+        profile_error = st.session_state.profile_job.error
+        if profile_error is None:
+            try:
+                st.session_state.df_info = get_dataset_info(
+                    st.session_state.df, st.session_state.df_info["name"],
+                    load_report=st.session_state.df_info.get("load_report"),
+                    approx_min_rows=config["approx_profile_min_rows"]
+                )
+            except Exception as e:
+                profile_error = e
+        if profile_error is not None:
+            st.session_state.df_info["profile_error"] = str(profile_error)
+            st.error(f"Não foi possível calcular as estatísticas completas do dataset: {profile_error}")
 
 # --- Área Principal de Exibição ---
 st.title("🤖 InsightAgent EDA: Seu Assistente de Análise de Dados")
@@ -168,158 +468,25 @@ if st.session_state.df is not None:
         with col1:
             st.title(f"📊 {st.session_state.df_info.get('name', 'Dataset')}")
         with col2:
-            rows = st.session_state.df.shape[0]
-            cols = st.session_state.df.shape[1]
+            rows, cols = st.session_state.df_info["shape"]
             st.metric("Linhas/Colunas", f"{rows} × {cols}")
         st.markdown("---")
     
     with tab1:
         st.subheader("Visualização dos Dados")
+        if st.session_state.dataset_store is not None:
+            st.session_state.dataset_store.touch()  # mantém o store protegido da limpeza do cache
+            st.info(
+                f"📦 Dataset grande armazenado em disco. Gráficos e análises usam uma amostra aleatória "
+                f"de {len(st.session_state.df):,} linhas; as métricas gerais consideram o arquivo completo."
+            )
         st.dataframe(st.session_state.df.head(10), width='stretch')
     
     with tab2:
-        st.subheader("📈 Estatísticas Descritivas")
-        
-        # Adicionando estilos CSS personalizados
-        st.markdown("""
-        <style>
-            .stats-card {
-                background-color: var(--background-color, #0e1117);
-                border: 1px solid #2d3748;
-                border-radius: 0.5rem;
-                padding: 1rem;
-                margin-bottom: 1rem;
-                box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-                transition: all 0.2s;
-            }
-            .stats-card:hover {
-                transform: translateY(-2px);
-                box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06);
-            }
-            .stats-card h4 {
-                color: #9ca3af;
-                margin: 0 0 0.5rem 0;
-                font-size: 0.875rem;
-                font-weight: 500;
-            }
-            .stats-card p {
-                color: #e5e7eb;
-                margin: 0;
-                font-size: 1.25rem;
-                font-weight: 600;
-            }
-        </style>
-        """, unsafe_allow_html=True)
-        
-        # Estatísticas em cards com melhor espaçamento
-        st.markdown(
-            """
-            <div style='margin-bottom: 1.5rem;'>
-                <h4 style='margin-bottom: 0.75rem; color: #9ca3af;'>Visão Geral do Dataset</h4>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-        
-        # Primeira linha de cards
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.markdown(f"""
-            <div class="stats-card">
-                <h4>Total de Registros</h4>
-                <p>{len(st.session_state.df):,}</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-        with col2:
-            st.markdown(f"""
-            <div class="stats-card">
-                <h4>Colunas Numéricas</h4>
-                <p>{len(st.session_state.df.select_dtypes(include=['int64', 'float64']).columns)}</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-        with col3:
-            st.markdown(f"""
-            <div class="stats-card">
-                <h4>Colunas Categóricas</h4>
-                <p>{len(st.session_state.df.select_dtypes(include=['object', 'category']).columns)}</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-        with col4:
-            st.markdown(f"""
-            <div class="stats-card">
-                <h4>Valores Faltantes</h4>
-                <p>{st.session_state.df.isnull().sum().sum()}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # Estatísticas descritivas detalhadas
-        st.markdown(
-            """
-            <div style='margin: 1.5rem 0 0.75rem 0;'>
-                <h4 style='margin-bottom: 0.75rem; color: #9ca3af;'>Resumo Estatístico</h4>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-        
-        # Estatísticas descritivas com rolagem horizontal
-        st.markdown("""
-        <style>
-            .dataframe-container {
-                overflow-x: auto;
-                margin-bottom: 1.5rem;
-                border-radius: 0.5rem;
-                box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-            }
-            .dataframe {
-                width: 100% !important;
-                min-width: 100%;
-            }
-        </style>
-        <div class='dataframe-container'>
-        """, unsafe_allow_html=True)
-        
-        # Exibindo o resumo estatístico com formatação melhorada
-        st.dataframe(
-            st.session_state.df.describe().round(2),
-            width='stretch'
-        )
-        
-        st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Informações adicionais sobre o dataset
-        st.markdown(
-            """
-            <div style='margin-top: 2rem;'>
-                <h4 style='margin-bottom: 0.75rem; color: #9ca3af;'>Informações Adicionais</h4>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-        
-        # Colunas para informações adicionais
-        col_info1, col_info2 = st.columns(2)
-        
-        with col_info1:
-            st.markdown("""
-            <div class="stats-card">
-                <h4>Colunas com Valores Únicos</h4>
-                <p>{}</p>
-            </div>
-            """.format(", ".join([col for col in st.session_state.df.columns if st.session_state.df[col].nunique() == len(st.session_state.df)]) or "Nenhuma"), 
-            unsafe_allow_html=True)
-            
-        with col_info2:
-            st.markdown(f"""
-            <div class="stats-card">
-                <h4>Uso de Memória</h4>
-                <p>{st.session_state.df.memory_usage(deep=True).sum() / (1024 * 1024):.2f} MB</p>
-            </div>
-            """, unsafe_allow_html=True)
+        # Enquanto o perfil não termina, o fragmento se atualiza sozinho a cada segundo
+        job = st.session_state.profile_job
+        polling = not job.done
+        st.fragment(render_statistics_tab, run_every=1.0 if polling else None)(job, polling)
 
     # Fechando a aba de estatísticas
     
@@ -347,6 +514,7 @@ if st.session_state.df is not None:
             try:
                 chart_key = f"preserved_chart_{len(st.session_state.messages)}"
                 st.plotly_chart(st.session_state.last_chart, use_container_width=True, key=chart_key)
+                display_reduction_notice(st.session_state.last_chart)
             except Exception as e:
                 st.warning(f"⚠️ Erro ao exibir gráfico preservado: {e}")
                 # Limpar gráfico preservado se houver erro
@@ -354,49 +522,17 @@ if st.session_state.df is not None:
                     del st.session_state.last_chart
 
     # --- Sugestões Dinâmicas de Perguntas ---
-    st.subheader("Sugestões de Perguntas:")
-
-    # Sempre gerar sugestões baseadas no histórico atual
-    if st.session_state.conversation_history.strip():
-        try:
-            dataset_preview = get_dataset_preview(st.session_state.df)
-
-            # Extrair contexto da conversa para melhorar as sugestões
-            conversation_context = extract_conversation_context(st.session_state.conversation_history)
-
-            # Adicionar contexto ao histórico para o agente
-            enriched_history = st.session_state.conversation_history
-            if conversation_context["analysis_types"]:
-                enriched_history += f"\n\nTipos de análise realizados: {', '.join(conversation_context['analysis_types'])}"
-            if conversation_context["agents_used"]:
-                enriched_history += f"\nAgentes utilizados: {', '.join(conversation_context['agents_used'])}"
-
-            # Gerar novas sugestões sempre com o histórico atualizado
-            suggestions = generate_dynamic_suggestions(
-                api_key=config["google_api_key"],
-                dataset_preview=dataset_preview,
-                conversation_history=enriched_history
-            )
-
-        except Exception as e:
-            st.error(f"❌ **Erro ao gerar sugestões:** {e}")
-            suggestions = get_fallback_suggestions()
-            st.warning(f"📝 **Usando sugestões padrão:** {len(suggestions)} sugestões")
-    else:
-        # Se não há histórico, usar sugestões padrão
-        suggestions = get_fallback_suggestions()
-
-    # Garantir que sempre tenhamos sugestões
-    if not suggestions:
-        suggestions = get_fallback_suggestions()
-        st.error("⚠️ **Fallback ativado: usando sugestões padrão**")
-
-    # Exibir as sugestões
-    st.write(f"🔍 **Mostrando {len(suggestions[:3])} sugestões:**")
-    cols = st.columns(3)
-    for i, suggestion in enumerate(suggestions[:3]):
-        if cols[i].button(suggestion, use_container_width=True, key=f"suggestion_{i}"):
-            st.session_state.last_question = suggestion
+    # Geradas em segundo plano: as anteriores continuam visíveis até as novas ficarem prontas
+    suggestions_pending = False
+    if not st.session_state.context.is_empty:
+        new_suggestions, suggestions_pending = request_suggestions(
+            api_key=config["google_api_key"],
+            df=st.session_state.df,
+            conversation_history=st.session_state.context.history("SuggestionGenerator")
+        )
+        if new_suggestions:
+            st.session_state.suggestions = new_suggestions
+    st.fragment(render_suggestions, run_every=1.0 if suggestions_pending else None)(suggestions_pending)
 
     if prompt := st.chat_input("Faça sua pergunta sobre os dados...") or st.session_state.get('last_question'):
         st.session_state.last_question = None  # Limpa a sugestão imediatamente
@@ -406,7 +542,7 @@ if st.session_state.df is not None:
         display_chat_message("user", prompt)
 
         # Adiciona ao histórico de texto para os agentes
-        st.session_state.conversation_history += f"Usuário: {prompt}\n"
+        st.session_state.context.add_turn("Usuário", prompt)
         
         # Inicializa conversation_id como None
         conversation_id = None
@@ -424,11 +560,16 @@ if st.session_state.df is not None:
 
         with st.spinner("Analisando e gerando resposta..."):
             try:
+                # Modo especulativo: o agente mais provável começa junto com o coordenador
+                speculation = None
+                if config["speculative_execution"]:
+                    speculation = start_speculation(prompt, lambda agent: build_speculative_call(agent, prompt))
+
                 # 1. CoordinatorAgent decide o que fazer
                 coordinator_decision = run_coordinator(
                     api_key=config["google_api_key"],
                     df=st.session_state.df,
-                    conversation_history=st.session_state.conversation_history,
+                    conversation_history=st.session_state.context.history("CoordinatorAgent"),
                     user_question=prompt
                 )
 
@@ -438,22 +579,33 @@ if st.session_state.df is not None:
                 # Inicializa conversation_id como None
                 conversation_id = None
 
-                st.info(f"Roteando para: **{agent_to_call}**")
-                time.sleep(1)
+                routed_locally = " (roteamento local)" if coordinator_decision.get("routed_locally") else ""
+                st.info(f"Roteando para: **{agent_to_call}**{routed_locally}")
+
+                # A especulação usa a pergunta original; só vale se o coordenador escolheu o mesmo agente
+                speculative_result = resolve_speculation(speculation, agent_to_call)
+                if speculative_result is not None:
+                    question_for_agent = prompt
 
                 bot_response_content = ""
                 chart_figure = None
                 generated_code = ""
 
                 # 2. Roteia para o agente apropriado
+                # Resposta parcial exibida enquanto o agente transmite os tokens; é removida
+                # quando a resposta final (já pós-processada) é exibida
+                stream_placeholder = st.empty()
+
                 if agent_to_call == "DataAnalystAgent":
-                    bot_response_content = run_data_analyst(
+                    bot_response_content = speculative_result if speculative_result is not None else run_data_analyst(
                         api_key=config["google_api_key"],
                         df=st.session_state.df,
-                        analysis_context=st.session_state.all_analyses_history,
-                        specific_question=question_for_agent
+                        analysis_context=st.session_state.context.relevant_analyses("DataAnalystAgent", question_for_agent),
+                        specific_question=question_for_agent,
+                        on_token=stream_chat_message(stream_placeholder),
+                        total_rows=(st.session_state.df_info or {}).get("shape", st.session_state.df.shape)[0]
                     )
-                    st.session_state.all_analyses_history += f"Análise Estatística:\n{bot_response_content}\n"
+                    st.session_state.context.add_analysis("Análise Estatística", bot_response_content)
                     
                     # Armazenar a análise no banco de dados
                     if st.session_state.session_id:
@@ -469,21 +621,25 @@ if st.session_state.df is not None:
 
                 elif agent_to_call == "VisualizationAgent":
                     try:
-                        generated_code = run_visualization(
+                        generated_code = speculative_result if speculative_result is not None else run_visualization(
                             api_key=config["google_api_key"],
                             df=st.session_state.df,
-                            analysis_results=st.session_state.all_analyses_history,
+                            analysis_results=st.session_state.context.relevant_analyses("VisualizationAgent", question_for_agent),
                             user_request=question_for_agent
                         )
 
                         # Tenta executar o código para gerar o gráfico usando cache
                         try:
                             # Usar cache otimizado para gráficos
-                            chart_figure = exec_with_cache(generated_code, st.session_state.df)
+                            # O status atualizado durante a espera permite interromper a execução (Stop/rerun)
+                            chart_figure = exec_with_cache(
+                                generated_code, st.session_state.df,
+                                on_wait=lambda elapsed: stream_placeholder.caption(f"🔄 Gerando o gráfico... ({elapsed:.0f}s)")
+                            )
 
                             if chart_figure:
                                 bot_response_content = "Aqui está a visualização que você pediu."
-                                st.session_state.all_analyses_history += f"Visualização Gerada: {question_for_agent}\n"
+                                st.session_state.context.add_analysis("Visualização Gerada", question_for_agent)
                             else:
                                 bot_response_content = "O código foi gerado, mas não criou uma figura válida. Verifique se o código define uma variável 'fig'."
                         except SyntaxError as se:
@@ -497,11 +653,12 @@ if st.session_state.df is not None:
                         bot_response_content = f"Erro no agente de visualização: {e}\n\nTente reformular sua pergunta ou verifique se sua chave da API do Google está configurada corretamente."
 
                 elif agent_to_call == "ConsultantAgent":
-                    bot_response_content = run_consultant(
+                    bot_response_content = speculative_result if speculative_result is not None else run_consultant(
                         api_key=config["google_api_key"],
                         df=st.session_state.df,
-                        all_analyses=st.session_state.all_analyses_history,
-                        user_question=question_for_agent
+                        all_analyses=st.session_state.context.relevant_analyses("ConsultantAgent", question_for_agent),
+                        user_question=question_for_agent,
+                        on_token=stream_chat_message(stream_placeholder)
                     )
                     
                     # Armazenar a conclusão no banco de dados
@@ -517,11 +674,12 @@ if st.session_state.df is not None:
                             st.error(f"Erro ao salvar conclusão: {e}")
 
                 elif agent_to_call == "CodeGeneratorAgent":
-                    analysis_context = f"Pergunta do usuário: {prompt}\n\nContexto da conversa:\n{st.session_state.all_analyses_history}"
-                    generated_code = run_code_generator(
+                    analysis_context = f"Pergunta do usuário: {prompt}\n\nContexto da conversa:\n{st.session_state.context.relevant_analyses('CodeGeneratorAgent', prompt)}"
+                    generated_code = speculative_result if speculative_result is not None else run_code_generator(
                         api_key=config["google_api_key"],
                         dataset_info=str(st.session_state.df_info),
-                        analysis_to_convert=analysis_context
+                        analysis_to_convert=analysis_context,
+                        on_token=stream_chat_message(stream_placeholder, language="python")
                     )
                     # Não incluir o código na resposta - ele será exibido automaticamente na interface
                     bot_response_content = "💡 Código Gerado: Este código será executado automaticamente na própria interface!"
@@ -530,6 +688,7 @@ if st.session_state.df is not None:
                     bot_response_content = "Desculpe, não entendi qual agente usar. Poderia reformular sua pergunta?"
 
                 # 3. Exibe a resposta do bot
+                stream_placeholder.empty()
                 execution_container = None
                 results_container = None
 
@@ -548,6 +707,7 @@ if st.session_state.df is not None:
                                 # Usar chave única para evitar re-renderização
                                 chart_key = f"chart_{len(st.session_state.messages)}_{hash(str(chart_figure))}"
                                 st.plotly_chart(chart_figure, use_container_width=True, key=chart_key)
+                                display_reduction_notice(chart_figure)
                             except Exception as e:
                                 st.warning(f"⚠️ Erro ao exibir gráfico na execução inicial: {str(e)}")
 
@@ -580,48 +740,53 @@ if st.session_state.df is not None:
                         try:
                             execution_container.markdown("**Status:** 🔄 Executando código Python gerado...")
 
-                            # Criar ambiente seguro para execução
-                            local_scope = {
-                                "df": st.session_state.df,
-                                "pd": pd,
-                                "px": px,
-                                "go": go,
-                                "st": st,
-                                "plt": plt,
-                                "np": np
-                            }
-
                             # Verificar se o DataFrame está disponível
                             if st.session_state.df is None:
-                                results_container.markdown("**Erro:** Nenhum arquivo CSV foi carregado.")
-                                st.error("Erro: Nenhum DataFrame disponível para análise.")
-                                # Não usar return, continuar com o fluxo
-
-                            # Executar o código usando cache otimizado
-                            exec_with_cache(generated_code, local_scope)
+                                raise ValueError("Nenhum DataFrame disponível para análise.")
+
+                            # Executar o código num processo isolado, com limites de tempo e memória
+                            sandbox_result = run_in_sandbox(
+                                generated_code, st.session_state.df,
+                                on_wait=lambda elapsed: execution_container.markdown(
+                                    f"**Status:** 🔄 Executando código Python gerado... ({elapsed:.0f}s)"
+                                )
+                            )
 
-                            # Verificar se foi gerada uma figura
-                            if 'fig' in local_scope:
-                                execution_container.markdown("**Status:** ✅ Código executado com sucesso!")
+                            if sandbox_result.error is not None:
+                                execution_container.markdown(
+                                    f"**Status:** ❌ Erro na execução: {sandbox_result.error_type}: {sandbox_result.error}"
+                                )
+                                results_container.code(sandbox_result.stdout, language="text")
+                            elif sandbox_result.figure is not None:
+                                execution_container.markdown(
+                                    f"**Status:** ✅ Código executado com sucesso! ({sandbox_result.elapsed_s:.1f}s)"
+                                )
                                 results_container.markdown("**Resultados:** Visualização gerada automaticamente:")
 
                                 # Exibir a figura gerada APENAS UMA VEZ
-                                fig = local_scope['fig']
+                                fig = sandbox_result.figure
                                 # Usar chave única para evitar re-renderização
                                 fig_key = f"code_chart_{len(st.session_state.messages)}_{id(fig)}"
                                 st.plotly_chart(fig, use_container_width=True, key=fig_key)
+                                display_reduction_notice(fig)
 
                                 # Atualizar a mensagem para incluir a figura
                                 st.session_state.messages[-1]["chart_fig"] = fig
                                 chart_figure = fig
 
                             else:
-                                execution_container.markdown("**Status:** ✅ Código executado com sucesso!")
+                                execution_container.markdown(
+                                    f"**Status:** ✅ Código executado com sucesso! ({sandbox_result.elapsed_s:.1f}s)"
+                                )
                                 results_container.markdown("**Resultados:** Código executado sem gerar visualização específica.")
 
                             # Capturar outras saídas importantes
-                            if 'result' in local_scope:
-                                results_container.markdown(f"**Valor de retorno:** {local_scope['result']}")
+                            for image in sandbox_result.images:
+                                st.image(image)
+                            if sandbox_result.stdout and sandbox_result.error is None:
+                                st.code(sandbox_result.stdout, language="text")
+                            if sandbox_result.result is not None:
+                                st.markdown(f"**Valor de retorno:** {sandbox_result.result}")
                         except Exception as e:
                             execution_container.markdown(f"**Status:** ❌ Erro na execução: {str(e)}")
                             results_container.markdown(f"**Detalhes do erro:** {str(e)}")
@@ -645,21 +810,22 @@ if st.session_state.df is not None:
                     })
 
                 # Atualiza o histórico de texto APÓS processar a resposta
-                st.session_state.conversation_history += f"Assistente: {bot_response_content}\n"
+                st.session_state.context.add_turn("Assistente", bot_response_content)
 
-                # Forçar atualização das sugestões na próxima renderização
-                st.session_state.suggestions = []  # Forçar regeneração
+                # Gera as sugestões do novo contexto em segundo plano (as atuais ficam até ficarem prontas)
+                request_suggestions(
+                    api_key=config["google_api_key"],
+                    df=st.session_state.df,
+                    conversation_history=st.session_state.context.history("SuggestionGenerator")
+                )
 
                 # 4. Salva no Supabase
                 try:
                     chart_json = None
                     if chart_figure:
                         try:
-                            # Converter gráfico para JSON com timeout protection
-                            chart_json = chart_figure.to_json()
-                            # Se o JSON for muito grande, truncar para evitar timeout
-                            if len(chart_json) > 10000:  # Reduzir limite para ~10KB
-                                chart_json = chart_json[:10000] + "\n... (truncado para evitar timeout)"
+                            # Figura compactada e endereçada pelo conteúdo; a conversa guarda só a referência
+                            chart_json = memory.store_figure(chart_figure)
                         except Exception as json_error:
                             # Se não conseguir converter, salvar apenas metadados básicos
                             st.warning(f"⚠️ Não foi possível converter gráfico para JSON: {str(json_error)}")
@@ -738,12 +904,54 @@ if st.session_state.df is not None:
                         st.success("✅ Resposta processada com sucesso!")
                     should_rerun = False  # Otimização: evitar rerun desnecessário
 
+                if DEBUG_MODE:
+                    cache_stats = get_llm_cache_stats()
+                    st.caption(
+                        f"Cache de respostas do LLM: {cache_stats['memory_hits'] + cache_stats['disk_hits']} acertos, "
+                        f"{cache_stats['misses']} falhas ({cache_stats['hit_rate']:.0%})"
+                    )
+                    limiter_stats = get_rate_limit_stats()
+                    remaining = ", ".join(
+                        f"{model}: {quota['remaining_minute']}/min, {quota['remaining_day']} hoje"
+                        for model, quota in limiter_stats["quota"].items()
+                    )
+                    st.caption(
+                        f"Cota do Gemini: {remaining or 'sem chamadas'} · espera média {limiter_stats['avg_wait_s']:.2f}s "
+                        f"(máx. {limiter_stats['wait_max_s']:.1f}s) · {limiter_stats['retries']} novas tentativas · "
+                        f"{limiter_stats['coalesced']} chamadas coalescidas"
+                    )
+                    latency = ", ".join(
+                        f"{profile} {entry['avg_s']:.1f}s ({entry['calls']}x, {entry['timeouts']} timeouts)"
+                        for profile, entry in get_profile_latency_stats().items()
+                    )
+                    if latency:
+                        st.caption(f"Latência por perfil: {latency}")
+                    chart_stats = get_chart_cache_stats()
+                    st.caption(
+                        f"Cache de gráficos: {chart_stats['entries']} figuras, {chart_stats['bytes'] / 1024 / 1024:.1f} de "
+                        f"{chart_stats['max_bytes'] / 1024 / 1024:.0f} MB · {chart_stats['hits']} acertos, "
+                        f"{chart_stats['disk_hits']} do disco, {chart_stats['misses']} falhas, "
+                        f"{chart_stats['evictions']} remoções"
+                    )
+                    sandbox_stats = get_sandbox_stats()
+                    st.caption(
+                        f"Sandbox de código: {sandbox_stats['runs']} execuções (média {sandbox_stats['avg_s']:.2f}s), "
+                        f"{sandbox_stats['errors']} erros, {sandbox_stats['timeouts']} timeouts, "
+                        f"{sandbox_stats['crashes']} quedas · {sandbox_stats['workers']} workers"
+                    )
+                    if config["speculative_execution"]:
+                        speculation_stats = get_speculation_stats()
+                        st.caption(
+                            f"Execução especulativa: {speculation_stats['hits']} acertos, {speculation_stats['misses']} "
+                            f"erros ({speculation_stats['hit_rate']:.0%}) · {speculation_stats['saved_s']:.1f}s economizados "
+                            f"(média {speculation_stats['avg_saved_s']:.1f}s por acerto) · "
+                            f"{speculation_stats['wasted_requests']} requisições desperdiçadas, "
+                            f"{speculation_stats['skipped_low_quota']} suspensas por cota baixa"
+                        )
+
                 if should_rerun and DEBUG_MODE:
                     st.rerun()
 
-                # FORÇAR ATUALIZAÇÃO DAS SUGESTÕES APÓS CADA RESPOSTA
-                st.info("🔄 Atualizando sugestões com o novo contexto...")
-
                 # Preservar gráficos antes do re-run apenas se necessário
                 if chart_figure:
                     st.session_state.last_chart = chart_figure
@@ -752,7 +960,6 @@ if st.session_state.df is not None:
                 # Forçar re-run para atualizar sugestões com o novo contexto
                 # Mas apenas se não estivermos em modo debug para evitar problemas
                 if not DEBUG_MODE:
-                    time.sleep(0.5)  # Pequena pausa para mostrar a mensagem
                     st.rerun()
                 else:
                     st.success("✅ Sugestões atualizadas (modo debug - sem re-run)")
@@ -766,13 +973,13 @@ if st.session_state.df is not None:
             except Exception as e:
                 error_msg = str(e)
                 # Check for API quota exceeded error
-                if "quota" in error_msg.lower() or "429" in error_msg or "exceeded" in error_msg.lower():
+                if isinstance(e, QuotaExceededError) or "quota" in error_msg.lower() or "429" in error_msg or "exceeded" in error_msg.lower():
                     st.error(f"""
                     **Limite de requisições excedido**
                     
                     Parece que excedemos o limite de requisições gratuitas da API do Gemini para hoje.
                     
-                    - Limite diário: 200 requisições
+                    - Limite diário: {config["gemini_rpd"]} requisições ({config["gemini_rpm"]} por minuto)
                     - Tempo estimado para liberação: aproximadamente 1 minuto
                     - Modelo afetado: Gemini 2.0 Flash
                     
@@ -783,6 +990,9 @@ if st.session_state.df is not None:
                        - Acessar: [Documentação de limites da API Gemini](https://ai.google.dev/gemini-api/docs/rate-limits)
                     """)
                 else:
+                    # Em erros de conexão ou autenticação, verifica o cliente compartilhado em segundo
+                    # plano; se não responder, o registro é invalidado e o próximo turno o recria
+                    schedule_llm_health_check(config["google_api_key"], e)
                     # For other errors, show a friendly message with the error details
                     st.error(f"""
                     **Ocorreu um erro inesperado**
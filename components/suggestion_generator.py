@@ -1,7 +1,20 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from agents.agent_setup import get_llm
+from agents.agent_setup import get_agent_chain, invoke_agent, get_dataset_preview
+from utils.fingerprint import get_dataset_fingerprint
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
+import threading
+import time
+
+MAX_CACHED_SUGGESTIONS = 64
+FALLBACK_TTL_S = 60  # sugestões padrão (erro do modelo, cota, timeout) valem pouco tempo: a geração é refeita depois
+
+# Sugestões geradas em segundo plano, memoizadas por (histórico, dataset): (sugestões, expira_em ou None)
+_suggestions = OrderedDict()
+_jobs = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="suggestions")
 
 SUGGESTION_PROMPT_TEMPLATE = """
 Você é um assistente que gera sugestões de perguntas inteligentes e relevantes para análise de dados.
@@ -51,12 +64,18 @@ Analise o histórico da conversa e o contexto do dataset para gerar 3 sugestões
 - "Gere um relatório completo das análises realizadas"
 """
 
+def _has_suggestions_json(response: str) -> bool:
+    """Só respostas com o JSON de sugestões legível são guardadas no cache."""
+    if "```json" in response:
+        response = response.split("```json")[1].split("```")[0]
+    try:
+        return bool(json.loads(response.replace("```", "").strip()).get("suggestions"))
+    except (json.JSONDecodeError, AttributeError):
+        return False
+
 def get_suggestion_generator(api_key: str):
-    """Cria o agente gerador de sugestões."""
-    llm = get_llm(api_key)
-    prompt = ChatPromptTemplate.from_template(SUGGESTION_PROMPT_TEMPLATE)
-    chain = prompt | llm | StrOutputParser()
-    return chain
+    """Retorna o agente gerador de sugestões (compartilhado pelo registro de chains)."""
+    return get_agent_chain("SuggestionGenerator", SUGGESTION_PROMPT_TEMPLATE, api_key)
 
 def generate_dynamic_suggestions(api_key: str, dataset_preview: str, conversation_history: str) -> list:
     """
@@ -70,13 +89,16 @@ def generate_dynamic_suggestions(api_key: str, dataset_preview: str, conversatio
     Returns:
         Lista com 3 sugestões de perguntas
     """
-    try:
-        agent = get_suggestion_generator(api_key)
+    return _generate_suggestions(api_key, dataset_preview, conversation_history)[0]
+
 
-        response = agent.invoke({
+def _generate_suggestions(api_key: str, dataset_preview: str, conversation_history: str) -> tuple[list, bool]:
+    """(sugestões, geradas_pelo_modelo): em caso de erro, as sugestões padrão e False."""
+    try:
+        response = invoke_agent("SuggestionGenerator", SUGGESTION_PROMPT_TEMPLATE, api_key, {
             "dataset_preview": dataset_preview,
             "conversation_history": conversation_history
-        })
+        }, validate=_has_suggestions_json)
 
         # Limpar a resposta para extrair JSON
         if "```json" in response:
@@ -101,17 +123,17 @@ def generate_dynamic_suggestions(api_key: str, dataset_preview: str, conversatio
                 remaining = 3 - len(suggestions)
                 suggestions.extend(default_suggestions[:remaining])
 
-        return suggestions[:3]
+        return suggestions[:3], True
 
     except json.JSONDecodeError as e:
         print(f"Erro ao decodificar JSON das sugestões: {e}")
         print(f"Resposta bruta recebida: {response}")
-        return get_fallback_suggestions()[:3]
+        return get_fallback_suggestions()[:3], False
 
     except Exception as e:
         # Em caso de erro, retornar sugestões padrão
         print(f"Erro ao gerar sugestões dinâmicas: {e}")
-        return get_fallback_suggestions()[:3]
+        return get_fallback_suggestions()[:3], False
 
 def extract_conversation_context(conversation_history: str) -> dict:
     """
@@ -195,3 +217,60 @@ def get_fallback_suggestions() -> list:
         "Como as variáveis se relacionam entre si?",
         "Quais são os próximos passos recomendados para análise?"
     ]
+
+
+def suggestions_key(conversation_history: str, fingerprint: str) -> str:
+    """Chave das sugestões: hash do histórico da conversa e fingerprint do dataset."""
+    return hashlib.blake2b(f"{fingerprint}\n{conversation_history}".encode(), digest_size=16).hexdigest()
+
+
+def enrich_conversation_history(conversation_history: str) -> str:
+    """Acrescenta ao histórico os tipos de análise e agentes já utilizados."""
+    conversation_context = extract_conversation_context(conversation_history)
+    enriched_history = conversation_history
+    if conversation_context["analysis_types"]:
+        enriched_history += f"\n\nTipos de análise realizados: {', '.join(conversation_context['analysis_types'])}"
+    if conversation_context["agents_used"]:
+        enriched_history += f"\nAgentes utilizados: {', '.join(conversation_context['agents_used'])}"
+    return enriched_history
+
+
+def _run_suggestions_job(key: str, api_key: str, dataset_preview: str, conversation_history: str) -> list:
+    try:
+        suggestions, from_model = _generate_suggestions(
+            api_key, dataset_preview, enrich_conversation_history(conversation_history)
+        )
+        expires_at = None if from_model else time.monotonic() + FALLBACK_TTL_S
+        with _lock:
+            _suggestions[key] = (suggestions, expires_at)
+            _suggestions.move_to_end(key)
+            if len(_suggestions) > MAX_CACHED_SUGGESTIONS:
+                _suggestions.popitem(last=False)
+        return suggestions
+    finally:
+        with _lock:
+            _jobs.pop(key, None)
+
+
+def request_suggestions(api_key: str, df, conversation_history: str):
+    """Retorna `(sugestões, pendente)` sem bloquear.
+
+    Se as sugestões deste histórico e dataset já foram geradas, retorna-as; caso contrário,
+    agenda a geração em segundo plano (uma única vez por chave) e retorna `(None, True)`.
+    """
+    key = suggestions_key(conversation_history, get_dataset_fingerprint(df))
+    with _lock:
+        if key in _suggestions:
+            suggestions, expires_at = _suggestions[key]
+            if expires_at is None or time.monotonic() < expires_at:
+                _suggestions.move_to_end(key)
+                return suggestions, False
+            del _suggestions[key]  # sugestões padrão vencidas: tenta o modelo de novo
+        if key in _jobs:
+            return None, True
+
+    dataset_preview = get_dataset_preview(df)
+    with _lock:
+        if key not in _jobs and key not in _suggestions:
+            _jobs[key] = _executor.submit(_run_suggestions_job, key, api_key, dataset_preview, conversation_history)
+    return None, True
@@ -4,6 +4,8 @@ import time
 import hashlib
 from datetime import datetime, timezone, timedelta
 
+from utils.figure_reduction import reduction_notes
+
 
 
 def build_sidebar(memory, user_id):
@@ -89,6 +91,7 @@ def display_chat_message(role, content, chart_fig=None, key=None, generated_code
 
                     # Exibir o gráfico com verificação de erro
                     st.plotly_chart(chart_fig, use_container_width=True, key=key)
+                    display_reduction_notice(chart_fig)
                 else:
                     st.warning("⚠️ Gráfico não está mais disponível.")
                     st.info("O gráfico foi gerado anteriormente mas não pôde ser restaurado.")
@@ -100,6 +103,39 @@ def display_chat_message(role, content, chart_fig=None, key=None, generated_code
     return execution_container, results_container
 
 
+def display_reduction_notice(chart_fig):
+    """Indica abaixo do gráfico que os dados foram reduzidos para exibição."""
+    notes = reduction_notes(chart_fig)
+    if notes:
+        st.caption("⚡ Gráfico reduzido para exibição: " + "; ".join(notes))
+
+
+def stream_chat_message(placeholder, language=None, min_interval_s=0.05):
+    """Retorna um callback `on_token` que exibe a resposta parcial em uma mensagem do assistente.
+
+    Os trechos são acumulados e o placeholder (`st.empty()`) é redesenhado no máximo a cada
+    `min_interval_s`. Com `language`, o texto é exibido como bloco de código.
+    """
+    chunks = []
+    last_render = [0.0]
+
+    def on_token(chunk):
+        chunks.append(chunk)
+        now = time.perf_counter()
+        if now - last_render[0] < min_interval_s:
+            return
+        last_render[0] = now
+        text = "".join(chunks)
+        with placeholder.container():
+            with st.chat_message("assistant"):
+                if language:
+                    st.code(text, language=language)
+                else:
+                    st.markdown(text + "▌")
+
+    return on_token
+
+
 def _is_chart_valid(chart_fig):
     """Verifica se um gráfico Plotly é válido e pode ser exibido."""
     try:
@@ -0,0 +1,94 @@
+"""
+Índice BM25 local das análises de uma sessão.
+
+Cada análise é indexada ao ser registrada (o índice cresce de forma incremental, sem
+reconstrução) junto com seus metadados: o agente/tipo que a produziu e as colunas do dataset
+que ela menciona. Na montagem do prompt, só as análises mais relevantes para a pergunta atual
+são enviadas ao agente.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+COLUMN_BOOST = 1.0  # bônus por coluna citada tanto na pergunta quanto na análise
+
+STOPWORDS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na", "nos", "nas",
+    "um", "uma", "uns", "umas", "para", "por", "com", "sem", "que", "qual", "quais", "se", "ao",
+    "aos", "ou", "mais", "menos", "entre", "sobre", "como", "esta", "este", "isso", "esse", "essa",
+    "ha", "sao", "ser", "foi", "me", "the", "of", "and", "to", "in",
+}
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> list:
+    """Palavras em minúsculas, sem acentos e sem stopwords."""
+    return [t for t in re.findall(r"[a-z0-9_]+", _normalize(text)) if t not in STOPWORDS and len(t) > 1]
+
+
+def mentioned_columns(text: str, columns: list) -> list:
+    """Colunas do dataset citadas no texto como palavra inteira (sem diferenciar maiúsculas e acentos)."""
+    normalized = _normalize(text)
+    mentioned = []
+    for col in columns:
+        name = _normalize(str(col)).strip()
+        if name and re.search(rf"(?<![a-z0-9_]){re.escape(name)}(?![a-z0-9_])", normalized):
+            mentioned.append(col)
+    return mentioned
+
+
+class AnalysisIndex:
+    """Índice BM25 incremental; o id de cada documento é a ordem em que foi adicionado."""
+
+    def __init__(self):
+        self.term_freqs = []   # Counter de termos por documento
+        self.doc_lengths = []
+        self.metadata = []     # {"label": ..., "columns": [...]}
+        self.doc_freq = Counter()
+
+    def __len__(self) -> int:
+        return len(self.term_freqs)
+
+    def add(self, text: str, label: str, columns: list | None = None) -> int:
+        tokens = tokenize(f"{label} {text}")
+        term_freq = Counter(tokens)
+        self.term_freqs.append(term_freq)
+        self.doc_lengths.append(len(tokens))
+        self.doc_freq.update(term_freq.keys())
+        self.metadata.append({"label": label, "columns": mentioned_columns(text, columns or [])})
+        return len(self.term_freqs) - 1
+
+    def scores(self, query: str, columns: list | None = None) -> list:
+        """Pontuação BM25 de cada documento para a consulta (mais o bônus de colunas)."""
+        n_docs = len(self.term_freqs)
+        if not n_docs:
+            return []
+        avg_length = sum(self.doc_lengths) / n_docs or 1
+        query_terms = set(tokenize(query))
+        query_columns = set(mentioned_columns(query, columns or []))
+        scores = []
+        for term_freq, length, meta in zip(self.term_freqs, self.doc_lengths, self.metadata):
+            score = 0.0
+            for term in query_terms:
+                tf = term_freq.get(term)
+                if not tf:
+                    continue
+                df = self.doc_freq[term]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+            score += COLUMN_BOOST * len(query_columns.intersection(meta["columns"]))
+            scores.append(score)
+        return scores
+
+    def top_k(self, query: str, k: int, columns: list | None = None) -> list:
+        """Ids dos `k` documentos mais relevantes com pontuação positiva, do mais ao menos relevante."""
+        scores = self.scores(query, columns)
+        ranked = sorted((i for i, s in enumerate(scores) if s > 0), key=lambda i: (-scores[i], -i))
+        return ranked[:k]
@@ -1,25 +1,221 @@
 """
-Cache simples para gráficos.
+Cache de gráficos gerados pelos agentes (o código é executado no sandbox, `utils/code_sandbox.py`).
+
+A chave combina o fingerprint do conteúdo do DataFrame (`utils/fingerprint.py`, calculado uma
+vez por dataset) com o hash do código normalizado; assim, datasets com o mesmo schema e valores
+diferentes não compartilham figuras. As figuras ficam num LRU limitado pelo tamanho estimado em
+bytes (`configure_chart_cache`), com contadores de acertos, falhas e remoções.
+
+Atrás da memória há uma camada em disco, compartilhada entre os workers do Streamlit e entre
+reinícios: cada figura é gravada como JSON do Plotly comprimido (gzip) em
+`.cache/charts/<chave>.json.gz`, de forma atômica. O `mtime` do arquivo é atualizado a cada
+leitura e usado para remover as figuras menos recentes quando a pasta passa do limite.
 """
+import gzip
 import hashlib
-import time
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
 import plotly.graph_objects as go
 
-_cache = {}
+from utils.code_sandbox import run_in_sandbox
+from utils.figure_codec import decode_typed_arrays
+from utils.fingerprint import get_dataset_fingerprint
+
+CHART_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.cache', 'charts')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 512 * 1024 * 1024
+CHART_SUFFIX = '.json.gz'
+
+_cache = OrderedDict()  # chave -> (figura, tamanho estimado em bytes)
+_lock = threading.Lock()
+_max_bytes = DEFAULT_MAX_BYTES
+_max_disk_bytes = DEFAULT_MAX_DISK_BYTES
+_stats = {
+    "hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "bytes": 0,
+    "disk_stores": 0, "disk_evictions": 0,
+}
+
+
+def configure_chart_cache(max_bytes: int = DEFAULT_MAX_BYTES, max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+    """Define os tetos de memória e de disco do cache de gráficos (0 no disco desliga a camada)."""
+    global _max_bytes, _max_disk_bytes
+    with _lock:
+        _max_bytes = max(0, int(max_bytes))
+        _max_disk_bytes = max(0, int(max_disk_bytes))
+        _evict()
+
+
+def normalize_code(code: str) -> str:
+    """Código sem comentários de linha inteira, linhas em branco e espaços finais."""
+    lines = (line.rstrip() for line in code.strip().splitlines())
+    return "\n".join(line for line in lines if line and not line.lstrip().startswith("#"))
+
 
-def exec_with_cache(code, df):
-    # Criar chave mais robusta incluindo o código e as dimensões do DataFrame
-    key = hashlib.md5(f"{code}_{df.shape}_{str(df.columns.tolist())}".encode()).hexdigest()
-    if key in _cache:
-        return _cache[key]
+def chart_cache_key(code: str, df) -> str:
+    payload = f"{get_dataset_fingerprint(df)}\n{normalize_code(code)}"
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
 
+
+def _nbytes(value) -> int:
+    """Tamanho aproximado dos dados de uma figura (arrays, listas e textos), sem serializá-la."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes if value.dtype != object else value.size * 16
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        if value and not isinstance(value[0], (dict, list, tuple, np.ndarray)):
+            return len(value) * 16
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, str):
+        return len(value)
+    return 8
+
+
+def figure_nbytes(fig) -> int:
+    return _nbytes([trace.to_plotly_json() for trace in fig.data]) + _nbytes(fig.layout.to_plotly_json())
+
+
+def _evict():
+    while _cache and _stats["bytes"] > _max_bytes:
+        _, (_, size) = _cache.popitem(last=False)
+        _stats["bytes"] -= size
+        _stats["evictions"] += 1
+
+
+def _chart_path(key: str) -> str:
+    return os.path.join(CHART_CACHE_DIR, key + CHART_SUFFIX)
+
+
+def _read_disk_figure(key: str):
+    """Figura gravada em disco para a chave, marcando o acesso para a política LRU; None se não houver."""
+    path = _chart_path(key)
     try:
-        local_scope = {"df": df, "go": go, "px": __import__('plotly.express')}
-        exec(code, local_scope)
-        if 'fig' in local_scope:
-            _cache[key] = local_scope['fig']
-            return local_scope['fig']
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            fig = go.Figure(decode_typed_arrays(json.load(f)))
+        os.utime(path)
+        return fig
+    except FileNotFoundError:
+        return None
     except Exception as e:
-        print(f"Erro na execução do código em cache: {e}")
-        pass
-    return None
+        print(f"Gráfico em cache corrompido ({key}), descartando: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+
+def _write_disk_figure(key: str, fig):
+    """Grava a figura comprimida de forma atômica (arquivo temporário + `os.replace`)."""
+    os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+    tmp_path = os.path.join(CHART_CACHE_DIR, f".{key}.{uuid.uuid4().hex}.tmp")
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(fig.to_json())
+        os.replace(tmp_path, _chart_path(key))
+    except Exception as e:
+        # O cache é uma otimização: falhas de escrita não devem interromper a resposta
+        print(f"Não foi possível gravar o gráfico no cache: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    with _lock:
+        _stats["disk_stores"] += 1
+    evict_disk_cache(keep=key)
+
+
+def evict_disk_cache(max_bytes: int | None = None, keep: str | None = None):
+    """Remove os gráficos lidos há mais tempo até a pasta caber em `max_bytes`."""
+    max_bytes = _max_disk_bytes if max_bytes is None else max_bytes
+    if not os.path.isdir(CHART_CACHE_DIR):
+        return
+    entries = []
+    for entry in os.scandir(CHART_CACHE_DIR):
+        if entry.name.endswith(CHART_SUFFIX):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # removido por outro worker
+            entries.append((stat.st_mtime, entry.name[:-len(CHART_SUFFIX)], stat.st_size))
+
+    total = sum(size for _, _, size in entries)
+    for _, key, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        try:
+            os.remove(_chart_path(key))
+        except OSError:
+            continue
+        total -= size
+        with _lock:
+            _stats["disk_evictions"] += 1
+
+
+def _remember(key: str, fig):
+    size = figure_nbytes(fig)
+    with _lock:
+        if size > _max_bytes:
+            return  # uma figura maior que o teto inteiro não é guardada
+        previous = _cache.pop(key, None)
+        if previous is not None:
+            _stats["bytes"] -= previous[1]
+        _cache[key] = (fig, size)
+        _stats["bytes"] += size
+        _evict()
+
+
+def get_cached_figure(key: str):
+    """Figura da chave: memória, depois disco (promovida para a memória); None se não houver."""
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[0]
+        disk_enabled = _max_disk_bytes > 0
+
+    fig = _read_disk_figure(key) if disk_enabled else None
+    with _lock:
+        _stats["disk_hits" if fig is not None else "misses"] += 1
+    if fig is not None:
+        _remember(key, fig)
+    return fig
+
+
+def store_cached_figure(key: str, fig):
+    _remember(key, fig)
+    if _max_disk_bytes > 0:
+        _write_disk_figure(key, fig)
+
+
+def get_chart_cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats, entries=len(_cache), max_bytes=_max_bytes, max_disk_bytes=_max_disk_bytes)
+    lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+    return stats
+
+
+def exec_with_cache(code, df, on_wait=None):
+    """Executa o código que gera `fig` sobre `df` no sandbox, reaproveitando a figura de uma execução anterior.
+
+    Erros do código retornam None; estouro de tempo ou de memória do processo levantam `SandboxError`.
+    `on_wait` é repassado a `run_in_sandbox`.
+    """
+    key = chart_cache_key(code, df)
+    fig = get_cached_figure(key)
+    if fig is not None:
+        return fig
+
+    result = run_in_sandbox(code, df, on_wait=on_wait)
+    if result.error is not None or result.figure is None:
+        return None
+    store_cached_figure(key, result.figure)
+    return result.figure
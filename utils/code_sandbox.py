@@ -0,0 +1,374 @@
+"""
+Execução isolada do código Python gerado pelos agentes.
+
+O código roda num pool de processos "quentes" (bibliotecas já importadas), e não na thread do
+script do Streamlit: um ajuste lento ou um laço O(n²) não trava a sessão. Cada execução tem
+limite de tempo de relógio (o processo é encerrado e substituído ao estourar, ou quando a
+execução é interrompida) e de memória (`RLIMIT_AS`, no Linux). O worker recebe um ambiente
+mínimo: chaves de API e credenciais do app não chegam ao código gerado.
+
+O DataFrame não é serializado a cada chamada: ele é exportado uma única vez por fingerprint
+para um arquivo Arrow IPC em `.cache/sandbox/`, que os workers abrem via memory-map (colunas
+numéricas sem nulos viram views somente leitura do arquivo, compartilhadas pelo cache de
+páginas do sistema). Figuras Plotly, imagens do Matplotlib, a saída de `print` e a variável
+`result` voltam como resultado.
+"""
+import contextlib
+import io
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+
+import pandas as pd
+import plotly.graph_objects as go
+import pyarrow as pa
+
+from utils.figure_reduction import reduce_figure
+from utils.fingerprint import get_dataset_fingerprint
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SANDBOX_DIR = os.path.join(ROOT_DIR, '.cache', 'sandbox')
+DEFAULT_WORKERS = 2
+DEFAULT_TIMEOUT_S = 30
+DEFAULT_MAX_MEMORY_MB = 2048
+WORKER_START_TIMEOUT_S = 60  # importações do worker recém-criado, fora do limite de cada execução
+MAX_SHARED_DATASETS = 4
+MAX_OUTPUT_CHARS = 20_000
+POLL_INTERVAL_S = 0.1
+WAIT_CALLBACK_INTERVAL_S = 0.5  # frequência de `on_wait` (atualização do status no app)
+# Variáveis de ambiente repassadas ao worker: as demais (chaves de API, credenciais do banco)
+# não ficam visíveis para o código gerado
+WORKER_ENV_VARS = ("PATH", "PYTHONPATH", "HOME", "TMPDIR", "TEMP", "TMP", "LANG", "LANGUAGE", "TZ", "SYSTEMROOT")
+
+_settings = {"workers": DEFAULT_WORKERS, "timeout_s": DEFAULT_TIMEOUT_S, "max_memory_mb": DEFAULT_MAX_MEMORY_MB}
+_idle = queue.Queue()
+_pool_lock = threading.Lock()
+_started = 0
+_exported = {}  # fingerprint -> caminho do arquivo Arrow
+_export_lock = threading.Lock()
+_stats = {"runs": 0, "errors": 0, "timeouts": 0, "crashes": 0, "cancelled": 0, "total_s": 0.0}
+
+
+class SandboxError(Exception):
+    """A execução foi interrompida pelo sandbox (tempo, memória do processo ou cancelamento)."""
+
+
+class SandboxTimeoutError(SandboxError):
+    pass
+
+
+@dataclass
+class SandboxResult:
+    figure: go.Figure | None = None
+    images: list = field(default_factory=list)  # PNGs das figuras do Matplotlib
+    stdout: str = ""
+    result: str | None = None  # repr da variável `result`, se o código a definir
+    error: str | None = None
+    error_type: str | None = None
+    elapsed_s: float = 0.0
+
+
+def configure_sandbox(workers: int = DEFAULT_WORKERS, timeout_s: float = DEFAULT_TIMEOUT_S,
+                      max_memory_mb: int = DEFAULT_MAX_MEMORY_MB):
+    """Define o tamanho do pool e os limites padrão de tempo e memória de cada execução."""
+    _settings.update(workers=max(1, int(workers)), timeout_s=float(timeout_s), max_memory_mb=int(max_memory_mb))
+
+
+# --- Lado do worker ---
+
+def _set_memory_limit(max_memory_mb: int | None):
+    """Limita o espaço de endereçamento ao tamanho atual + `max_memory_mb` (None remove o limite)."""
+    try:
+        import resource
+    except ImportError:
+        return  # sem `resource` (Windows): só o limite de tempo se aplica
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if max_memory_mb is None:
+        resource.setrlimit(resource.RLIMIT_AS, (hard, hard))
+        return
+    with open('/proc/self/statm') as f:
+        current = int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    limit = current + max_memory_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _load_frame(path: str, frames: dict) -> pd.DataFrame:
+    if path not in frames:
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        frames.clear()  # um dataset por vez por worker
+        frames[path] = table.to_pandas(split_blocks=True)
+    return frames[path]
+
+
+def _execute(job: dict, frames: dict) -> SandboxResult:
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import plotly.express as px
+
+    start = time.perf_counter()
+    output = io.StringIO()
+    result = SandboxResult()
+    scope, error = {}, None
+    try:
+        # Cópia rasa: com copy-on-write (ligado no `_worker_main`), alterações do código não
+        # vazam para o frame em cache nem para a próxima execução
+        df = _load_frame(job["path"], frames).copy(deep=False)
+        scope.update(df=df, pd=pd, np=np, px=px, go=go, plt=plt)
+        _set_memory_limit(job["max_memory_mb"])
+        with contextlib.redirect_stdout(output):
+            exec(job["code"], scope)
+    except BaseException as e:
+        error = e
+    finally:
+        _set_memory_limit(None)
+    if error is not None:
+        result.error = str(error) or type(error).__name__
+        result.error_type = type(error).__name__
+        result.stdout = "".join(traceback.format_exception(error, limit=-3))
+
+    stdout = output.getvalue() + result.stdout
+    result.stdout = stdout[:MAX_OUTPUT_CHARS] + ("\n... (saída truncada)" if len(stdout) > MAX_OUTPUT_CHARS else "")
+    fig = scope.get("fig")
+    if isinstance(fig, go.Figure):
+        try:
+            fig, _ = reduce_figure(fig)  # limita o payload de figuras sobre datasets grandes
+        except Exception as e:
+            print(f"Falha ao reduzir a figura, mantendo a original: {e}", file=sys.stderr)
+        result.figure = fig.to_plotly_json()  # dicts e arrays NumPy: transferência barata via pickle
+    for number in plt.get_fignums():
+        buffer = io.BytesIO()
+        plt.figure(number).savefig(buffer, format='png', bbox_inches='tight')
+        result.images.append(buffer.getvalue())
+    plt.close('all')
+    if "result" in scope:
+        result.result = repr(scope["result"])[:MAX_OUTPUT_CHARS]
+    result.elapsed_s = time.perf_counter() - start
+    return result
+
+
+def _worker_main(fd: int):
+    """Laço do worker: recebe execuções pelo socket `fd` e devolve `SandboxResult`."""
+    conn = Connection(fd)
+    # O stdout do processo não é usado; prints de bibliotecas vão para o stderr (log do app)
+    sys.stdout = sys.stderr
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)  # padrão a partir do pandas 3
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401  (pré-carrega as bibliotecas do código gerado)
+    import numpy  # noqa: F401
+    import plotly.express  # noqa: F401
+
+    frames = {}
+    conn.send("ready")
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break  # o app encerrou
+        if job is None:
+            break
+        conn.send(_execute(job, frames))
+
+
+# --- Lado do app ---
+
+def _worker_env() -> dict:
+    """Ambiente mínimo do worker (caminhos e locale), sem os segredos do app."""
+    env = {k: v for k, v in os.environ.items() if k in WORKER_ENV_VARS or k.startswith("LC_")}
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (ROOT_DIR, env.get("PYTHONPATH")) if p)
+    return env
+
+
+class _Worker:
+    def __init__(self):
+        # Processo Python novo (e não multiprocessing): o Streamlit executa o app.py como
+        # `__main__`, e o spawn do multiprocessing o reexecutaria em cada worker
+        parent_sock, child_sock = socket.socketpair()
+        fd = child_sock.fileno()
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", f"from utils.code_sandbox import _worker_main; _worker_main({fd})"],
+            cwd=ROOT_DIR, pass_fds=(fd,), stdin=subprocess.DEVNULL, env=_worker_env(),
+        )
+        child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+        self.ready = False
+
+    def _wait_ready(self):
+        if self.ready:
+            return
+        try:
+            ready = self.conn.poll(WORKER_START_TIMEOUT_S) and self.conn.recv() == "ready"
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            raise SandboxError("O processo de execução de código não iniciou.")
+        self.ready = True
+
+    def run(self, job: dict, timeout_s: float, cancel_event: threading.Event | None, on_wait=None) -> SandboxResult:
+        self._wait_ready()
+        self.conn.send(job)
+        started = time.monotonic()
+        deadline = started + timeout_s
+        last_wait_call = started
+        while not self.conn.poll(POLL_INTERVAL_S):
+            if self.process.poll() is not None:
+                _count("crashes")
+                raise SandboxError("O processo de execução terminou inesperadamente (possível falta de memória).")
+            if cancel_event is not None and cancel_event.is_set():
+                _count("cancelled")
+                raise SandboxError("Execução cancelada.")
+            if time.monotonic() > deadline:
+                _count("timeouts")
+                raise SandboxTimeoutError(f"O código excedeu o tempo limite de {timeout_s:.0f}s e foi interrompido.")
+            if on_wait is not None and time.monotonic() - last_wait_call >= WAIT_CALLBACK_INTERVAL_S:
+                last_wait_call = time.monotonic()
+                on_wait(last_wait_call - started)
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            _count("crashes")
+            raise SandboxError("O processo de execução terminou inesperadamente (possível falta de memória).")
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait(timeout=5)
+        self.conn.close()
+
+
+def _count(name: str):
+    with _pool_lock:
+        _stats[name] += 1
+
+
+def _acquire_worker() -> _Worker:
+    global _started
+    try:
+        return _idle.get_nowait()
+    except queue.Empty:
+        pass
+    with _pool_lock:
+        if _started < _settings["workers"]:
+            _started += 1
+            spawn = True
+        else:
+            spawn = False
+    if spawn:
+        try:
+            return _Worker()
+        except Exception:
+            with _pool_lock:
+                _started -= 1
+            raise
+    return _idle.get()
+
+
+def _discard_worker(worker: _Worker):
+    global _started
+    worker.kill()
+    with _pool_lock:
+        _started -= 1
+
+
+def warm_up_sandbox():
+    """Inicia os workers do pool antes da primeira execução (as importações rodam em paralelo)."""
+    global _started
+    while True:
+        with _pool_lock:
+            if _started >= _settings["workers"]:
+                return
+            _started += 1
+        _idle.put(_Worker())
+
+
+def _evict_shared_datasets(keep: str):
+    paths = sorted(
+        (os.path.join(SANDBOX_DIR, name) for name in os.listdir(SANDBOX_DIR) if name.endswith('.arrow')),
+        key=os.path.getmtime, reverse=True,
+    )
+    for path in paths[MAX_SHARED_DATASETS:]:
+        if path != keep:
+            # Workers que já mapearam o arquivo continuam lendo normalmente após a remoção
+            os.remove(path)
+            _exported.pop(os.path.basename(path)[:-len('.arrow')], None)
+
+
+def _shared_dataset_path(df: pd.DataFrame) -> str:
+    """Arquivo Arrow IPC com o DataFrame, gravado uma vez por fingerprint (de forma atômica)."""
+    fingerprint = get_dataset_fingerprint(df)
+    with _export_lock:
+        path = _exported.get(fingerprint)
+        if path and os.path.exists(path):
+            return path
+        os.makedirs(SANDBOX_DIR, exist_ok=True)
+        path = os.path.join(SANDBOX_DIR, f"{fingerprint}.arrow")
+        if not os.path.exists(path):
+            try:
+                table = pa.Table.from_pandas(df)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Colunas object com tipos mistos: exportadas como texto
+                mixed = {col: str for col in df.columns if df[col].dtype == object}
+                table = pa.Table.from_pandas(df.astype(mixed))
+            tmp_path = os.path.join(SANDBOX_DIR, f".{fingerprint}.{uuid.uuid4().hex}")
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, path)
+        _exported[fingerprint] = path
+        _evict_shared_datasets(keep=path)
+        return path
+
+
+def run_in_sandbox(code: str, df: pd.DataFrame, timeout_s: float | None = None, max_memory_mb: int | None = None,
+                   cancel_event: threading.Event | None = None, on_wait=None) -> SandboxResult:
+    """Executa `code` com `df` (e pd, np, px, go, plt) num worker isolado.
+
+    Erros do próprio código voltam em `SandboxResult.error`; estouro de tempo, queda do processo
+    ou cancelamento (`cancel_event`) levantam `SandboxError` e o worker é substituído.
+
+    `on_wait(segundos)` é chamado periodicamente durante a espera. No app, ele atualiza o status
+    na tela: é nessa chamada que o Streamlit interrompe o script em Stop/rerun, e a exceção
+    levantada por ele também descarta o worker (a execução em andamento é encerrada).
+    """
+    job = {
+        "code": code,
+        "path": _shared_dataset_path(df),
+        "max_memory_mb": max_memory_mb or _settings["max_memory_mb"],
+    }
+    worker = _acquire_worker()
+    start = time.perf_counter()
+    try:
+        result = worker.run(job, timeout_s or _settings["timeout_s"], cancel_event, on_wait)
+    except BaseException as e:
+        # Tempo esgotado, cancelamento ou rerun do Streamlit: o processo pode estar ocupado; descarta
+        if not isinstance(e, SandboxError):
+            _count("cancelled")  # interrompido pelo chamador (ex.: Stop no Streamlit, via `on_wait`)
+        _discard_worker(worker)
+        raise
+    _idle.put(worker)
+
+    if result.figure is not None:
+        result.figure = go.Figure(result.figure)
+    with _pool_lock:
+        _stats["runs"] += 1
+        _stats["errors"] += int(result.error is not None)
+        _stats["total_s"] += time.perf_counter() - start
+    if result.error is not None:
+        print(f"Erro no código executado no sandbox ({result.error_type}): {result.error}")
+    return result
+
+
+def get_sandbox_stats() -> dict:
+    with _pool_lock:
+        stats = dict(_stats, workers=_started, idle=_idle.qsize())
+    stats["avg_s"] = stats["total_s"] / stats["runs"] if stats["runs"] else 0.0
+    return stats
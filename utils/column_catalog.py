@@ -0,0 +1,136 @@
+"""
+Catálogo de colunas do dataset, usado para montar previews enxutos para os agentes.
+
+O catálogo (nome, tipo e estatísticas compactas de cada coluna) é calculado uma única vez por
+fingerprint. A cada pergunta, `select_columns` escolhe as colunas citadas pelo nome ou
+parecidas (difflib) e preenche o restante do orçamento de tokens com as demais, na ordem
+original, para que datasets largos não fiquem limitados às primeiras colunas.
+"""
+import difflib
+import math
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils.fingerprint import get_dataset_fingerprint
+
+MAX_CACHED_CATALOGS = 16
+CHARS_PER_TOKEN = 4
+FUZZY_CUTOFF = 0.8
+TOP_VALUES = 3
+
+_catalogs = OrderedDict()
+_lock = threading.Lock()
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _words(text: str) -> list:
+    return [w for w in re.findall(r"[a-z0-9]+", _normalize(text)) if len(w) > 2]
+
+
+def _format_number(value) -> str:
+    return f"{value:.4g}" if isinstance(value, float) else str(value)
+
+
+def build_column_catalog(df: pd.DataFrame) -> dict:
+    """Nome, tipo e estatísticas compactas de cada coluna, mais um índice palavra -> colunas."""
+    numeric = df.select_dtypes(include='number')
+    numeric_stats = numeric.agg(['min', 'max', 'mean']) if numeric.shape[1] else pd.DataFrame()
+    missing = df.isna().sum()
+
+    entries, word_index = [], {}
+    for position, col in enumerate(df.columns):
+        series = df[col]
+        if col in numeric_stats.columns:
+            stats = "min={} max={} média={}".format(*(_format_number(v) for v in numeric_stats[col]))
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+            stats = f"de {series.min()} a {series.max()}"
+        else:
+            counts = series.value_counts()
+            top = ", ".join(str(v)[:30] for v in counts.index[:TOP_VALUES])
+            stats = f"{len(counts)} distintos; mais frequentes: {top}"
+        if missing[col]:
+            stats += f"; {int(missing[col])} nulos"
+        line = f"- {col} ({series.dtype}): {stats}"
+        entries.append({
+            "name": col, "dtype": str(series.dtype), "position": position,
+            "line": line, "tokens": len(line) // CHARS_PER_TOKEN + 1,
+        })
+        for word in set(_words(col)) | {_normalize(col)}:
+            word_index.setdefault(word, []).append(position)
+
+    return {"shape": df.shape, "entries": entries, "word_index": word_index}
+
+
+def get_column_catalog(df: pd.DataFrame) -> dict:
+    """Catálogo memoizado pelo fingerprint do dataset."""
+    fingerprint = get_dataset_fingerprint(df)
+    with _lock:
+        if fingerprint in _catalogs:
+            _catalogs.move_to_end(fingerprint)
+            return _catalogs[fingerprint]
+    catalog = build_column_catalog(df)
+    with _lock:
+        _catalogs[fingerprint] = catalog
+        if len(_catalogs) > MAX_CACHED_CATALOGS:
+            _catalogs.popitem(last=False)
+    return catalog
+
+
+def _relevant_positions(catalog: dict, question: str) -> list:
+    """Posições das colunas citadas na pergunta, das mais às menos relevantes."""
+    scores = {}
+    normalized_question = _normalize(question)
+    for entry in catalog["entries"]:
+        # Nome completo citado literalmente ("valor_total", "Customer ID"), sem casar "col_3" dentro de "col_39"
+        name = _normalize(entry["name"])
+        if len(name) > 1 and name in normalized_question and re.search(
+                rf"(?<![a-z0-9_]){re.escape(name)}(?![a-z0-9_])", normalized_question):
+            scores[entry["position"]] = scores.get(entry["position"], 0) + 3.0
+    word_index = catalog["word_index"]
+    n_cols = len(catalog["entries"])
+    for word in set(_words(question)):
+        if word in word_index:
+            matches = [(word, 1.0)]
+        else:
+            matches = [
+                (candidate, difflib.SequenceMatcher(None, word, candidate).ratio())
+                for candidate in difflib.get_close_matches(word, word_index.keys(), n=3, cutoff=FUZZY_CUTOFF)
+            ]
+        for candidate, ratio in matches:
+            # Palavras presentes em quase todas as colunas ("cpu" em cpu_1..cpu_400) pesam pouco
+            weight = ratio * (1 + math.log(n_cols / len(word_index[candidate])))
+            for position in word_index[candidate]:
+                scores[position] = scores.get(position, 0) + weight
+    return sorted(scores, key=lambda p: (-scores[p], p))
+
+
+def relevant_columns(catalog: dict, question: str) -> list:
+    """Nomes das colunas citadas na pergunta (pelo nome ou por semelhança), das mais às menos relevantes."""
+    return [catalog["entries"][position]["name"] for position in _relevant_positions(catalog, question)]
+
+
+def select_columns(catalog: dict, question: str = "", budget_tokens: int = 600) -> list:
+    """Entradas do catálogo que cabem no orçamento: primeiro as relevantes, depois as demais em ordem."""
+    selected, used, seen = [], 0, set()
+    relevant = _relevant_positions(catalog, question) if question else []
+    relevant_set = set(relevant)
+    for position in relevant + list(range(len(catalog["entries"]))):
+        if position in seen:
+            continue
+        entry = catalog["entries"][position]
+        if used + entry["tokens"] > budget_tokens:
+            if position in relevant_set:
+                continue  # tenta as próximas relevantes, que podem ser menores
+            break
+        selected.append(entry)
+        seen.add(position)
+        used += entry["tokens"]
+    return selected
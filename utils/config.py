@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 
@@ -7,6 +8,58 @@ if sys.version_info >= (3, 11):
 else:
     import toml as tomllib
 
+# Acima deste número de linhas o perfil do dataset usa estatísticas aproximadas
+DEFAULT_APPROX_PROFILE_MIN_ROWS = 1_000_000
+
+# Limites de requisições ao Gemini (plano gratuito do Gemini 2.0 Flash)
+DEFAULT_GEMINI_RPM = 15
+DEFAULT_GEMINI_RPD = 200
+
+# Tetos de memória e de disco do cache de gráficos (MB; 0 no disco desliga a camada em disco)
+DEFAULT_CHART_CACHE_MAX_MB = 256
+DEFAULT_CHART_DISK_CACHE_MAX_MB = 512
+
+# Execução isolada do código gerado: processos do pool e limites por execução
+DEFAULT_SANDBOX_WORKERS = 2
+DEFAULT_SANDBOX_TIMEOUT_S = 30
+DEFAULT_SANDBOX_MAX_MEMORY_MB = 2048
+
+# Perfil de modelo por agente: roteamento e sugestões são classificações/JSON curtos e vão para o
+# modelo mais barato e rápido; respostas longas ficam limitadas pelo orçamento de tokens de saída.
+# `fallback_model` é usado quando a chamada estoura `timeout_s`.
+DEFAULT_AGENT_PROFILES = {
+    "CoordinatorAgent": {"model": "gemini-2.0-flash-lite", "max_output_tokens": 256, "timeout_s": 10, "fallback_model": "gemini-2.0-flash"},
+    "SuggestionGenerator": {"model": "gemini-2.0-flash-lite", "max_output_tokens": 512, "timeout_s": 15, "fallback_model": "gemini-2.0-flash"},
+    "DataAnalystAgent": {"model": "gemini-2.0-flash", "max_output_tokens": 2048, "timeout_s": 45, "fallback_model": "gemini-2.0-flash-lite"},
+    "VisualizationAgent": {"model": "gemini-2.0-flash", "max_output_tokens": 1024, "timeout_s": 30, "fallback_model": "gemini-2.0-flash-lite"},
+    "ConsultantAgent": {"model": "gemini-2.0-flash", "max_output_tokens": 2048, "timeout_s": 60, "fallback_model": "gemini-2.0-flash-lite"},
+    "CodeGeneratorAgent": {"model": "gemini-2.0-flash", "max_output_tokens": 4096, "timeout_s": 60, "fallback_model": "gemini-2.0-flash-lite"},
+}
+
+def _agent_profiles(overrides: dict | None) -> dict:
+    """Perfis padrão com os campos sobrescritos por agente (`[custom.agent_profiles.<Agente>]`)."""
+    profiles = {agent: dict(profile) for agent, profile in DEFAULT_AGENT_PROFILES.items()}
+    for agent, profile in (overrides or {}).items():
+        if not isinstance(profile, dict):
+            print(f"Aviso: perfil do agente {agent} ignorado (esperado um objeto, recebido {profile!r}).")
+            continue
+        profiles.setdefault(agent, {}).update(profile)
+    return profiles
+
+
+def _agent_profiles_from_env() -> dict:
+    """Perfis com as sobrescritas de AGENT_PROFILES (JSON); valor inválido usa os padrões."""
+    raw = os.getenv("AGENT_PROFILES") or "{}"
+    try:
+        overrides = json.loads(raw)
+    except json.JSONDecodeError as e:
+        print(f"Aviso: AGENT_PROFILES não é um JSON válido ({e}). Usando os perfis padrão.")
+        return _agent_profiles(None)
+    if not isinstance(overrides, dict):
+        print("Aviso: AGENT_PROFILES deve ser um objeto JSON por agente. Usando os perfis padrão.")
+        return _agent_profiles(None)
+    return _agent_profiles(overrides)
+
 def get_config():
     """Carrega e retorna as configurações do secrets.toml."""
     config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.streamlit', 'secrets.toml')
@@ -21,6 +74,16 @@ def get_config():
             "google_api_key": app_config.get("google_api_key"),
             "supabase_url": app_config.get("supabase_url"),
             "supabase_key": app_config.get("supabase_key"),
+            "approx_profile_min_rows": int(app_config.get("approx_profile_min_rows", DEFAULT_APPROX_PROFILE_MIN_ROWS)),
+            "gemini_rpm": int(app_config.get("gemini_rpm", DEFAULT_GEMINI_RPM)),
+            "gemini_rpd": int(app_config.get("gemini_rpd", DEFAULT_GEMINI_RPD)),
+            "speculative_execution": bool(app_config.get("speculative_execution", False)),
+            "agent_profiles": _agent_profiles(app_config.get("agent_profiles")),
+            "chart_cache_max_mb": int(app_config.get("chart_cache_max_mb", DEFAULT_CHART_CACHE_MAX_MB)),
+            "chart_disk_cache_max_mb": int(app_config.get("chart_disk_cache_max_mb", DEFAULT_CHART_DISK_CACHE_MAX_MB)),
+            "sandbox_workers": int(app_config.get("sandbox_workers", DEFAULT_SANDBOX_WORKERS)),
+            "sandbox_timeout_s": float(app_config.get("sandbox_timeout_s", DEFAULT_SANDBOX_TIMEOUT_S)),
+            "sandbox_max_memory_mb": int(app_config.get("sandbox_max_memory_mb", DEFAULT_SANDBOX_MAX_MEMORY_MB)),
         }
     except FileNotFoundError:
         print("Aviso: Arquivo secrets.toml não encontrado. Usando variáveis de ambiente como fallback.")
@@ -29,6 +92,17 @@ def get_config():
             "google_api_key": os.getenv("GOOGLE_API_KEY"),
             "supabase_url": os.getenv("SUPABASE_URL"),
             "supabase_key": os.getenv("SUPABASE_KEY"),
+            "approx_profile_min_rows": int(os.getenv("APPROX_PROFILE_MIN_ROWS", DEFAULT_APPROX_PROFILE_MIN_ROWS)),
+            "gemini_rpm": int(os.getenv("GEMINI_RPM", DEFAULT_GEMINI_RPM)),
+            "gemini_rpd": int(os.getenv("GEMINI_RPD", DEFAULT_GEMINI_RPD)),
+            "speculative_execution": os.getenv("SPECULATIVE_EXECUTION", "").lower() in ("1", "true", "yes"),
+            # AGENT_PROFILES: JSON no formato {"CoordinatorAgent": {"model": "..."}}
+            "agent_profiles": _agent_profiles_from_env(),
+            "chart_cache_max_mb": int(os.getenv("CHART_CACHE_MAX_MB", DEFAULT_CHART_CACHE_MAX_MB)),
+            "chart_disk_cache_max_mb": int(os.getenv("CHART_DISK_CACHE_MAX_MB", DEFAULT_CHART_DISK_CACHE_MAX_MB)),
+            "sandbox_workers": int(os.getenv("SANDBOX_WORKERS", DEFAULT_SANDBOX_WORKERS)),
+            "sandbox_timeout_s": float(os.getenv("SANDBOX_TIMEOUT_S", DEFAULT_SANDBOX_TIMEOUT_S)),
+            "sandbox_max_memory_mb": int(os.getenv("SANDBOX_MAX_MEMORY_MB", DEFAULT_SANDBOX_MAX_MEMORY_MB)),
         }
     except Exception as e:
         print(f"Erro ao carregar secrets.toml: {e}")
@@ -36,4 +110,14 @@ def get_config():
             "google_api_key": None,
             "supabase_url": None,
             "supabase_key": None,
+            "approx_profile_min_rows": DEFAULT_APPROX_PROFILE_MIN_ROWS,
+            "gemini_rpm": DEFAULT_GEMINI_RPM,
+            "gemini_rpd": DEFAULT_GEMINI_RPD,
+            "speculative_execution": False,
+            "agent_profiles": _agent_profiles(None),
+            "chart_cache_max_mb": DEFAULT_CHART_CACHE_MAX_MB,
+            "chart_disk_cache_max_mb": DEFAULT_CHART_DISK_CACHE_MAX_MB,
+            "sandbox_workers": DEFAULT_SANDBOX_WORKERS,
+            "sandbox_timeout_s": DEFAULT_SANDBOX_TIMEOUT_S,
+            "sandbox_max_memory_mb": DEFAULT_SANDBOX_MAX_MEMORY_MB,
         }
\ No newline at end of file
@@ -0,0 +1,153 @@
+"""
+Contexto da conversa com orçamento de tokens por agente.
+
+O histórico é guardado como turnos estruturados (e as análises como entradas separadas), em
+vez de strings que crescem sem limite. Ao montar o prompt de um agente, os turnos mais
+recentes entram na íntegra e os mais antigos entram resumidos, de forma que o tamanho do
+prompt fique limitado independentemente da duração da sessão. O resumo de cada entrada é
+extrativo (sem chamar o LLM), calculado uma única vez e guardado na própria entrada.
+
+As análises também são indexadas (BM25, `utils/analysis_index.py`) para que cada agente
+receba só as mais relevantes para a pergunta atual.
+"""
+import re
+
+from utils.analysis_index import AnalysisIndex
+
+CHARS_PER_TOKEN = 4  # aproximação usual para texto em português/inglês
+SUMMARY_CHARS = 160
+RECENT_SHARE = 0.75  # fração do orçamento reservada aos turnos recentes, na íntegra
+TOP_K_ANALYSES = 3
+
+# Orçamento de tokens de histórico (e de análises) por agente
+CONTEXT_BUDGETS = {
+    "CoordinatorAgent": 1_000,
+    "DataAnalystAgent": 2_500,
+    "VisualizationAgent": 1_500,
+    "ConsultantAgent": 4_000,
+    "CodeGeneratorAgent": 2_500,
+    "SuggestionGenerator": 800,
+}
+DEFAULT_BUDGET = 2_000
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def summarize_text(text: str, max_chars: int = SUMMARY_CHARS) -> str:
+    """Resumo extrativo: primeira frase do texto, sem blocos de código e markdown."""
+    text = re.sub(r"```.*?```", " [código] ", text, flags=re.DOTALL)
+    text = re.sub(r"[#*_`>|]+", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 1].rstrip() + "…"
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "… (truncado)"
+
+
+def _render_entries(entries: list, budget_tokens: int, separator: str) -> str:
+    """Entradas recentes na íntegra e as antigas resumidas, dentro do orçamento de tokens."""
+    recent, used = [], 0
+    for entry in reversed(entries):
+        text = f"{entry['label']}: {entry['text']}"
+        cost = estimate_tokens(text)
+        if used + cost > budget_tokens * RECENT_SHARE:
+            if not recent:
+                # Nem a entrada mais recente cabe: entra truncada
+                recent.append(_truncate(text, int(budget_tokens * RECENT_SHARE)))
+                used += estimate_tokens(recent[-1])
+            break
+        recent.append(text)
+        used += cost
+    recent.reverse()
+
+    older = entries[:len(entries) - len(recent)]
+    summary_lines, remaining = [], budget_tokens - used
+    for entry in reversed(older):
+        if "summary" not in entry:
+            entry["summary"] = summarize_text(entry["text"])
+        line = f"- {entry['label']}: {entry['summary']}"
+        cost = estimate_tokens(line)
+        if cost > remaining:
+            break
+        summary_lines.append(line)
+        remaining -= cost
+    summary_lines.reverse()
+
+    parts = []
+    if older:
+        omitted = len(older) - len(summary_lines)
+        header = "Resumo do histórico anterior"
+        if omitted:
+            header += f" ({omitted} mais antigos omitidos)"
+        parts.append(header + ":\n" + "\n".join(summary_lines))
+    parts.extend(recent)
+    return separator.join(parts)
+
+
+class ConversationContext:
+    """Histórico estruturado da conversa e das análises de uma sessão."""
+
+    def __init__(self, columns: list | None = None):
+        self.turns = []     # {"label": "Usuário"/"Assistente", "text": ...}
+        self.analyses = []  # {"label": tipo da análise, "text": ...}
+        self.columns = list(columns or [])  # colunas do dataset, para os metadados do índice
+        self.index = AnalysisIndex()
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.turns
+
+    def add_turn(self, label: str, text: str):
+        self.turns.append({"label": label, "text": text})
+
+    def add_analysis(self, label: str, text: str):
+        self.analyses.append({"label": label, "text": text})
+        self.index.add(text, label, self.columns)
+
+    def history(self, agent_name: str) -> str:
+        """Histórico da conversa dentro do orçamento do agente."""
+        return _render_entries(self.turns, CONTEXT_BUDGETS.get(agent_name, DEFAULT_BUDGET), "\n")
+
+    def analyses_history(self, agent_name: str) -> str:
+        """Análises anteriores dentro do orçamento do agente."""
+        return _render_entries(self.analyses, CONTEXT_BUDGETS.get(agent_name, DEFAULT_BUDGET), "\n\n")
+
+    def relevant_analyses(self, agent_name: str, question: str, k: int = TOP_K_ANALYSES) -> str:
+        """As `k` análises mais relevantes para a pergunta, em ordem cronológica e dentro do orçamento.
+
+        A análise mais recente sempre entra, para que perguntas de acompanhamento ("e para a
+        coluna X?") mantenham o contexto imediato.
+        """
+        if not self.analyses:
+            return ""
+        selected = set(self.index.top_k(question, k - 1, self.columns))
+        selected.add(len(self.analyses) - 1)
+        for i in self.index.top_k(question, k, self.columns):
+            if len(selected) >= k:
+                break
+            selected.add(i)
+        entries = [self.analyses[i] for i in sorted(selected)]
+        return _render_entries(entries, CONTEXT_BUDGETS.get(agent_name, DEFAULT_BUDGET), "\n\n")
+
+    @classmethod
+    def from_session_history(cls, session_history: dict, columns: list | None = None) -> "ConversationContext":
+        """Reconstrói o contexto (e o índice das análises) a partir de `SupabaseMemory.get_session_history`."""
+        context = cls(columns)
+        for conversation in session_history.get("conversations", []):
+            if conversation.get("question"):
+                context.add_turn("Usuário", conversation["question"])
+            if conversation.get("answer"):
+                context.add_turn("Assistente", conversation["answer"])
+        for analysis in session_history.get("analyses", []):
+            results = analysis.get("results") or {}
+            if results.get("analysis"):
+                context.add_analysis("Análise", results["analysis"])
+        for conclusion in session_history.get("conclusions", []):
+            if conclusion.get("conclusion_text"):
+                context.add_analysis("Conclusão", conclusion["conclusion_text"])
+        return context
@@ -1,51 +1,286 @@
 import pandas as pd
+import numpy as np
 import io
+import csv
+import codecs
 import hashlib
+import time
 
+from utils.dataset_cache import cache_key, get_cached_dataset, store_cached_dataset
+from utils.config import DEFAULT_APPROX_PROFILE_MIN_ROWS
+from utils.dataset_profile import get_dataset_profile
+from utils.fingerprint import get_dataset_fingerprint, register_dataset_fingerprint
 
-def load_csv(uploaded_file, max_size_mb=200):
-    """Carrega, valida e detecta automaticamente o formato de um arquivo CSV."""
-    if uploaded_file.size > max_size_mb * 1024 * 1024:
-        raise ValueError(f"Arquivo excede o tamanho máximo de {max_size_mb} MB.")
+ENCODINGS = ['utf-8', 'iso-8859-1', 'latin1']
+SEPARATORS = [',', ';', '\t', '|']
 
-    # Tenta diferentes encodings e separadores
-    encodings = ['utf-8', 'iso-8859-1', 'latin1']
-    separators = [',', ';', '\t', '|']
+# Tamanho da amostra usada para detectar encoding e separador (não lê o arquivo inteiro)
+SNIFF_SAMPLE_BYTES = 64 * 1024
+SNIFF_MAX_LINES = 50
+# Tamanho dos blocos usados para validar o encoding sem materializar o arquivo como str
+VALIDATION_CHUNK_BYTES = 4 * 1024 * 1024
+# Colunas de texto com proporção de valores únicos até este limite viram `category`
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
 
-    file_content = uploaded_file.getvalue()
 
-    for encoding in encodings:
+def _decode_sample(sample: bytes, encoding: str) -> str:
+    """Decodifica a amostra tolerando um caractere multibyte cortado no final."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    return decoder.decode(sample, final=False)
+
+
+def _decodes_cleanly(chunks, encoding: str) -> bool:
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        for chunk in chunks:
+            decoder.decode(chunk, final=False)
+        decoder.decode(b"", final=True)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _is_valid_encoding(file_content: bytes, encoding: str) -> bool:
+    """Valida o encoding do arquivo inteiro em blocos, sem criar uma cópia decodificada."""
+    view = memoryview(file_content)
+    return _decodes_cleanly(
+        (view[start:start + VALIDATION_CHUNK_BYTES] for start in range(0, len(view), VALIDATION_CHUNK_BYTES)),
+        encoding
+    )
+
+
+def iter_file_chunks(file_obj, chunk_bytes: int = VALIDATION_CHUNK_BYTES):
+    """Lê o arquivo do início em blocos, sem materializar o conteúdo inteiro."""
+    file_obj.seek(0)
+    while True:
+        chunk = file_obj.read(chunk_bytes)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _detect_encoding(file_content: bytes) -> str:
+    """Detecta o encoding a partir de uma amostra limitada do arquivo."""
+    sample = file_content[:SNIFF_SAMPLE_BYTES]
+    for encoding in ENCODINGS:
         try:
-            content_str = file_content.decode(encoding)
-            for sep in separators:
-                try:
-                    df = pd.read_csv(io.StringIO(content_str), sep=sep)
-                    # Heurística simples: se a maioria das colunas foi criada, sucesso.
-                    if len(df.columns) > 1 or sep == separators[-1]:
-                        # Calcula o hash do conteúdo para identificar o dataset
-                        file_hash = hashlib.md5(file_content).hexdigest()
-                        return df, file_hash
-                except Exception:
-                    continue
+            _decode_sample(sample, encoding)
         except UnicodeDecodeError:
             continue
+        if _is_valid_encoding(file_content, encoding):
+            return encoding
+    raise ValueError("Não foi possível decodificar o arquivo CSV. Verifique o encoding.")
+
+
+def _detect_separator(sample_text: str, truncated: bool) -> str:
+    """Escolhe o separador que gera o número de colunas mais consistente na amostra."""
+    lines = sample_text.splitlines()
+    if truncated and len(lines) > 1:
+        # A última linha da amostra pode estar incompleta
+        lines = lines[:-1]
+    lines = [line for line in lines[:SNIFF_MAX_LINES] if line.strip()]
+
+    best_sep, best_score = SEPARATORS[0], (0.0, 0)
+    for sep in SEPARATORS:
+        try:
+            field_counts = [len(row) for row in csv.reader(lines, delimiter=sep)]
+        except csv.Error:
+            continue
+        if not field_counts:
+            continue
+        modal_count = max(set(field_counts), key=field_counts.count)
+        if modal_count <= 1:
+            continue
+        consistency = field_counts.count(modal_count) / len(field_counts)
+        score = (consistency, modal_count)
+        if score > best_score:
+            best_sep, best_score = sep, score
+    return best_sep
 
-    raise ValueError("Não foi possível decodificar ou parsear o arquivo CSV. Verifique o encoding e o separador.")
+
+def sniff_dialect(file_content: bytes) -> tuple[str, str]:
+    """Retorna o encoding e o separador detectados a partir de uma amostra do arquivo."""
+    encoding = _detect_encoding(file_content)
+    sample = file_content[:SNIFF_SAMPLE_BYTES]
+    sep = _detect_separator(_decode_sample(sample, encoding), truncated=len(file_content) > len(sample))
+    return encoding, sep
+
+
+def sniff_dialect_stream(file_obj) -> tuple[str, str]:
+    """Como `sniff_dialect`, mas validando o encoding com leituras em blocos do arquivo."""
+    file_obj.seek(0)
+    sample = file_obj.read(SNIFF_SAMPLE_BYTES)
+    truncated = bool(file_obj.read(1))
+    for encoding in ENCODINGS:
+        try:
+            sample_text = _decode_sample(sample, encoding)
+        except UnicodeDecodeError:
+            continue
+        if _decodes_cleanly(iter_file_chunks(file_obj), encoding):
+            return encoding, _detect_separator(sample_text, truncated=truncated)
+    raise ValueError("Não foi possível decodificar o arquivo CSV. Verifique o encoding.")
 
 
-def get_dataset_info(df: pd.DataFrame, dataset_name: str) -> dict:
-    """Extrai metadados e estatísticas básicas de um dataframe."""
-    buffer = io.StringIO()
-    df.info(buf=buffer)
-    info_str = buffer.getvalue()
+def _parse_csv(file_content: bytes, encoding: str, sep: str):
+    """Faz o parse dos bytes originais uma única vez, preferindo o engine pyarrow."""
+    try:
+        df = pd.read_csv(io.BytesIO(file_content), sep=sep, encoding=encoding, engine='pyarrow')
+        return df, 'pyarrow'
+    except Exception as e:
+        # pyarrow ausente ou arquivo com linhas irregulares: usa o engine padrão
+        print(f"Engine pyarrow indisponível para este arquivo, usando engine C: {e}")
+    df = pd.read_csv(io.BytesIO(file_content), sep=sep, encoding=encoding)
+    return df, 'c'
 
+
+def _compact_series(series: pd.Series) -> pd.Series:
+    """Retorna a coluna no tipo mais compacto que preserva exatamente os valores."""
+    if pd.api.types.is_bool_dtype(series.dtype) or isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    if pd.api.types.is_integer_dtype(series.dtype):
+        # Não reduz abaixo de int32 para evitar overflow silencioso no código gerado pelos agentes
+        info = np.iinfo(np.int32)
+        if isinstance(series.dtype, np.dtype) and series.dtype.itemsize > 4 and (series.empty or (series.min() >= info.min and series.max() <= info.max)):
+            return series.astype(np.int32)
+        return series
+    if pd.api.types.is_float_dtype(series.dtype):
+        downcast = pd.to_numeric(series, downcast='float')
+        # float32 só é aceito quando não há perda de precisão
+        if downcast.dtype != series.dtype and downcast.astype(series.dtype).equals(series):
+            return downcast
+        return series
+    if pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+        if pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+            return series
+        if len(series) and series.nunique(dropna=True) / len(series) <= CATEGORY_MAX_UNIQUE_RATIO:
+            return series.astype('category')
+        if isinstance(series.dtype, pd.StringDtype) and series.dtype.storage == 'pyarrow':
+            return series
+        return series.astype(pd.StringDtype('pyarrow'))
+    return series
+
+
+def compact_dtypes(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """Reduz o uso de memória do DataFrame e retorna um relatório antes/depois."""
+    before_bytes = int(df.memory_usage(deep=True).sum())
+    compacted = {}
+    conversions = {}
+    for col in df.columns:
+        new_series = _compact_series(df[col])
+        if new_series.dtype != df[col].dtype:
+            conversions[col] = f"{df[col].dtype} → {new_series.dtype}"
+        compacted[col] = new_series
+    df = pd.DataFrame(compacted, index=df.index)
+    after_bytes = int(df.memory_usage(deep=True).sum())
+
+    memory_report = {
+        "before_bytes": before_bytes,
+        "after_bytes": after_bytes,
+        "saved_pct": round(100 * (1 - after_bytes / before_bytes), 1) if before_bytes else 0.0,
+        "conversions": conversions,
+    }
+    return df, memory_report
+
+
+def load_csv(uploaded_file, max_size_mb=200, compact=False, use_cache=True):
+    """Carrega, valida e detecta automaticamente o formato de um arquivo CSV.
+
+    Retorna o DataFrame, o hash MD5 do conteúdo e um relatório com o dialeto
+    detectado (encoding, separador, engine) e o tempo gasto em cada etapa.
+    Com `compact=True`, os tipos são compactados e o relatório inclui o uso
+    de memória antes e depois. Com `use_cache=True`, um arquivo já enviado
+    antes (mesmo hash) é lido do cache local em Parquet, sem novo parse.
+    """
+    if uploaded_file.size > max_size_mb * 1024 * 1024:
+        raise ValueError(f"Arquivo excede o tamanho máximo de {max_size_mb} MB.")
+
+    file_content = uploaded_file.getvalue()
+    timings = {}
+
+    start = time.perf_counter()
+    file_hash = hashlib.md5(file_content).hexdigest()
+    timings["hash_s"] = time.perf_counter() - start
+
+    key = cache_key(file_hash, compact=compact)
+    if use_cache:
+        start = time.perf_counter()
+        cached = get_cached_dataset(key)
+        if cached is not None:
+            df, meta = cached
+            timings["cache_read_s"] = time.perf_counter() - start
+            load_report = {
+                **meta["load_report"],
+                "timings": timings,
+                "total_s": sum(timings.values()),
+                "cache_hit": True,
+            }
+            print(f"CSV carregado do cache ({key}) em {load_report['total_s']:.3f}s")
+            register_dataset_fingerprint(df, key)
+            return df, file_hash, load_report
+
+    # Detecta encoding e separador a partir de uma amostra limitada
+    start = time.perf_counter()
+    encoding, sep = sniff_dialect(file_content)
+    timings["sniff_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        df, engine = _parse_csv(file_content, encoding, sep)
+    except Exception as e:
+        raise ValueError(f"Não foi possível parsear o arquivo CSV (encoding={encoding}, separador={sep!r}): {e}") from e
+    timings["parse_s"] = time.perf_counter() - start
+
+    memory_report = None
+    if compact:
+        start = time.perf_counter()
+        df, memory_report = compact_dtypes(df)
+        timings["compact_s"] = time.perf_counter() - start
+
+    load_report = {
+        "encoding": encoding,
+        "separator": sep,
+        "engine": engine,
+        "size_bytes": len(file_content),
+        "timings": timings,
+        "total_s": sum(timings.values()),
+        "memory": memory_report,
+        "cache_hit": False,
+    }
+    if use_cache:
+        store_cached_dataset(key, df, {
+            "load_report": load_report,
+            "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+        })
+    print(f"CSV carregado: encoding={encoding}, separador={sep!r}, engine={engine}, "
+          f"tempos={ {k: round(v, 3) for k, v in timings.items()} }")
+    # O conteúdo já é identificado pelo hash do arquivo: evita recalcular o fingerprint
+    register_dataset_fingerprint(df, key)
+    return df, file_hash, load_report
+
+
+def get_basic_dataset_info(df: pd.DataFrame, dataset_name: str, load_report: dict | None = None) -> dict:
+    """Metadados imediatos do dataframe (sem estatísticas), para exibir o dataset logo após o upload."""
     return {
         "name": dataset_name,
         "shape": df.shape,
         "columns": df.columns.tolist(),
         "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
-        "missing_values": df.isnull().sum().to_dict(),
-        "duplicated_rows": int(df.duplicated().sum()),
-        "info_string": info_str,
-        "head": df.head().to_json(orient='split')
-    }
\ No newline at end of file
+        "head": df.head().to_json(orient='split'),
+        "fingerprint": get_dataset_fingerprint(df),
+        "load_report": load_report or {}
+    }
+
+
+def get_dataset_info(df: pd.DataFrame, dataset_name: str, load_report: dict | None = None,
+                     approx_min_rows: int = DEFAULT_APPROX_PROFILE_MIN_ROWS) -> dict:
+    """Extrai metadados e estatísticas básicas de um dataframe a partir do perfil memoizado."""
+    profile = get_dataset_profile(df, approx_min_rows=approx_min_rows)
+
+    return {
+        **get_basic_dataset_info(df, dataset_name, load_report),
+        "missing_values": profile["missing_values"],
+        "duplicated_rows": profile["duplicated_rows"],
+        "info_string": profile["info_string"],
+        "approximate": profile["approximate"],
+        "error_bounds": profile["error_bounds"],
+    }
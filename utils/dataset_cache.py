@@ -0,0 +1,141 @@
+"""
+Cache local de datasets já parseados, endereçado pelo hash do arquivo enviado.
+
+Cada entrada é um diretório em `.cache/datasets/<chave>/` com os dados em Parquet e um
+`meta.json` (dialeto detectado, dtypes, metadados). O `mtime` do `meta.json` é atualizado
+a cada acesso e usado para despejar as entradas menos recentes quando o cache passa do
+limite de tamanho.
+"""
+import json
+import os
+import shutil
+import time
+import uuid
+
+import pandas as pd
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.cache', 'datasets')
+MAX_CACHE_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB
+META_FILE = 'meta.json'
+DATA_FILE = 'data.parquet'
+IN_USE_GRACE_S = 30 * 60  # entradas acessadas há menos tempo que isso podem estar abertas em outra sessão
+STALE_BUILD_S = 6 * 60 * 60  # diretórios temporários mais antigos que isso são de gravações que falharam
+
+
+def cache_key(file_hash: str, mode: str = 'frame', compact: bool = False) -> str:
+    """Monta a chave da entrada a partir do hash do arquivo e das opções de carregamento."""
+    return f"{file_hash}-{mode}{'-compact' if compact else ''}"
+
+
+def entry_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key)
+
+
+def touch_cache_entry(key: str):
+    """Marca a entrada como em uso (protegida da remoção durante `IN_USE_GRACE_S`)."""
+    try:
+        os.utime(os.path.join(entry_path(key), META_FILE))
+    except OSError:
+        pass
+
+
+def read_cache_meta(key: str) -> dict | None:
+    """Lê o `meta.json` da entrada e marca o acesso para a política LRU."""
+    meta_path = os.path.join(entry_path(key), META_FILE)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        os.utime(meta_path)
+        return meta
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_cache_meta(key: str, meta: dict, path: str | None = None):
+    """Grava o `meta.json` de forma atômica; uma entrada só é válida depois disso.
+
+    `path` permite gravar num diretório temporário que depois é renomeado para a entrada.
+    """
+    path = path or entry_path(key)
+    os.makedirs(path, exist_ok=True)
+    tmp_path = os.path.join(path, f".{META_FILE}.{uuid.uuid4().hex}")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, default=str)
+    os.replace(tmp_path, os.path.join(path, META_FILE))
+
+
+def get_cached_dataset(key: str, columns: list | None = None):
+    """Retorna `(df, meta)` da entrada, lendo apenas as colunas pedidas, ou None se não existir."""
+    meta = read_cache_meta(key)
+    data_path = os.path.join(entry_path(key), DATA_FILE)
+    if meta is None or not os.path.exists(data_path):
+        return None
+    try:
+        return pd.read_parquet(data_path, columns=columns), meta
+    except Exception as e:
+        print(f"Entrada de cache corrompida ({key}), descartando: {e}")
+        shutil.rmtree(entry_path(key), ignore_errors=True)
+        return None
+
+
+def store_cached_dataset(key: str, df: pd.DataFrame, meta: dict):
+    """Grava o DataFrame em Parquet com seus metadados e aplica o limite de tamanho do cache."""
+    path = entry_path(key)
+    os.makedirs(path, exist_ok=True)
+    tmp_path = os.path.join(path, f".{DATA_FILE}.{uuid.uuid4().hex}")
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, os.path.join(path, DATA_FILE))
+        write_cache_meta(key, meta)
+    except Exception as e:
+        # O cache é uma otimização: falhas de escrita não devem interromper o carregamento
+        print(f"Não foi possível gravar o dataset no cache: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    evict_cache(keep=key)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def evict_cache(max_bytes: int = MAX_CACHE_BYTES, keep: str | None = None):
+    """Remove as entradas acessadas há mais tempo até o cache caber em `max_bytes`.
+
+    Entradas acessadas nos últimos `IN_USE_GRACE_S` segundos não são removidas: podem ser stores
+    em blocos ainda lidos por outra sessão (que renova o acesso a cada interação).
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return
+    entries = []
+    for key in os.listdir(CACHE_DIR):
+        if key.startswith('.'):
+            # Diretório temporário de uma gravação em andamento; sobras antigas de falhas são removidas
+            path = os.path.join(CACHE_DIR, key)
+            if os.path.isdir(path) and time.time() - os.path.getmtime(path) > STALE_BUILD_S:
+                shutil.rmtree(path, ignore_errors=True)
+            continue
+        path = entry_path(key)
+        meta_path = os.path.join(path, META_FILE)
+        # Entradas sem meta.json ainda estão sendo gravadas (ou falharam) e usam o mtime do diretório
+        last_access = os.path.getmtime(meta_path) if os.path.exists(meta_path) else os.path.getmtime(path)
+        entries.append((last_access, key, _dir_size(path)))
+
+    total = sum(size for _, _, size in entries)
+    now = time.time()
+    for last_access, key, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if key == keep or now - last_access < IN_USE_GRACE_S:
+            continue
+        shutil.rmtree(entry_path(key), ignore_errors=True)
+        total -= size
+        print(f"Cache de datasets: entrada {key} removida ({size / (1024 * 1024):.1f} MB)")
@@ -0,0 +1,208 @@
+"""
+Perfil estatístico do dataset, calculado uma vez por fingerprint e memoizado.
+
+Reúne tudo o que a aba de Estatísticas e `get_dataset_info` precisam (describe, tipos,
+valores faltantes, cardinalidade, duplicatas e uso de memória), evitando que cada
+rerun do Streamlit recalcule essas métricas sobre o DataFrame inteiro.
+
+Acima de `approx_min_rows` linhas o perfil entra no modo aproximado (`utils/sketches.py`):
+distintos por HyperLogLog, quartis por amostragem e duplicatas por hash de linha, com os
+limites de erro registrados em `error_bounds`.
+
+`start_profile_job` calcula o perfil numa thread de fundo, publicando cada métrica em
+`job.progress` assim que fica pronta, para que a interface possa exibi-las progressivamente.
+"""
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+
+from utils.config import DEFAULT_APPROX_PROFILE_MIN_ROWS
+from utils.fingerprint import get_dataset_fingerprint
+from utils.sketches import (
+    approx_describe, approx_duplicated_rows, approx_nunique,
+    hyperloglog_relative_error,
+)
+
+MAX_CACHED_PROFILES = 16
+PROFILE_WORKERS = 2
+
+_profiles = OrderedDict()
+_jobs = {}  # perfis em cálculo em segundo plano, por (fingerprint, aproximado)
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=PROFILE_WORKERS, thread_name_prefix="dataset-profile")
+
+
+def _nunique_step(df: pd.DataFrame, approximate: bool) -> dict:
+    n_rows = len(df)
+    if not approximate:
+        nunique = {col: int(v) for col, v in df.nunique().items()}
+        return {
+            "nunique": nunique,
+            "approximate_columns": [],
+            "unique_columns": [col for col, v in nunique.items() if n_rows and v == n_rows],
+        }
+
+    nunique, approximate_columns = {}, []
+    for col in df.columns:
+        count, is_approximate = approx_nunique(df[col])
+        nunique[col] = count
+        if is_approximate:
+            approximate_columns.append(col)
+    # Com contagens estimadas, "única" significa dentro de 3 erros-padrão do total de linhas
+    tolerance = 3 * hyperloglog_relative_error()
+    unique_columns = [
+        col for col, v in nunique.items()
+        if n_rows and v >= n_rows * (1 - tolerance if col in approximate_columns else 1)
+    ]
+    return {"nunique": nunique, "approximate_columns": approximate_columns, "unique_columns": unique_columns}
+
+
+def _describe_step(df: pd.DataFrame, approximate: bool) -> dict:
+    if approximate and df.select_dtypes(include='number').shape[1]:
+        describe, quantile_rank_error = approx_describe(df)
+        return {
+            "describe": describe,
+            "error_bounds": {
+                # Erro padrão relativo das contagens de distintos estimadas
+                "nunique_relative": hyperloglog_relative_error(),
+                # Erro máximo de posto dos quartis (95% de confiança)
+                "quantile_rank": quantile_rank_error,
+            },
+        }
+    return {"describe": df.describe() if df.shape[1] else pd.DataFrame()}
+
+
+def iter_profile_steps(df: pd.DataFrame, approximate: bool = False):
+    """Calcula o perfil em etapas, das métricas mais baratas às mais caras.
+
+    Cada etapa produz um dicionário parcial; a união de todos forma o perfil completo.
+    """
+    yield {
+        "n_rows": len(df),
+        "n_cols": df.shape[1],
+        "columns": df.columns.tolist(),
+        "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+        "numeric_columns": df.select_dtypes(include='number').columns.tolist(),
+        "categorical_columns": df.select_dtypes(include=['object', 'category', 'string']).columns.tolist(),
+        "approximate": approximate,
+        "error_bounds": {"nunique_relative": hyperloglog_relative_error()} if approximate else {},
+    }
+
+    missing = df.isna().sum()
+    yield {"missing_values": {col: int(v) for col, v in missing.items()}, "missing_total": int(missing.sum())}
+
+    yield {"memory_bytes": int(df.memory_usage(deep=True).sum())}
+
+    buffer = io.StringIO()
+    df.info(buf=buffer)
+    yield {"info_string": buffer.getvalue()}
+
+    yield _nunique_step(df, approximate)
+    yield _describe_step(df, approximate)
+    yield {"duplicated_rows": approx_duplicated_rows(df) if approximate else int(df.duplicated().sum())}
+
+
+def compute_dataset_profile(df: pd.DataFrame, approximate: bool = False) -> dict:
+    """Calcula o perfil completo do DataFrame com operações vetorizadas."""
+    profile = {}
+    for step in iter_profile_steps(df, approximate):
+        profile.update(step)
+    return profile
+
+
+def _profile_key(df: pd.DataFrame, approx_min_rows: int) -> tuple:
+    return get_dataset_fingerprint(df), len(df) >= approx_min_rows
+
+
+def _remember_profile(key: tuple, profile: dict):
+    with _lock:
+        _profiles[key] = profile
+        _profiles.move_to_end(key)
+        if len(_profiles) > MAX_CACHED_PROFILES:
+            _profiles.popitem(last=False)
+
+
+def _cached_profile(key: tuple) -> dict | None:
+    with _lock:
+        if key in _profiles:
+            _profiles.move_to_end(key)
+            return _profiles[key]
+    return None
+
+
+def get_dataset_profile(df: pd.DataFrame, approx_min_rows: int = DEFAULT_APPROX_PROFILE_MIN_ROWS) -> dict:
+    """Retorna o perfil do DataFrame, calculando-o apenas na primeira chamada por fingerprint."""
+    key = _profile_key(df, approx_min_rows)
+    profile = _cached_profile(key)
+    if profile is not None:
+        return profile
+
+    with _lock:
+        job = _jobs.get(key)
+    if job is not None:
+        # Já existe um cálculo em segundo plano para este dataset: aguarda em vez de repetir
+        return job.future.result()
+
+    profile = compute_dataset_profile(df, approximate=key[1])
+    profile["fingerprint"] = key[0]
+    _remember_profile(key, profile)
+    return profile
+
+
+class ProfileJob:
+    """Cálculo do perfil em segundo plano; `progress` é preenchido à medida que cada etapa termina."""
+
+    def __init__(self, fingerprint: str):
+        self.progress = {"fingerprint": fingerprint}
+        self.future = None
+        self.started_at = time.perf_counter()
+        self.elapsed_s = None
+
+    @property
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    @property
+    def error(self):
+        return self.future.exception() if self.done else None
+
+
+def _run_profile_job(df: pd.DataFrame, key: tuple, job: ProfileJob) -> dict:
+    try:
+        for step in iter_profile_steps(df, approximate=key[1]):
+            job.progress.update(step)
+        profile = dict(job.progress)
+        _remember_profile(key, profile)
+        return profile
+    except Exception as e:
+        print(f"Erro ao calcular o perfil do dataset em segundo plano: {e}")
+        raise
+    finally:
+        job.elapsed_s = time.perf_counter() - job.started_at
+        with _lock:
+            _jobs.pop(key, None)
+
+
+def start_profile_job(df: pd.DataFrame, approx_min_rows: int = DEFAULT_APPROX_PROFILE_MIN_ROWS) -> ProfileJob:
+    """Inicia (ou reaproveita) o cálculo do perfil em uma thread de fundo e retorna o job."""
+    key = _profile_key(df, approx_min_rows)
+    with _lock:
+        if key in _jobs:
+            return _jobs[key]
+        job = ProfileJob(key[0])
+        profile = _profiles.get(key)
+        if profile is not None:
+            job.progress = profile
+            job.future = Future()
+            job.future.set_result(profile)
+            job.elapsed_s = 0.0
+            return job
+        # O future existe antes de o job ficar visível em `_jobs`; como o job só sai de
+        # `_jobs` sob o `_lock`, ele não é removido antes de ser registrado
+        job.future = _executor.submit(_run_profile_job, df, key, job)
+        _jobs[key] = job
+    return job
@@ -0,0 +1,256 @@
+"""
+Armazenamento colunar em disco para CSVs grandes demais para ficarem inteiros na memória.
+
+O upload é lido em blocos de linhas; cada bloco é gravado como um arquivo Parquet e
+as métricas de `get_dataset_info` são acumuladas à medida que os blocos chegam.
+Os blocos ficam numa entrada do cache de datasets (`utils/dataset_cache.py`), então um
+novo upload do mesmo arquivo reaproveita o store sem ler o CSV de novo.
+"""
+import hashlib
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.data_loader import compact_dtypes, iter_file_chunks, sniff_dialect_stream
+from utils.dataset_cache import cache_key, entry_path, read_cache_meta, touch_cache_entry, write_cache_meta, evict_cache
+from utils.fingerprint import register_dataset_fingerprint
+
+SAMPLE_FILE = 'sample.parquet'
+CHUNK_ROWS = 250_000
+SAMPLE_ROWS = 200_000
+
+
+def _unify_schema(schemas: list) -> pa.Schema:
+    """Une os schemas dos blocos: numéricos divergentes viram float64, demais conflitos viram string."""
+    fields = []
+    for field in schemas[0]:
+        types = {schema.field(field.name).type for schema in schemas}
+        types.discard(pa.null())
+        if not types:
+            unified = pa.null()
+        elif len(types) == 1:
+            unified = types.pop()
+        elif all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+            unified = pa.float64()
+        else:
+            unified = pa.string()
+        fields.append(pa.field(field.name, unified))
+    return pa.schema(fields)
+
+
+def _format_info_string(n_rows: int, columns: list, non_null: dict, dtypes: dict) -> str:
+    """Reproduz o resumo de `DataFrame.info()` a partir das contagens acumuladas."""
+    lines = [
+        "<class 'pandas.core.frame.DataFrame'>",
+        f"RangeIndex: {n_rows} entries, 0 to {max(n_rows - 1, 0)}",
+        f"Data columns (total {len(columns)} columns):",
+        " #   Column  Non-Null Count  Dtype",
+    ]
+    for i, col in enumerate(columns):
+        lines.append(f" {i:<3} {col}  {non_null[col]} non-null  {dtypes[col]}")
+    return "\n".join(lines) + "\n"
+
+
+class ParquetDatasetStore:
+    """Dataset particionado em arquivos Parquet, lido sob demanda por colunas."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def touch(self):
+        """Renova o acesso à entrada do cache, para que não seja removida enquanto a sessão a usa."""
+        touch_cache_entry(os.path.basename(self.path))
+
+    @property
+    def parts(self) -> list:
+        return sorted(
+            os.path.join(self.path, name) for name in os.listdir(self.path)
+            if name.startswith('part-') and name.endswith('.parquet')
+        )
+
+    @property
+    def schema(self) -> pa.Schema:
+        return _unify_schema([pq.read_schema(part) for part in self.parts])
+
+    def load(self, columns: list | None = None, max_rows: int | None = None) -> pd.DataFrame:
+        """Carrega as colunas pedidas (ou todas), opcionalmente limitando o número de linhas."""
+        schema = self.schema
+        if columns is not None:
+            schema = pa.schema([schema.field(col) for col in columns])
+        tables, n_rows = [], 0
+        for part in self.parts:
+            table = pq.read_table(part, columns=columns).cast(schema)
+            tables.append(table)
+            n_rows += table.num_rows
+            if max_rows is not None and n_rows >= max_rows:
+                break
+        table = pa.concat_tables(tables)
+        if max_rows is not None:
+            table = table.slice(0, max_rows)
+        return table.to_pandas()
+
+
+def load_csv_chunked(uploaded_file, dataset_name: str, max_size_mb=4096,
+                     chunk_rows=CHUNK_ROWS, sample_rows=SAMPLE_ROWS, compact=False):
+    """Lê o CSV em blocos, grava um dataset Parquet em disco e calcula os metadados incrementalmente.
+
+    Retorna o store, uma amostra aleatória uniforme de até `sample_rows` linhas (usada pelos
+    agentes e gráficos no lugar do DataFrame completo), o hash do arquivo e o `df_info`.
+    Com `compact=True`, os tipos da amostra mantida em memória são compactados.
+
+    O arquivo é lido em blocos (`seek`/`read`), nunca inteiro na memória, e o store é montado
+    num diretório temporário renomeado para a entrada do cache só quando está completo.
+    """
+    if uploaded_file.size > max_size_mb * 1024 * 1024:
+        raise ValueError(f"Arquivo excede o tamanho máximo de {max_size_mb} MB.")
+
+    timings = {}
+
+    start = time.perf_counter()
+    digest = hashlib.md5()
+    for block in iter_file_chunks(uploaded_file):
+        digest.update(block)
+    file_hash = digest.hexdigest()
+    timings["hash_s"] = time.perf_counter() - start
+
+    key = cache_key(file_hash, mode='chunked', compact=compact)
+    store_path = entry_path(key)
+    meta = read_cache_meta(key)
+    sample_path = os.path.join(store_path, SAMPLE_FILE)
+    if meta is not None and os.path.exists(sample_path):
+        df_info = {**meta["df_info"], "name": dataset_name, "shape": tuple(meta["df_info"]["shape"])}
+        df_info["load_report"] = {**df_info["load_report"], "timings": timings,
+                                  "total_s": sum(timings.values()), "cache_hit": True}
+        print(f"Dataset em blocos reaproveitado do cache ({key})")
+        sample = pd.read_parquet(sample_path)
+        register_dataset_fingerprint(sample, f"{key}-sample")
+        return ParquetDatasetStore(store_path), sample, file_hash, df_info
+
+    # Só um arquivo novo paga a detecção do dialeto (que valida o encoding do arquivo inteiro)
+    start = time.perf_counter()
+    encoding, sep = sniff_dialect_stream(uploaded_file)
+    timings["sniff_s"] = time.perf_counter() - start
+
+    # Montado à parte: uploads simultâneos do mesmo arquivo não escrevem no mesmo diretório
+    build_path = os.path.join(os.path.dirname(store_path), f".{key}.{uuid.uuid4().hex}")
+    os.makedirs(build_path)
+    try:
+        return _build_chunked_store(uploaded_file, dataset_name, file_hash, key, build_path, encoding, sep,
+                                    timings, chunk_rows, sample_rows, compact)
+    finally:
+        shutil.rmtree(build_path, ignore_errors=True)
+
+
+def _build_chunked_store(uploaded_file, dataset_name: str, file_hash: str, key: str, build_path: str,
+                         encoding: str, sep: str, timings: dict, chunk_rows: int, sample_rows: int, compact: bool):
+    """Lê os blocos para `build_path` e publica o store na entrada `key` do cache."""
+    store_path = entry_path(key)
+    start = time.perf_counter()
+    rng = np.random.default_rng()
+    n_rows = 0
+    columns, head = None, None
+    missing = None
+    row_hashes = []
+    sample = None
+    try:
+        uploaded_file.seek(0)
+        reader = pd.read_csv(uploaded_file, sep=sep, encoding=encoding, chunksize=chunk_rows)
+        for i, chunk in enumerate(reader):
+            chunk.index = pd.RangeIndex(n_rows, n_rows + len(chunk))
+            if columns is None:
+                columns = chunk.columns.tolist()
+                head = chunk.head()
+                missing = pd.Series(0, index=chunk.columns, dtype='int64')
+
+            pq.write_table(
+                pa.Table.from_pandas(chunk, preserve_index=False),
+                os.path.join(build_path, f"part-{i:05d}.parquet")
+            )
+
+            missing += chunk.isna().sum()
+            # Normaliza os tipos antes do hash para que 2 e 2.0 (ou colunas totalmente nulas)
+            # em blocos diferentes gerem a mesma impressão digital
+            numeric_cols = set(chunk.select_dtypes(include='number').columns)
+            hashable = chunk.astype({
+                col: 'float64' if col in numeric_cols and chunk[col].notna().any() else object
+                for col in chunk.columns
+            })
+            row_hashes.append(pd.util.hash_pandas_object(hashable, index=False).to_numpy())
+
+            # Amostragem bottom-k: mantém as linhas com as menores chaves aleatórias
+            keyed = chunk.assign(_sample_key=rng.random(len(chunk)))
+            sample = keyed if sample is None else pd.concat([sample, keyed])
+            if len(sample) > sample_rows:
+                sample = sample.nsmallest(sample_rows, '_sample_key')
+            n_rows += len(chunk)
+    except Exception as e:
+        raise ValueError(f"Não foi possível parsear o arquivo CSV (encoding={encoding}, separador={sep!r}): {e}") from e
+    timings["parse_s"] = time.perf_counter() - start
+
+    if columns is None:
+        raise ValueError("O arquivo CSV não contém dados.")
+
+    build = ParquetDatasetStore(build_path)
+    schema = build.schema
+    dtypes = {col: str(pa.array([], type=schema.field(col).type).to_pandas().dtype) for col in columns}
+    non_null = {col: n_rows - int(missing[col]) for col in columns}
+    all_hashes = np.concatenate(row_hashes)
+    duplicated_rows = int(len(all_hashes) - len(np.unique(all_hashes)))
+    sample = sample.drop(columns='_sample_key').sort_index()
+    memory_report = None
+    if compact:
+        start = time.perf_counter()
+        sample, memory_report = compact_dtypes(sample)
+        timings["compact_s"] = time.perf_counter() - start
+
+    load_report = {
+        "encoding": encoding,
+        "separator": sep,
+        "engine": 'c-chunked',
+        "size_bytes": uploaded_file.size,
+        "timings": timings,
+        "total_s": sum(timings.values()),
+        "memory": memory_report,
+        "cache_hit": False,
+        "storage": {
+            "mode": "parquet_chunks",
+            "path": store_path,
+            "chunks": len(build.parts),
+            "sample_rows": len(sample),
+        },
+    }
+    df_info = {
+        "name": dataset_name,
+        "shape": (n_rows, len(columns)),
+        "columns": columns,
+        "dtypes": dtypes,
+        "missing_values": {col: int(missing[col]) for col in columns},
+        "duplicated_rows": duplicated_rows,
+        "info_string": _format_info_string(n_rows, columns, non_null, dtypes),
+        "head": head.to_json(orient='split'),
+        "load_report": load_report,
+        "fingerprint": key,
+    }
+    sample.to_parquet(os.path.join(build_path, SAMPLE_FILE))
+    write_cache_meta(key, {"df_info": df_info}, path=build_path)
+
+    try:
+        os.replace(build_path, store_path)
+    except OSError:
+        if read_cache_meta(key) is not None:
+            # Outro upload do mesmo arquivo terminou primeiro: a entrada dele é equivalente
+            print(f"Store {key} já gravado por outra sessão; descartando a cópia local")
+        else:
+            # Entrada incompleta (sem meta.json) de uma ingestão anterior
+            shutil.rmtree(store_path, ignore_errors=True)
+            os.replace(build_path, store_path)
+    register_dataset_fingerprint(sample, f"{key}-sample")
+    evict_cache(keep=key)
+    print(f"CSV carregado em blocos: {n_rows} linhas, {load_report['storage']['chunks']} blocos em {store_path}")
+    return ParquetDatasetStore(store_path), sample, file_hash, df_info
@@ -0,0 +1,85 @@
+"""
+Serialização compacta de figuras Plotly para persistência (histórico no Supabase).
+
+Os arrays numéricos da figura viram arrays tipados em base64 (`{"dtype", "bdata"}`, o mesmo
+formato do JSON do Plotly), o JSON resultante é comprimido com zlib e o conteúdo é endereçado
+pelo seu hash: figuras idênticas têm o mesmo `digest` e são gravadas uma única vez. A figura
+volta a ser um `go.Figure` completo com `decode_figure`.
+"""
+import base64
+import hashlib
+import json
+import zlib
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.utils import PlotlyJSONEncoder
+
+FIGURE_CODEC = "plotly-zlib-v1"
+COMPRESSION_LEVEL = 6
+MIN_TYPED_ARRAY_LEN = 8  # listas curtas ficam como JSON comum
+
+
+def _typed_array(array: np.ndarray) -> dict:
+    array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+    encoded = {"dtype": array.dtype.str.lstrip("<|"), "bdata": base64.b64encode(array.tobytes()).decode("ascii")}
+    if array.ndim > 1:
+        encoded["shape"] = ",".join(str(n) for n in array.shape)
+    return encoded
+
+
+def encode_typed_arrays(value):
+    """Substitui arrays e listas numéricas por arrays tipados em base64, recursivamente."""
+    if isinstance(value, dict):
+        return {k: encode_typed_arrays(v) for k, v in value.items()}
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in "iuf" and value.size:
+            return _typed_array(value)
+        return value
+    if isinstance(value, (list, tuple)):
+        if len(value) >= MIN_TYPED_ARRAY_LEN and all(
+            isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, (bool, np.bool_)) for v in value
+        ):
+            return _typed_array(np.asarray(value))
+        return [encode_typed_arrays(v) for v in value]
+    return value
+
+
+def decode_typed_arrays(value):
+    """Converte os arrays tipados do JSON do Plotly (`{"dtype", "bdata"}`) de volta em arrays NumPy."""
+    if isinstance(value, dict):
+        if "bdata" in value and "dtype" in value:
+            array = np.frombuffer(base64.b64decode(value["bdata"]), dtype=np.dtype(value["dtype"]).newbyteorder("<"))
+            if "shape" in value:
+                array = array.reshape(tuple(int(n) for n in str(value["shape"]).split(",")))
+            return array
+        return {k: decode_typed_arrays(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode_typed_arrays(v) for v in value]
+    return value
+
+
+def encode_figure(fig: go.Figure) -> tuple[str, str]:
+    """(digest, payload) da figura: hash do conteúdo e JSON compacto comprimido, em base64."""
+    spec = encode_typed_arrays(fig.to_plotly_json())
+    raw = json.dumps(spec, cls=PlotlyJSONEncoder, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+    payload = base64.b64encode(zlib.compress(raw, COMPRESSION_LEVEL)).decode("ascii")
+    return digest, payload
+
+
+def decode_figure(payload: str) -> go.Figure:
+    raw = zlib.decompress(base64.b64decode(payload))
+    return go.Figure(decode_typed_arrays(json.loads(raw)))
+
+
+def figure_reference(digest: str, payload: str | None = None) -> dict:
+    """Valor de `chart_json` que aponta para a figura (com o payload embutido, se informado)."""
+    reference = {"codec": FIGURE_CODEC, "digest": digest}
+    if payload is not None:
+        reference["payload"] = payload
+    return reference
+
+
+def is_figure_reference(value) -> bool:
+    return isinstance(value, dict) and value.get("codec") == FIGURE_CODEC and bool(value.get("digest"))
@@ -0,0 +1,167 @@
+"""
+Redução de figuras Plotly geradas sobre datasets grandes.
+
+Aplicada às figuras do código gerado (no worker do sandbox, antes de a figura voltar ao app),
+para que o payload enviado ao navegador, ao cache e ao Supabase fique limitado:
+
+- scatter com muitos pontos vira `Scattergl` (WebGL);
+- linhas longas são reduzidas com LTTB (Largest-Triangle-Three-Buckets), que preserva a forma;
+- nuvens de pontos enormes viram densidade 2D pré-agregada (uma única nuvem) ou amostra
+  aleatória (várias nuvens, para manter as cores/categorias).
+
+A descrição do que foi reduzido fica em `fig.layout.meta["reduction"]`, exibida pela interface.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+WEBGL_MIN_POINTS = 10_000
+LINE_MAX_POINTS = 5_000
+LINE_TARGET_POINTS = 2_000
+SCATTER_MAX_POINTS = 100_000
+DENSITY_MIN_POINTS = 200_000
+DENSITY_BINS = 200
+RANDOM_SEED = 0
+
+SCATTER_TYPES = ("scatter", "scattergl")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, target: int) -> np.ndarray:
+    """Índices dos `target` pontos escolhidos pelo LTTB (x numérico e ordenado)."""
+    n = len(x)
+    if target >= n or target < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, target - 1).astype(np.int64)
+    selected = np.empty(target, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(target - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        # Ponto do bucket que forma o maior triângulo com o escolhido anterior e a média do próximo
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.nanargmax(areas)) if len(areas) and not np.isnan(areas).all() else start
+        selected[i + 1] = previous
+    return selected
+
+
+def _numeric(values) -> np.ndarray | None:
+    """Valores como float64 (datas viram inteiros), ou None se não forem numéricos."""
+    if values is None:
+        return None
+    array = np.asarray(values)
+    if np.issubdtype(array.dtype, np.datetime64):
+        return array.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    if np.issubdtype(array.dtype, np.number) or array.dtype == bool:
+        return array.astype(np.float64)
+    return None
+
+
+def _take(value, idx: np.ndarray, n: int):
+    """Aplica a seleção `idx` a todos os arrays por ponto (tamanho `n`) do trace, recursivamente."""
+    if isinstance(value, dict):
+        return {k: _take(v, idx, n) for k, v in value.items()}
+    if isinstance(value, np.ndarray) and value.ndim >= 1 and len(value) == n:
+        return value[idx]
+    if isinstance(value, (list, tuple)) and len(value) == n:
+        return [value[i] for i in idx]
+    return value
+
+
+def _trace_length(trace: dict) -> int:
+    for key in ("x", "y"):
+        if trace.get(key) is not None:
+            return len(trace[key])
+    return 0
+
+
+def _mode(trace: dict, n: int) -> str:
+    """Modo efetivo do trace, com o padrão do Plotly quando `mode` não é informado."""
+    return trace.get("mode") or ("lines+markers" if n < 20 else "lines")
+
+
+def _bin_centers(edges: np.ndarray, values) -> np.ndarray:
+    """Centros das faixas do histograma, de volta a datas se o eixo original for de datas."""
+    centers = (edges[:-1] + edges[1:]) / 2
+    if np.issubdtype(np.asarray(values).dtype, np.datetime64):
+        return centers.astype(np.int64).astype('datetime64[ns]')
+    return centers
+
+
+def _density_trace(trace: dict) -> dict | None:
+    x, y = _numeric(trace.get("x")), _numeric(trace.get("y"))
+    if x is None or y is None:
+        return None
+    valid = ~(np.isnan(x) | np.isnan(y))
+    counts, x_edges, y_edges = np.histogram2d(x[valid], y[valid], bins=DENSITY_BINS)
+    z = counts.T
+    z[z == 0] = np.nan  # células vazias transparentes
+    return {
+        "type": "heatmap",
+        "x": _bin_centers(x_edges, trace.get("x")),
+        "y": _bin_centers(y_edges, trace.get("y")),
+        "z": z,
+        "name": trace.get("name") or "densidade",
+        "colorscale": "Viridis",
+        "colorbar": {"title": {"text": "pontos"}},
+        "hovertemplate": "x=%{x}<br>y=%{y}<br>pontos=%{z}<extra></extra>",
+    }
+
+
+def reduce_figure(fig: go.Figure) -> tuple[go.Figure, list]:
+    """Figura com os traces grandes reduzidos e a lista (legível) das reduções aplicadas."""
+    traces = [trace.to_plotly_json() for trace in fig.data]
+    clouds = [
+        t for t in traces
+        if t.get("type") in SCATTER_TYPES and "lines" not in _mode(t, _trace_length(t))
+    ]
+    rng = np.random.default_rng(RANDOM_SEED)
+    reduced, notes = [], []
+    for trace in traces:
+        n = _trace_length(trace)
+        label = trace.get("name") or trace.get("type")
+        if trace.get("type") not in SCATTER_TYPES or n < WEBGL_MIN_POINTS:
+            reduced.append(trace)
+            continue
+
+        mode = _mode(trace, n)
+        if "lines" in mode and n > LINE_MAX_POINTS:
+            x = _numeric(trace.get("x")) if trace.get("x") is not None else np.arange(n, dtype=np.float64)
+            y = _numeric(trace.get("y"))
+            if x is not None and y is not None and np.all(np.diff(x) >= 0):
+                idx = lttb(x, np.nan_to_num(y), LINE_TARGET_POINTS)
+                trace = _take(trace, idx, n)
+                notes.append(f"linha '{label}': {n:,} → {len(idx):,} pontos (LTTB)")
+        elif "lines" not in mode and n > SCATTER_MAX_POINTS:
+            # Uma única nuvem enorme vira densidade; sem eixos numéricos (ex.: categorias), amostra
+            density = _density_trace(trace) if n > DENSITY_MIN_POINTS and len(clouds) == 1 else None
+            if density is not None:
+                reduced.append(density)
+                notes.append(f"dispersão '{label}': {n:,} pontos → densidade 2D ({DENSITY_BINS}×{DENSITY_BINS})")
+                continue
+            idx = np.sort(rng.choice(n, SCATTER_MAX_POINTS, replace=False))
+            trace = _take(trace, idx, n)
+            notes.append(f"dispersão '{label}': amostra aleatória de {SCATTER_MAX_POINTS:,} de {n:,} pontos")
+
+        if trace.get("type") == "scatter" and not trace.get("stackgroup") and not trace.get("fill"):
+            # Propriedades sem equivalente no WebGL (ex.: `orientation`) são descartadas
+            props = {k: v for k, v in trace.items() if k != "type"}
+            trace = go.Scattergl(props, skip_invalid=True).to_plotly_json()
+            notes.append(f"'{label}': renderização WebGL")
+        reduced.append(trace)
+
+    if not notes:
+        return fig, []
+    layout = fig.layout.to_plotly_json()
+    meta = layout.get("meta")
+    layout["meta"] = {**meta, "reduction": notes} if isinstance(meta, dict) else {"reduction": notes}
+    return go.Figure(data=reduced, layout=layout), notes
+
+
+def reduction_notes(fig) -> list:
+    """Reduções registradas na figura por `reduce_figure` (lista vazia se não houve)."""
+    meta = getattr(fig.layout, "meta", None) if fig is not None else None
+    return list(meta.get("reduction", [])) if isinstance(meta, dict) else []
@@ -0,0 +1,52 @@
+"""
+Impressão digital (fingerprint) de conteúdo de DataFrames.
+
+O fingerprint identifica um dataset pelo conteúdo e é usado como chave pelos caches de
+perfil, prompts e gráficos. Ele é calculado uma única vez por objeto DataFrame; quando o
+conteúdo já é conhecido (ex.: hash do arquivo enviado), o loader registra o valor direto.
+"""
+import hashlib
+import weakref
+
+import pandas as pd
+
+HASH_CHUNK_ROWS = 500_000
+
+# id(df) -> (weakref do df, (shape, colunas), fingerprint)
+_fingerprints = {}
+
+
+def _structure(df: pd.DataFrame) -> tuple:
+    return df.shape, tuple(map(str, df.columns)), tuple(map(str, df.dtypes))
+
+
+def _forget(key):
+    _fingerprints.pop(key, None)
+
+
+def register_dataset_fingerprint(df: pd.DataFrame, fingerprint: str):
+    """Associa um fingerprint já conhecido ao DataFrame, evitando recalculá-lo."""
+    key = id(df)
+    _fingerprints[key] = (weakref.ref(df, lambda _, key=key: _forget(key)), _structure(df), fingerprint)
+
+
+def compute_dataset_fingerprint(df: pd.DataFrame) -> str:
+    """Calcula o hash do conteúdo em blocos de linhas com `pd.util.hash_pandas_object`."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(_structure(df)).encode())
+    for start in range(0, len(df), HASH_CHUNK_ROWS):
+        chunk = df.iloc[start:start + HASH_CHUNK_ROWS]
+        digest.update(pd.util.hash_pandas_object(chunk, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def get_dataset_fingerprint(df: pd.DataFrame) -> str:
+    """Retorna o fingerprint memoizado do DataFrame, recalculando se a estrutura mudou."""
+    entry = _fingerprints.get(id(df))
+    if entry is not None:
+        ref, structure, fingerprint = entry
+        if ref() is df and structure == _structure(df):
+            return fingerprint
+    fingerprint = compute_dataset_fingerprint(df)
+    register_dataset_fingerprint(df, fingerprint)
+    return fingerprint
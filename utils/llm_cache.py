@@ -0,0 +1,128 @@
+"""
+Cache das respostas dos agentes (LLM), para não gastar a cota do Gemini com perguntas repetidas.
+
+Duas camadas: um LRU em memória na frente de um banco SQLite em `.cache/llm_responses.sqlite3`,
+que sobrevive a reinícios do app. Cada resposta expira após um TTL e o banco mantém no máximo
+`MAX_DISK_ENTRIES` respostas, descartando as acessadas há mais tempo.
+"""
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DB = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.cache', 'llm_responses.sqlite3')
+MAX_MEMORY_ENTRIES = 256
+MAX_DISK_ENTRIES = 5_000
+DEFAULT_TTL_S = 24 * 60 * 60  # 1 dia
+
+_memory = OrderedDict()  # chave -> (resposta, expira_em)
+_lock = threading.Lock()
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "stores": 0}
+
+
+@contextlib.contextmanager
+def _connect():
+    """Conexão com o banco numa transação (commit ao sair sem erro), sempre fechada no fim."""
+    os.makedirs(os.path.dirname(CACHE_DB), exist_ok=True)
+    conn = sqlite3.connect(CACHE_DB, timeout=5)
+    try:
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, agent TEXT, response TEXT,"
+                " created_at REAL, expires_at REAL, last_access REAL)"
+            )
+            yield conn
+    finally:
+        conn.close()
+
+
+def _remember(key: str, response: str, expires_at: float):
+    _memory[key] = (response, expires_at)
+    _memory.move_to_end(key)
+    if len(_memory) > MAX_MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def get_cached_response(key: str) -> str | None:
+    """Retorna a resposta válida da chave (memória, depois disco) ou None."""
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                _memory.move_to_end(key)
+                _stats["memory_hits"] += 1
+                return entry[0]
+            del _memory[key]
+
+    try:
+        with _connect() as conn:
+            row = conn.execute("SELECT response, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] <= now:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            elif row is not None:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+    except sqlite3.Error as e:
+        print(f"Cache de respostas do LLM indisponível: {e}")
+        row = None
+
+    with _lock:
+        if row is None:
+            _stats["misses"] += 1
+            return None
+        if row[1] <= now:
+            _stats["expired"] += 1
+            _stats["misses"] += 1
+            return None
+        _remember(key, row[0], row[1])
+        _stats["disk_hits"] += 1
+        return row[0]
+
+
+def store_cached_response(key: str, agent_name: str, response: str, ttl_s: float = DEFAULT_TTL_S):
+    """Grava a resposta nas duas camadas e aplica o limite de entradas do banco."""
+    now = time.time()
+    expires_at = now + ttl_s
+    with _lock:
+        _remember(key, response, expires_at)
+        _stats["stores"] += 1
+    try:
+        with _connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent_name, response, now, expires_at, now)
+            )
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM responses WHERE key NOT IN"
+                " (SELECT key FROM responses ORDER BY last_access DESC LIMIT ?)",
+                (MAX_DISK_ENTRIES,)
+            )
+    except sqlite3.Error as e:
+        # O cache é uma otimização: falhas de escrita não devem interromper o atendimento
+        print(f"Não foi possível gravar a resposta do LLM no cache: {e}")
+
+
+def clear_llm_cache():
+    """Esvazia as duas camadas do cache."""
+    with _lock:
+        _memory.clear()
+    try:
+        with _connect() as conn:
+            conn.execute("DELETE FROM responses")
+    except sqlite3.Error as e:
+        print(f"Não foi possível limpar o cache de respostas do LLM: {e}")
+
+
+def get_llm_cache_stats() -> dict:
+    """Contadores de acertos/falhas desde o início do processo."""
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_entries"] = len(_memory)
+    hits = stats["memory_hits"] + stats["disk_hits"]
+    total = hits + stats["misses"]
+    stats["hit_rate"] = hits / total if total else 0.0
+    return stats
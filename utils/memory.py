@@ -1,5 +1,15 @@
+import threading
+
 from supabase import create_client, Client
 
+from utils.figure_codec import decode_figure, encode_figure, figure_reference, is_figure_reference
+
+FIGURES_TABLE = "figures"  # digest (texto, chave primária) e payload (texto)
+
+# Digests já gravados neste processo: figuras repetidas não voltam ao banco
+_stored_figures = set()
+_stored_figures_lock = threading.Lock()
+
 
 class SupabaseMemory:
     def __init__(self, url: str, key: str):
@@ -89,6 +99,39 @@ class SupabaseMemory:
             print(f"Erro ao salvar código gerado no banco: {e}")
             # Não relançar a exceção para não interromper o usuário
 
+    def store_figure(self, fig) -> dict:
+        """Grava a figura compactada uma única vez por conteúdo e retorna a referência para `chart_json`.
+
+        Se a tabela de figuras não existir, o payload vai embutido na própria referência.
+        """
+        digest, payload = encode_figure(fig)
+        with _stored_figures_lock:
+            if digest in _stored_figures:
+                return figure_reference(digest)
+        try:
+            self.client.table(FIGURES_TABLE).upsert(
+                {"digest": digest, "payload": payload}, on_conflict="digest", ignore_duplicates=True
+            ).execute()
+        except Exception as e:
+            print(f"Não foi possível gravar na tabela '{FIGURES_TABLE}', embutindo a figura na conversa: {e}")
+            return figure_reference(digest, payload)
+        with _stored_figures_lock:
+            _stored_figures.add(digest)
+        return figure_reference(digest)
+
+    def load_figure(self, chart_json):
+        """Figura salva por `store_figure`, ou None se `chart_json` não for uma referência válida."""
+        if not is_figure_reference(chart_json):
+            return None  # conversas antigas guardavam o JSON truncado, que não é recuperável
+        payload = chart_json.get("payload")
+        if payload is None:
+            rows = self.client.table(FIGURES_TABLE).select("payload").eq(
+                "digest", chart_json["digest"]).limit(1).execute().data
+            if not rows:
+                return None
+            payload = rows[0]["payload"]
+        return decode_figure(payload)
+
     def get_session_history(self, session_id: str) -> dict:
         conversations = self.client.table("conversations").select("*").eq("session_id", session_id).order(
             "created_at").execute().data
@@ -0,0 +1,225 @@
+"""
+Limitador de requisições ao Gemini, compartilhado por todas as sessões do processo.
+
+Cada (chave de API, modelo) tem um token bucket com o limite por minuto (RPM) e um contador
+diário (RPD). Antes de cada chamada, `call_with_rate_limit` espera por uma ficha no bucket; se
+a API ainda assim responder com 429/cota esgotada, a chamada é repetida com backoff exponencial
+e jitter. Chamadas idênticas simultâneas (mesma chave de cache de resposta, de sessões
+diferentes) são coalescidas por `coalesce`: só uma vai à API e as demais recebem o mesmo
+resultado.
+"""
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+DEFAULT_RPM = 15    # limites do plano gratuito do Gemini 2.0 Flash
+DEFAULT_RPD = 200
+MAX_WAIT_S = 60     # espera máxima por uma ficha antes de desistir
+MAX_RETRIES = 4
+BACKOFF_BASE_S = 2.0
+BACKOFF_MAX_S = 30.0
+
+QUOTA_MESSAGE = (
+    "Parece que excedemos o limite de requisições gratuitas da API do Gemini (quota).\n\n"
+    "- Limite configurado: {rpm} requisições por minuto e {rpd} por dia\n"
+    "- Requisições restantes hoje: {remaining_day}\n\n"
+    "O que você pode fazer:\n"
+    "1. Aguarde cerca de 1 minuto antes de tentar novamente\n"
+    "2. Se precisar de mais requisições, considere:\n"
+    "   - Verificar seu plano e limites de cota\n"
+    "   - Acessar: https://ai.google.dev/gemini-api/docs/rate-limits"
+)
+
+_limits = {"rpm": DEFAULT_RPM, "rpd": DEFAULT_RPD}
+_buckets = {}  # (api_key, model) -> _Bucket
+_lock = threading.Lock()
+_stats = {
+    "requests": 0, "throttled": 0, "retries": 0, "quota_errors": 0, "coalesced": 0,
+    "wait_total_s": 0.0, "wait_max_s": 0.0,
+}
+
+# Chamadas em andamento por chave, para coalescer requisições idênticas
+_in_flight = {}  # chave -> _Flight
+_in_flight_lock = threading.Lock()
+
+
+class QuotaExceededError(Exception):
+    """Cota do Gemini esgotada (limite local ou 429 persistente após as tentativas)."""
+
+
+def is_quota_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return isinstance(error, QuotaExceededError) or any(
+        marker in message for marker in ("429", "quota", "resource_exhausted", "resource exhausted", "rate limit")
+    )
+
+
+class _Bucket:
+    """Token bucket do limite por minuto e contador do limite diário (dia UTC)."""
+
+    def __init__(self, rpm: int, rpd: int):
+        self.rpm, self.rpd = rpm, rpd
+        self.tokens = float(rpm)
+        self.updated_at = time.monotonic()
+        self.day = datetime.now(timezone.utc).date()
+        self.used_today = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.rpm, self.tokens + (now - self.updated_at) * self.rpm / 60)
+        self.updated_at = now
+        today = datetime.now(timezone.utc).date()
+        if today != self.day:
+            self.day, self.used_today = today, 0
+
+    def try_acquire(self) -> float:
+        """Consome uma ficha e retorna 0, ou retorna quantos segundos faltam para a próxima."""
+        self._refill(time.monotonic())
+        if self.used_today >= self.rpd:
+            raise QuotaExceededError(QUOTA_MESSAGE.format(rpm=self.rpm, rpd=self.rpd, remaining_day=0))
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.used_today += 1
+            return 0.0
+        return (1 - self.tokens) * 60 / self.rpm
+
+    def penalize(self):
+        """Após um 429, esvazia o bucket: o limite real do provedor foi atingido antes do local."""
+        self.tokens = min(self.tokens, 0.0)
+
+
+def configure_rate_limits(rpm: int = DEFAULT_RPM, rpd: int = DEFAULT_RPD):
+    """Define os limites por minuto e por dia.
+
+    Chamada a cada rerun do Streamlit: os buckets (fichas e uso do dia) só são recriados se os
+    limites mudarem, senão a cota seria zerada a cada interação.
+    """
+    limits = {"rpm": max(1, int(rpm)), "rpd": max(1, int(rpd))}
+    with _lock:
+        if limits == _limits:
+            return
+        _limits.update(limits)
+        for bucket in _buckets.values():
+            bucket.rpm, bucket.rpd = limits["rpm"], limits["rpd"]
+            bucket.tokens = min(bucket.tokens, float(bucket.rpm))
+
+
+def _bucket(api_key: str, model: str) -> _Bucket:
+    key = (api_key, model)
+    if key not in _buckets:
+        _buckets[key] = _Bucket(_limits["rpm"], _limits["rpd"])
+    return _buckets[key]
+
+
+def acquire(api_key: str, model: str, max_wait_s: float = MAX_WAIT_S) -> float:
+    """Espera por uma ficha do bucket de (chave, modelo); retorna o tempo de espera em segundos."""
+    start = time.monotonic()
+    throttled = False
+    while True:
+        with _lock:
+            bucket = _bucket(api_key, model)
+            wait = bucket.try_acquire()
+        if not wait:
+            break
+        if time.monotonic() - start + wait > max_wait_s:
+            with _lock:
+                remaining = bucket.rpd - bucket.used_today
+            raise QuotaExceededError(QUOTA_MESSAGE.format(rpm=bucket.rpm, rpd=bucket.rpd, remaining_day=remaining))
+        throttled = True
+        time.sleep(wait)
+
+    waited = time.monotonic() - start
+    with _lock:
+        _stats["requests"] += 1
+        _stats["wait_total_s"] += waited
+        _stats["wait_max_s"] = max(_stats["wait_max_s"], waited)
+        if throttled:
+            _stats["throttled"] += 1
+    if throttled:
+        print(f"Limitador do Gemini: requisição aguardou {waited:.1f}s por cota")
+    return waited
+
+
+def call_with_rate_limit(api_key: str, model: str, call, retry=lambda: True):
+    """Executa `call()` respeitando o limite local e repetindo com backoff em erros de cota.
+
+    `retry()` diz se ainda é seguro repetir (por exemplo, se nada foi transmitido ao usuário).
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        acquire(api_key, model)
+        try:
+            return call()
+        except QuotaExceededError:
+            raise
+        except Exception as e:
+            if not is_quota_error(e):
+                raise
+            with _lock:
+                _stats["quota_errors"] += 1
+                bucket = _bucket(api_key, model)
+                bucket.penalize()
+            if attempt == MAX_RETRIES or not retry():
+                print(f"Erro de cota da API: {e}")
+                raise QuotaExceededError(QUOTA_MESSAGE.format(
+                    rpm=bucket.rpm, rpd=bucket.rpd, remaining_day=bucket.rpd - bucket.used_today
+                )) from e
+            # Backoff exponencial com jitter total, para que sessões não repitam em sincronia
+            delay = random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt))
+            with _lock:
+                _stats["retries"] += 1
+            print(f"Gemini retornou erro de cota; nova tentativa em {delay:.1f}s ({attempt + 1}/{MAX_RETRIES})")
+            time.sleep(delay)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def coalesce(key: str, call):
+    """Executa `call()` uma única vez por chave entre chamadas simultâneas; as demais esperam o resultado.
+
+    Retorna (resultado, compartilhado), onde `compartilhado` indica que o resultado veio de outra chamada.
+    """
+    with _in_flight_lock:
+        flight = _in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _in_flight[key] = _Flight()
+    if not leader:
+        with _lock:
+            _stats["coalesced"] += 1
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+    try:
+        flight.result = call()
+        return flight.result, False
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+        flight.done.set()
+
+
+def get_rate_limit_stats() -> dict:
+    """Contadores do limitador e cota restante por (modelo) nas chaves em uso."""
+    with _lock:
+        quota = {}
+        for (_, model), bucket in _buckets.items():
+            bucket._refill(time.monotonic())
+            quota[model] = {
+                "remaining_minute": int(bucket.tokens),
+                "remaining_day": bucket.rpd - bucket.used_today,
+            }
+        stats = dict(_stats)
+    stats["avg_wait_s"] = stats["wait_total_s"] / stats["requests"] if stats["requests"] else 0.0
+    stats["quota"] = quota
+    stats["limits"] = dict(_limits)
+    return stats
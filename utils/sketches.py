@@ -0,0 +1,107 @@
+"""
+Estimativas aproximadas (com limites de erro) para perfis de datasets muito grandes.
+
+- Contagem de distintos: HyperLogLog vetorizado sobre os hashes de `hash_pandas_object`.
+- Quantis: amostra aleatória uniforme, com limite de erro de posto pela desigualdade DKW.
+- Linhas duplicadas: impressão digital de 64 bits por linha (erro só por colisão de hash).
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+HLL_PRECISION = 14
+QUANTILE_SAMPLE_SIZE = 100_000
+QUANTILE_CONFIDENCE = 0.95
+
+
+def _leading_zeros(values: np.ndarray) -> np.ndarray:
+    """Conta os zeros à esquerda de cada uint64 a partir do expoente em ponto flutuante."""
+    _, exponent = np.frexp(values.astype(np.float64))
+    return np.where(values == 0, 64, 64 - exponent).astype(np.int64)
+
+
+def hyperloglog_count(hashes: np.ndarray, precision: int = HLL_PRECISION) -> int:
+    """Estima o número de valores distintos a partir de hashes uint64."""
+    m = 1 << precision
+    if len(hashes) == 0:
+        return 0
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    remainder = hashes << np.uint64(precision)
+    rank = np.minimum(_leading_zeros(remainder), 64 - precision) + 1
+
+    # Registrador = maior posto observado por índice, sem laço em Python (marca pares índice/posto)
+    max_rank = 64 - precision + 2
+    seen = np.zeros(m * max_rank, dtype=bool)
+    seen[index * max_rank + rank] = True
+    seen = seen.reshape(m, max_rank)
+    registers = (max_rank - 1 - np.argmax(seen[:, ::-1], axis=1)).astype(np.uint8)
+    registers[~seen.any(axis=1)] = 0
+
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # Correção para cardinalidades pequenas (linear counting)
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+
+def hyperloglog_relative_error(precision: int = HLL_PRECISION) -> float:
+    """Erro padrão relativo do HyperLogLog (1.04 / sqrt(m))."""
+    return 1.04 / math.sqrt(1 << precision)
+
+
+def approx_nunique(series: pd.Series) -> tuple[int, bool]:
+    """Estimativa de `series.nunique()` (ignora valores nulos).
+
+    Usa HyperLogLog para colunas numéricas, datas e booleanos, onde o hash é barato. Texto e
+    categorias mantêm a contagem exata, que com dicionários/Arrow já é mais rápida que o hash.
+    Retorna a contagem e se ela é aproximada.
+    """
+    dtype = series.dtype
+    if not (pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_datetime64_any_dtype(dtype)) \
+            or isinstance(dtype, pd.CategoricalDtype):
+        return int(series.nunique()), False
+    values = series.dropna()
+    return hyperloglog_count(pd.util.hash_pandas_object(values, index=False).to_numpy()), True
+
+
+def quantile_rank_error(sample_size: int, confidence: float = QUANTILE_CONFIDENCE) -> float:
+    """Erro máximo de posto dos quantis amostrais (desigualdade de Dvoretzky-Kiefer-Wolfowitz)."""
+    if sample_size == 0:
+        return 0.0
+    return math.sqrt(math.log(2 / (1 - confidence)) / (2 * sample_size))
+
+
+def approx_describe(df: pd.DataFrame, sample_size: int = QUANTILE_SAMPLE_SIZE, seed: int = 0) -> tuple[pd.DataFrame, float]:
+    """Equivalente ao `describe()` das colunas numéricas com quartis estimados por amostragem.
+
+    count, mean, std, min e max são exatos (baratos); 25%, 50% e 75% vêm de uma amostra
+    uniforme. Retorna o resumo e o erro máximo de posto dos quartis.
+    """
+    numeric = df.select_dtypes(include='number')
+    if len(numeric) > sample_size:
+        sampled = numeric.sample(n=sample_size, random_state=seed)
+    else:
+        sampled = numeric
+    quartiles = sampled.quantile([0.25, 0.5, 0.75])
+    quartiles.index = ['25%', '50%', '75%']
+
+    summary = pd.concat([
+        numeric.count().to_frame('count').T,
+        numeric.mean().to_frame('mean').T,
+        numeric.std().to_frame('std').T,
+        numeric.min().to_frame('min').T,
+        quartiles,
+        numeric.max().to_frame('max').T,
+    ])
+    rank_error = quantile_rank_error(len(sampled)) if len(sampled) < len(numeric) else 0.0
+    return summary.astype('float64'), rank_error
+
+
+def approx_duplicated_rows(df: pd.DataFrame) -> int:
+    """Conta linhas duplicadas comparando hashes de 64 bits por linha em vez dos valores."""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return int(len(row_hashes) - len(np.unique(row_hashes)))
@@ -0,0 +1,180 @@
+"""
+Ferramentas estatísticas locais e determinísticas para o DataAnalystAgent.
+
+Em vez de pedir ao LLM que estime médias, correlações e outliers a partir de 3 linhas de
+amostra, os números são calculados aqui (pandas/NumPy/SciPy, vetorizado) e enviados no
+prompt; o agente só interpreta e narra os resultados. Cada resultado é memoizado por
+fingerprint do dataset e colunas envolvidas.
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from utils.column_catalog import get_column_catalog, relevant_columns
+from utils.fingerprint import get_dataset_fingerprint
+
+MAX_CACHED_RESULTS = 256
+MAX_NUMERIC_COLS = 8
+MAX_CORR_COLS = 30
+MAX_CATEGORICAL_COLS = 3
+TOP_CORRELATIONS = 10
+TOP_VALUES = 10
+TOP_GROUPS = 15
+Z_SCORE_THRESHOLD = 3.0
+STATS_BUDGET_CHARS = 5_000  # ~1250 tokens
+
+_results = OrderedDict()
+_lock = threading.Lock()
+
+# Quais ferramentas cada tipo de pergunta aciona (texto sem acentos, em minúsculas)
+TOOL_TRIGGERS = {
+    "correlation": re.compile(r"correla|relacion|associa|influenc|depend"),
+    "outliers": re.compile(r"outlier|atipic|anomal|extrem|discrepan"),
+    "value_counts": re.compile(r"frequen|contagem|quant[oa]s|categori|distribui|mais comu"),
+    "group": re.compile(r"\bpor\b|\bgrupo|\bcada\b|segment"),
+    "complete": re.compile(r"complet|geral|resum|visao|explorat|overview"),
+}
+
+
+def _memoized(df: pd.DataFrame, tool: str, columns: tuple, compute):
+    key = (get_dataset_fingerprint(df), tool, columns)
+    with _lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+    result = compute()
+    with _lock:
+        _results[key] = result
+        if len(_results) > MAX_CACHED_RESULTS:
+            _results.popitem(last=False)
+    return result
+
+
+def describe_columns(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """count, média, desvio, quartis, assimetria e nulos das colunas numéricas."""
+    def compute():
+        numeric = df[columns]
+        summary = numeric.describe().T
+        summary["skew"] = numeric.skew()
+        summary["nulls"] = numeric.isna().sum()
+        return summary
+    return _memoized(df, "describe", tuple(columns), compute)
+
+
+def correlation_pairs(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """Todos os pares de colunas com r de Pearson, n e p-valor (teste t), do maior |r| ao menor."""
+    def compute():
+        numeric = df[columns].astype('float64')
+        corr = numeric.corr()
+        n = numeric.notna().astype('int64')
+        pair_n = n.T @ n  # observações válidas em ambas as colunas de cada par (contagem exata)
+        upper = np.triu(np.ones(corr.shape, dtype=bool), k=1)
+        pairs = corr.where(upper).stack().dropna().rename("r").to_frame()
+        pairs["n"] = pair_n.stack().reindex(pairs.index).astype('int64')
+        dof = (pairs["n"] - 2).clip(lower=1)
+        t_stat = pairs["r"] * np.sqrt(dof / (1 - pairs["r"].clip(-0.999999, 0.999999) ** 2))
+        pairs["p_value"] = 2 * stats.t.sf(np.abs(t_stat), dof)
+        return pairs.reindex(pairs["r"].abs().sort_values(ascending=False).index)
+    return _memoized(df, "correlation", tuple(columns), compute)
+
+
+def outlier_summary(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """Limites IQR (1.5×) e contagem de outliers por IQR e por z-score (|z| > 3)."""
+    def compute():
+        numeric = df[columns].astype('float64')
+        q1, q3 = numeric.quantile(0.25), numeric.quantile(0.75)
+        iqr = q3 - q1
+        lower, upper = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+        z = (numeric - numeric.mean()) / numeric.std(ddof=0).replace(0, np.nan)
+        return pd.DataFrame({
+            "iqr_lower": lower,
+            "iqr_upper": upper,
+            "iqr_outliers": ((numeric < lower) | (numeric > upper)).sum(),
+            "zscore_outliers": (z.abs() > Z_SCORE_THRESHOLD).sum(),
+            "pct_iqr": ((numeric < lower) | (numeric > upper)).mean() * 100,
+        })
+    return _memoized(df, "outliers", tuple(columns), compute)
+
+
+def value_counts(df: pd.DataFrame, column, top: int = TOP_VALUES) -> pd.DataFrame:
+    """Valores mais frequentes da coluna, com percentual."""
+    def compute():
+        counts = df[column].value_counts(dropna=False)
+        return pd.DataFrame({"count": counts, "pct": counts / len(df) * 100}).head(top)
+    return _memoized(df, "value_counts", (column,), compute)
+
+
+def group_aggregates(df: pd.DataFrame, group_column, value_columns: list, top: int = TOP_GROUPS) -> pd.DataFrame:
+    """Média, mediana e contagem das colunas numéricas por grupo (maiores grupos primeiro)."""
+    def compute():
+        grouped = df.groupby(group_column, observed=True)[value_columns].agg(['mean', 'median', 'count'])
+        sizes = df[group_column].value_counts()
+        return grouped.reindex(sizes.index[:top].intersection(grouped.index, sort=False))
+    return _memoized(df, "group", (group_column, *value_columns), compute)
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _table(frame: pd.DataFrame) -> str:
+    return frame.round(4).to_string()
+
+
+def compute_analyst_stats(df: pd.DataFrame, question: str, total_rows: int | None = None) -> str:
+    """Resultados das ferramentas relevantes para a pergunta, formatados para o prompt.
+
+    As colunas citadas na pergunta têm prioridade; sem citações, usa as primeiras colunas.
+    Com `total_rows` maior que `len(df)`, `df` é uma amostra e os resultados são rotulados assim.
+    """
+    text = _normalize(question)
+    triggered = {tool for tool, pattern in TOOL_TRIGGERS.items() if pattern.search(text)}
+    if "complete" in triggered or not triggered:
+        # Pergunta genérica: panorama com todas as ferramentas de coluna
+        triggered |= {"correlation", "outliers", "value_counts"}
+
+    mentioned = relevant_columns(get_column_catalog(df), question)
+    numeric_all = df.select_dtypes(include='number').columns.tolist()
+    categorical_all = df.select_dtypes(include=['object', 'category', 'string', 'bool']).columns.tolist()
+    by_relevance = lambda cols: [c for c in mentioned if c in cols] + [c for c in cols if c not in mentioned]
+    numeric = by_relevance(numeric_all)
+    categorical = by_relevance(categorical_all)
+
+    if total_rows is not None and total_rows > len(df):
+        scope = (f"Linhas no dataset: {total_rows}, colunas: {df.shape[1]}. Resultados calculados sobre uma "
+                 f"amostra aleatória de {len(df)} linhas (contagens referem-se à amostra)")
+    else:
+        scope = f"Linhas: {len(df)}, colunas: {df.shape[1]} (dataset completo)"
+    sections = [scope]
+    if numeric:
+        sections.append("Estatísticas descritivas:\n" + _table(describe_columns(df, numeric[:MAX_NUMERIC_COLS])))
+    if "correlation" in triggered and len(numeric) > 1:
+        pairs = correlation_pairs(df, numeric[:MAX_CORR_COLS])
+        # Pares entre colunas citadas na pergunta vêm primeiro, mesmo que a correlação seja fraca
+        asked = [i for i in pairs.index if i[0] in mentioned and i[1] in mentioned]
+        pairs = pairs.loc[asked + [i for i in pairs.index if i not in asked][:TOP_CORRELATIONS]]
+        sections.append("Correlações de Pearson mais fortes (r, n, p-valor):\n" + _table(pairs))
+    if "outliers" in triggered and numeric:
+        sections.append(
+            f"Outliers (IQR 1.5× e |z| > {Z_SCORE_THRESHOLD:g}):\n" + _table(outlier_summary(df, numeric[:MAX_NUMERIC_COLS]))
+        )
+    if "value_counts" in triggered:
+        for col in categorical[:MAX_CATEGORICAL_COLS]:
+            sections.append(f"Valores mais frequentes de '{col}':\n" + _table(value_counts(df, col)))
+    if "group" in triggered and categorical and numeric:
+        group_column = categorical[0]
+        value_columns = [c for c in numeric if c in mentioned][:3] or numeric[:3]
+        sections.append(
+            f"Agregados por '{group_column}':\n" + _table(group_aggregates(df, group_column, value_columns))
+        )
+
+    result = "\n\n".join(sections)
+    if len(result) > STATS_BUDGET_CHARS:
+        result = result[:STATS_BUDGET_CHARS].rsplit("\n", 1)[0] + "\n... (truncado)"
+    return result